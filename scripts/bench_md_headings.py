@@ -0,0 +1,63 @@
+"""
+parse_md_headings 微基准：合成含 N 个标题（默认 10k）的文档，对比单遍栈式实现与原逐行扫描实现，并校验输出一致。
+用法：在项目根执行 python scripts/bench_md_headings.py [--headings 10000] [--body-lines 3] [--repeat 3]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+from src.preprocessing.md_loader import _parse_md_headings_reference, parse_md_headings
+
+
+def synthetic_doc(n_headings: int, body_lines: int, seed: int = 0) -> str:
+    """生成 n_headings 个 #/##/### 标题交错、每节 body_lines 行正文（含公式）的 Markdown。"""
+    rng = random.Random(seed)
+    lines: list[str] = []
+    for i in range(n_headings):
+        level = rng.choice((1, 2, 2, 3, 3, 3))
+        lines.append(f"{'#' * level} Section {i}")
+        for k in range(body_lines):
+            lines.append(f"Body line {k} of section {i} with $x_{k}[n] = \\sum_k h[k]$.")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _best_of(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--headings", type=int, default=10000)
+    parser.add_argument("--body-lines", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-reference", action="store_true", help="不运行原实现（标题数很大时原实现耗时过长）")
+    args = parser.parse_args()
+
+    text = synthetic_doc(args.headings, args.body_lines)
+    n_lines = text.count("\n") + 1
+    print(f"synthetic doc: {args.headings} headings, {n_lines} lines, {len(text)} chars")
+    fast = _best_of(parse_md_headings, text, args.repeat)
+    print(f"parse_md_headings (single pass): {fast * 1000:.2f} ms")
+    if not args.skip_reference:
+        assert parse_md_headings(text) == _parse_md_headings_reference(text), "outputs differ"
+        slow = _best_of(_parse_md_headings_reference, text, args.repeat)
+        print(f"reference (rescan per heading):  {slow * 1000:.2f} ms  ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
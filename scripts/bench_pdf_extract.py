@@ -0,0 +1,67 @@
+"""
+PyMuPDF 页面提取基准：把课程 PDF 反复拼接成长文档，对比串行与多进程页区间提取，并校验输出一致。
+用法：在项目根执行 python scripts/bench_pdf_extract.py [--pages 500] [--workers 0]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+from src.preprocessing.pdf_parser import _export_pymupdf
+
+SOURCE_DIR = ROOT / "data" / "res.6-007-spring-2011" / "static_resources"
+
+
+def build_long_pdf(target: Path, n_pages: int) -> int:
+    """依次拼接 SOURCE_DIR 下的 PDF，直到不少于 n_pages 页。返回实际页数。"""
+    import fitz
+
+    sources = sorted(SOURCE_DIR.glob("*.pdf"))
+    if not sources:
+        raise SystemExit(f"no PDFs under {SOURCE_DIR}")
+    out = fitz.open()
+    i = 0
+    while out.page_count < n_pages:
+        with fitz.open(sources[i % len(sources)]) as src:
+            out.insert_pdf(src, to_page=min(src.page_count, n_pages - out.page_count) - 1)
+        i += 1
+    out.save(target)
+    n = out.page_count
+    out.close()
+    return n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=0, help="并行进程数，0 = CPU 核数")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory(prefix="bench_pdf_") as tmp:
+        tmp_path = Path(tmp)
+        pdf = tmp_path / "long.pdf"
+        n = build_long_pdf(pdf, args.pages)
+        print(f"synthetic PDF: {n} pages, {pdf.stat().st_size / 1e6:.1f} MB, {workers} workers")
+
+        t0 = time.perf_counter()
+        serial = _export_pymupdf(pdf, tmp_path / "serial", "long", workers=1)
+        t_serial = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        parallel = _export_pymupdf(pdf, tmp_path / "parallel", "long", workers=workers)
+        t_parallel = time.perf_counter() - t0
+        assert serial.read_bytes() == parallel.read_bytes(), "outputs differ"
+        print(f"serial:    {t_serial:.2f} s")
+        print(f"parallel:  {t_parallel:.2f} s  ({t_serial / t_parallel:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
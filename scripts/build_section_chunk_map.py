@@ -1,5 +1,6 @@
 """
 3.2.4.1 从 doc_index + results 生成章节-切片映射，写入 config/section_chunk_map.json。
+每个 .md 只解析一次（artifact_cache）；设置 PREPROCESS_CACHE_DIR 可跨次运行复用解析与切片结果。
 用法：在项目根执行 python scripts/build_section_chunk_map.py
 """
 from __future__ import annotations
@@ -13,6 +14,7 @@ ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 os.chdir(ROOT)
 
+from src.preprocessing import artifact_cache
 from src.preprocessing.doc_index import load_doc_index, build_doc_index
 from src.preprocessing.section_chunk_map import build_section_chunk_map
 
@@ -33,6 +35,7 @@ def main() -> None:
         return
 
     mapping = build_section_chunk_map(entries, results_dir)
+    print(f"Artifact cache: {artifact_cache.stats()}")
     out_path.parent.mkdir(parents=True, exist_ok=True)
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(mapping, f, ensure_ascii=False, indent=2)
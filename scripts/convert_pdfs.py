@@ -0,0 +1,50 @@
+"""
+批量 PDF 转换：data/pdf_to_convert/*.pdf -> results/*.md，跳过输出仍有效的文件，写 results/convert_manifest.json。
+用法：在项目根执行 python scripts/convert_pdfs.py [--backend pymupdf|pdf_extract_kit] [--workers 0] [--kit-workers 1] [--force] [--index]
+--index 转换后按清单重建 config/doc_index.json。
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+from src.preprocessing.doc_index import build_doc_index, save_doc_index
+from src.preprocessing.pdf_batch import convert_directory, manifest_path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量 PDF 转换")
+    parser.add_argument("--input", type=Path, default=ROOT / "data" / "pdf_to_convert")
+    parser.add_argument("--output", type=Path, default=ROOT / "results")
+    parser.add_argument("--backend", choices=("pymupdf", "pdf_extract_kit"), default="pymupdf")
+    parser.add_argument("--workers", type=int, default=None, help="PyMuPDF 并行进程数（缺省 PDF_BATCH_WORKERS，0 = CPU 核数）")
+    parser.add_argument("--kit-workers", type=int, default=None, help="PDF-Extract-Kit 并发数（缺省 PDF_EXTRACT_KIT_CONCURRENCY）")
+    parser.add_argument("--force", action="store_true", help="忽略清单，全部重新转换")
+    parser.add_argument("--index", action="store_true", help="转换后按清单重建 config/doc_index.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    summary = convert_directory(
+        args.input, args.output, args.backend, workers=args.workers, kit_workers=args.kit_workers, force=args.force
+    )
+    print(f"转换 {summary['converted']}，跳过 {summary['skipped']}，失败 {summary['failed']}，"
+          f"移出清单 {summary['removed']}，耗时 {summary['seconds']}s")
+    print(f"清单: {summary['manifest']}")
+    if args.index:
+        entries = build_doc_index(
+            args.output, ROOT / "data" / "res.6-007-spring-2011", manifest=manifest_path(args.output)
+        )
+        index_path = ROOT / "config" / "doc_index.json"
+        save_doc_index(entries, index_path)
+        print(f"Indexed {len(entries)} documents -> {index_path}")
+
+
+if __name__ == "__main__":
+    main()
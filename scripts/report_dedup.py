@@ -1,9 +1,10 @@
 """
-3.3.1 重复内容检测报告：对 results 对应切片做 hash 去重检测，输出重复率与样例。
-用法：在项目根执行 python scripts/report_dedup.py
+3.3.1 重复内容检测报告：对 results 对应切片做去重检测，输出重复率、重复簇与样例。
+用法：在项目根执行 python scripts/report_dedup.py [--method hash|minhash] [--threshold 0.8]
 """
 from __future__ import annotations
 
+import argparse
 import os
 import sys
 from pathlib import Path
@@ -14,10 +15,16 @@ os.chdir(ROOT)
 
 from src.preprocessing.doc_index import load_doc_index, build_doc_index
 from src.preprocessing.splitter import slice_document
-from src.preprocessing.dedup import find_duplicate_chunks, dedup_chunks
+from src.preprocessing.dedup import METHODS, duplicate_clusters, find_duplicate_chunks
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="切片重复检测报告")
+    parser.add_argument("--method", choices=METHODS, default="hash")
+    parser.add_argument("--threshold", type=float, default=None, help="minhash 的 Jaccard 阈值（缺省 DEDUP_MINHASH_THRESHOLD）")
+    parser.add_argument("--samples", type=int, default=5, help="输出的重复簇样例数")
+    args = parser.parse_args()
+
     index_path = ROOT / "config" / "doc_index.json"
     results_dir = ROOT / "results"
     data_root = ROOT / "data" / "res.6-007-spring-2011"
@@ -38,29 +45,36 @@ def main() -> None:
         all_chunks.extend(chunks)
 
     n_total = len(all_chunks)
-    pairs = find_duplicate_chunks(all_chunks, method="hash")
+    pairs = find_duplicate_chunks(all_chunks, method=args.method, threshold=args.threshold)
     duplicate_indices = {j for _, j in pairs}
     n_dupes = len(duplicate_indices)
     rate = (n_dupes / n_total * 100) if n_total else 0.0
+    clusters = sorted(duplicate_clusters(pairs).items(), key=lambda kv: (-len(kv[1]), kv[0]))
 
-    print(f"总切片数: {n_total}")
-    print(f"重复切片数: {n_dupes}")
-    print(f"重复率: {rate:.2f}%")
-    print(f"去重后数量: {n_total - n_dupes}")
+    def label(i: int) -> str:
+        c = all_chunks[i]
+        return f"[{i}] {c.get('doc_id')} chunk {c.get('chunk_index')}"
 
-    if pairs:
-        print("\n重复对样例（前 5 个，显示 doc_id / chunk_index）:")
-        for i, (a, b) in enumerate(pairs[:5]):
-            ca, cb = all_chunks[a], all_chunks[b]
-            print(f"  [{a}] {ca.get('doc_id')} chunk {ca.get('chunk_index')} <-> [{b}] {cb.get('doc_id')} chunk {cb.get('chunk_index')}")
+    lines = [
+        f"检测方法: {args.method}",
+        f"总切片数: {n_total}",
+        f"重复切片数: {n_dupes}",
+        f"重复率: {rate:.2f}%",
+        f"去重后数量: {n_total - n_dupes}",
+        f"重复簇数: {len(clusters)}",
+    ]
+    if clusters:
+        sizes = [len(dups) + 1 for _, dups in clusters]
+        lines.append(f"簇大小: 最大 {max(sizes)}，平均 {sum(sizes) / len(sizes):.2f}")
+        lines.append(f"\n重复簇样例（前 {args.samples} 个，按簇大小，显示 doc_id / chunk_index）:")
+        for first, dups in clusters[:args.samples]:
+            lines.append(f"  {label(first)} <- " + ", ".join(label(j) for j in dups[:5]) + (" ..." if len(dups) > 5 else ""))
+    print("\n".join(lines))
 
     out_txt = ROOT / "docs" / "task2" / "dedup_report.txt"
     out_txt.parent.mkdir(parents=True, exist_ok=True)
     with open(out_txt, "w", encoding="utf-8") as f:
-        f.write(f"总切片数: {n_total}\n")
-        f.write(f"重复切片数: {n_dupes}\n")
-        f.write(f"重复率: {rate:.2f}%\n")
-        f.write(f"去重后数量: {n_total - n_dupes}\n")
+        f.write("\n".join(lines) + "\n")
     print(f"\n报告已写入 {out_txt}")
 
 
@@ -1,9 +1,12 @@
 """
 3.3.3 数据质量评估报告：输出 quality_report.json 与简短 Markdown 摘要到 docs/task2/。
-用法：在项目根执行 python scripts/report_quality.py
+每个 .md 只解析一次（artifact_cache）；设置 PREPROCESS_CACHE_DIR 可跨次运行复用解析与切片结果。
+用法：在项目根执行 python scripts/report_quality.py [--semantic]
+--semantic 另计算嵌入语义重复率（需嵌入模型；向量经 embedding_cache 与入库共用）。
 """
 from __future__ import annotations
 
+import argparse
 import json
 import os
 import sys
@@ -13,11 +16,16 @@ ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 os.chdir(ROOT)
 
+from src.preprocessing import artifact_cache
 from src.preprocessing.doc_index import load_doc_index, build_doc_index
 from src.preprocessing.quality_metrics import compute_quality_metrics
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser(description="数据质量评估报告")
+    parser.add_argument("--semantic", action="store_true", help="计算嵌入语义重复率")
+    args = parser.parse_args()
+
     index_path = ROOT / "config" / "doc_index.json"
     results_dir = ROOT / "results"
     data_root = ROOT / "data" / "res.6-007-spring-2011"
@@ -32,7 +40,8 @@ def main() -> None:
         print("No doc index entries.")
         return
 
-    metrics = compute_quality_metrics(entries, results_dir)
+    metrics = compute_quality_metrics(entries, results_dir, semantic=args.semantic)
+    print(f"Artifact cache: {artifact_cache.stats()}")
 
     out_dir.mkdir(parents=True, exist_ok=True)
     json_path = out_dir / "quality_report.json"
@@ -48,6 +57,10 @@ def main() -> None:
         f"| 总切片数 | {metrics['total_chunks']} |",
         f"| 去重后切片数 | {metrics['total_unique_after_dedup']} |",
         f"| 重复率 | {metrics['duplicate_rate'] * 100:.2f}% |",
+    ]
+    if metrics["semantic_duplicate_rate"] is not None:
+        md_lines.append(f"| 语义重复率 | {metrics['semantic_duplicate_rate'] * 100:.2f}% |")
+    md_lines += [
         f"| Section 覆盖率（整体） | {metrics['section_coverage']['overall'] * 100:.2f}% |",
         "",
         "## 按文档",
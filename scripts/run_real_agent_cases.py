@@ -5,7 +5,8 @@
   python scripts/run_real_agent_cases.py           # 跑全部
   python scripts/run_real_agent_cases.py 0         # 只跑第 0 条
   python scripts/run_real_agent_cases.py --index 2 # 只跑第 2 条
-需已配置 .env（OPENROUTER_API_KEY 等）。
+  python scripts/run_real_agent_cases.py --retrieve-only  # 不调 LLM，仅对全部用例做一次批量检索
+需已配置 .env（OPENROUTER_API_KEY 等）；--retrieve-only 仅需 Chroma。
 """
 from __future__ import annotations
 
@@ -61,7 +62,25 @@ EXPECTED_SKILLS = [
 ]
 
 
+def run_retrieve_only(top_k: int = 3) -> None:
+    """对全部用例做一次批量检索（一次嵌入、一次 Chroma 查询），打印每条命中的 doc_id / 章节。"""
+    from src.agent.tools.rag import retrieve_documents_batch
+
+    batches = retrieve_documents_batch(USER_MESSAGE_CASES, top_k=top_k)
+    for idx, (message, docs) in enumerate(zip(USER_MESSAGE_CASES, batches)):
+        print(f"[{idx}] {message}")
+        if not docs:
+            print("     （无命中）")
+        for d in docs:
+            meta = d.metadata
+            print(f"     - {meta.get('doc_id', '')} / {meta.get('section_title', '')} (distance={meta.get('_distance')})")
+
+
 def main():
+    if "--retrieve-only" in sys.argv[1:]:
+        run_retrieve_only()
+        return
+
     from src.agent.run import invoke_with_skills
 
     # 解析只跑某一条： run_real_agent_cases.py 3  或  --index 3
@@ -1,10 +1,10 @@
 """
 知识图谱查询工具：先修关系、COVERS 推荐作业、TEACHES/PRACTICES 概念关联、学习路径验证。
 封装 Neo4j 查询，暴露为 LangChain @tool，供推荐与答疑 Skill 使用。
+只读查询优先走进程内图快照（knowledge_graph.snapshot，微秒级、Neo4j 宕机时仍可用），无快照时再查 Neo4j。
 """
 from __future__ import annotations
 
-import os
 from typing import Any
 
 from langchain_core.tools import tool
@@ -13,28 +13,34 @@ from langchain_core.tools import tool
 EXPECTED_LECTURE_IDS = ["lec01", "lec02", "lec03", "lec04", "lec05"]
 
 
-def _get_driver():
-    from neo4j import GraphDatabase
-    uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-    user = os.getenv("NEO4J_USER", "neo4j")
-    password = os.getenv("NEO4J_PASSWORD")
-    if not password:
-        raise ValueError("NEO4J_PASSWORD is required for Neo4j. Set it in .env")
-    return GraphDatabase.driver(uri, auth=(user, password))
+def _snapshot():
+    """当前进程内图快照；未加载到（无快照文件且 Neo4j 不可用）时为 None。"""
+    try:
+        from src.knowledge_graph.snapshot import get_snapshot
+        return get_snapshot()
+    except Exception:
+        return None
 
 
 def _run_cypher(fn):
-    """在 Neo4j session 上执行 fn(session)，返回 fn 的返回值。"""
-    driver = _get_driver()
-    try:
-        with driver.session() as session:
-            return fn(session)
-    finally:
-        driver.close()
+    """在共享连接池的 Neo4j session 上执行 fn(session)，返回 fn 的返回值（不再每次新建 Driver）。"""
+    from src.knowledge_graph.driver import run
+    return run(fn)
 
 
 def query_next_topic(topic_id: str) -> list[dict[str, Any]]:
     """先修关系：当前 topic 的下一讲（沿 PREREQUISITE 的后继）。"""
+    snap = _snapshot()
+    if snap is not None:
+        i = snap.node(topic_id, "Topic")
+        if i is None:
+            return []
+        nxt = sorted(
+            (j for j in snap.successors(i, "PREREQUISITE") if snap.label(j) == "Topic"),
+            key=lambda j: snap.prop(j, "order") or 0,
+        )
+        return [{"id": snap.ids[j], "name_en": snap.prop(j, "name_en"), "order": snap.prop(j, "order")} for j in nxt]
+
     def run(session):
         result = session.run(
             """
@@ -50,6 +56,17 @@ def query_next_topic(topic_id: str) -> list[dict[str, Any]]:
 
 def query_covers_exercises(topic_id: str) -> list[dict[str, Any]]:
     """COVERS：该讲对应的作业列表。"""
+    snap = _snapshot()
+    if snap is not None:
+        i = snap.node(topic_id, "Topic")
+        if i is None:
+            return []
+        return [
+            {"id": snap.ids[j], "title": snap.prop(j, "title"), "difficulty": snap.prop(j, "difficulty")}
+            for j in snap.successors(i, "COVERS")
+            if snap.label(j) == "Exercise"
+        ]
+
     def run(session):
         result = session.run(
             """
@@ -64,6 +81,17 @@ def query_covers_exercises(topic_id: str) -> list[dict[str, Any]]:
 
 def query_teaches_concepts(topic_id: str) -> list[dict[str, Any]]:
     """TEACHES：该讲教授的概念。"""
+    snap = _snapshot()
+    if snap is not None:
+        i = snap.node(topic_id, "Topic")
+        if i is None:
+            return []
+        taught = sorted(
+            (j for j in snap.successors(i, "TEACHES") if snap.label(j) == "Concept"),
+            key=lambda j: snap.prop(j, "order") or 0,
+        )
+        return [{"id": snap.ids[j], "name": snap.prop(j, "name"), "difficulty": snap.prop(j, "difficulty")} for j in taught]
+
     def run(session):
         result = session.run(
             """
@@ -79,6 +107,17 @@ def query_teaches_concepts(topic_id: str) -> list[dict[str, Any]]:
 
 def query_practices_concepts(exercise_id: str) -> list[dict[str, Any]]:
     """PRACTICES：该作业练习的概念。"""
+    snap = _snapshot()
+    if snap is not None:
+        i = snap.node(exercise_id, "Exercise")
+        if i is None:
+            return []
+        return [
+            {"id": snap.ids[j], "name": snap.prop(j, "name")}
+            for j in snap.successors(i, "PRACTICES")
+            if snap.label(j) == "Concept"
+        ]
+
     def run(session):
         result = session.run(
             """
@@ -100,6 +139,12 @@ def validate_path(learned_topic_ids: list[str], recommended_topic_id: str) -> tu
     if recommended_topic_id in learned:
         return True, "该目标已在已学列表中。"
 
+    snap = _snapshot()
+    if snap is not None:
+        # 传递闭包位集：missing = ancestors(target) & ~learned
+        missing = _by_topic_order(snap, snap.reachability("PREREQUISITE").missing(recommended_topic_id, learned))
+        return _validation_result(missing)
+
     def run(session):
         result = session.run(
             """
@@ -112,12 +157,36 @@ def validate_path(learned_topic_ids: list[str], recommended_topic_id: str) -> tu
         return [r["id"] for r in result]
 
     prereqs = _run_cypher(run)
-    missing = [p for p in prereqs if p not in learned]
+    return _validation_result([p for p in prereqs if p not in learned])
+
+
+def _by_topic_order(snap, topic_ids: list[str]) -> list[str]:
+    return sorted(topic_ids, key=lambda t: snap.prop(snap.index[t], "order") or 0)
+
+
+def _validation_result(missing: list[str]) -> tuple[bool, str]:
     if not missing:
         return True, "推荐目标的所有先修均已在已学列表中。"
     return False, f"推荐前需先学习：{', '.join(missing)}。"
 
 
+def validate_paths(learned_topic_ids: list[str], candidate_topic_ids: list[str]) -> dict[str, tuple[bool, str]]:
+    """
+    批量学习路径验证：对每个候选推荐目标返回 validate_path 的结果，供推荐一次筛掉跳过先修的候选。
+    有图快照时整批一次位运算（不逐个遍历）；否则逐个调用 validate_path。
+    """
+    learned = set(learned_topic_ids)
+    snap = _snapshot()
+    if snap is None:
+        return {c: validate_path(learned_topic_ids, c) for c in candidate_topic_ids}
+    pending = [c for c in candidate_topic_ids if c not in learned]
+    missing = snap.reachability("PREREQUISITE").missing_many(pending, learned)
+    return {
+        c: (True, "该目标已在已学列表中。") if c in learned else _validation_result(_by_topic_order(snap, missing[c]))
+        for c in candidate_topic_ids
+    }
+
+
 @tool
 def graph_query_next_topic(topic_id: str) -> str:
     """
@@ -168,6 +237,24 @@ def graph_query_concept_relations(
 
 def query_concept_depends(concept_id: str) -> list[dict[str, Any]]:
     """沿 DEPENDS_ON 查询该概念的后继概念（学习顺序上的后续）。"""
+    snap = _snapshot()
+    if snap is not None:
+        if snap.node(concept_id, "Concept") is None:
+            return []
+        later = sorted(
+            (snap.index[c] for c in snap.reachability("DEPENDS_ON").descendants(concept_id)),
+            key=lambda j: (snap.prop(j, "source_lecture") or "", snap.ids[j]),
+        )
+        return [
+            {
+                "id": snap.ids[j],
+                "name": snap.prop(j, "name"),
+                "topic_id": snap.prop(j, "source_lecture"),
+                "difficulty": snap.prop(j, "difficulty"),
+            }
+            for j in later
+        ]
+
     def run(session):
         result = session.run(
             """
@@ -199,12 +286,16 @@ def graph_validate_path(learned_topic_ids: str, recommended_topic_id: str) -> st
     """
     验证推荐目标是否满足先修：确保推荐不跳过先修。
     - learned_topic_ids: 已学讲次 id，逗号分隔，如 "lec01,lec02,lec03"
-    - recommended_topic_id: 待推荐的讲次 id，如 lec04
+    - recommended_topic_id: 待推荐的讲次 id，如 lec04；可逗号分隔多个候选（如 "lec03,lec04,lec05"）一次验证
     返回是否合法及说明，供推荐逻辑使用。
     """
     learned = [x.strip() for x in learned_topic_ids.split(",") if x.strip()]
-    ok, msg = validate_path(learned, recommended_topic_id.strip())
-    return f"验证结果：{'通过' if ok else '不通过'}。{msg}"
+    candidates = [x.strip() for x in recommended_topic_id.split(",") if x.strip()]
+    if len(candidates) <= 1:
+        ok, msg = validate_path(learned, recommended_topic_id.strip())
+        return f"验证结果：{'通过' if ok else '不通过'}。{msg}"
+    results = validate_paths(learned, candidates)
+    return "\n".join(f"{c} 验证结果：{'通过' if ok else '不通过'}。{msg}" for c, (ok, msg) in results.items())
 
 
 def get_all_graph_tools() -> list[Any]:
@@ -0,0 +1,113 @@
+"""
+检索后处理：同一文档同一章节内相邻切片合并为段落并去掉切片重叠，再按 token 预算打包。
+切片由 splitter._split_by_size 生成，相邻切片有 CHUNK_OVERLAP 字符重叠；直接拼给 LLM 会重复浪费 token。
+"""
+from __future__ import annotations
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.common.env import env_int
+from src.preprocessing.tokens import count_tokens, token_positions
+
+
+# rag_retrieve 送入 LLM 的片段总 token 预算
+CONTEXT_TOKEN_BUDGET = env_int("RAG_CONTEXT_TOKEN_BUDGET", 1500)
+# 重叠检测的最大/最小长度（字符）：小于 MIN_OVERLAP 的公共前后缀视为巧合，不去重
+MAX_OVERLAP = 400
+MIN_OVERLAP = 8
+# 剩余预算低于该值时不再截断塞入下一段
+MIN_PASSAGE_TOKENS = 40
+
+
+def _overlap_len(a: str, b: str) -> int:
+    """a 的后缀与 b 的前缀的最长公共部分长度（不超过 MAX_OVERLAP，不足 MIN_OVERLAP 视为 0）。"""
+    for k in range(min(len(a), len(b), MAX_OVERLAP), MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _join(a: str, b: str) -> str:
+    k = _overlap_len(a, b)
+    if k:
+        return a + b[k:]
+    return a + "\n" + b
+
+
+def merge_adjacent_chunks(documents: list[Document]) -> list[Document]:
+    """
+    按 (doc_id, section_title) 分组、组内按 chunk_index 排序，把 chunk_index 连续的切片合并为一段并去掉重叠。
+    合并后段落按组内最靠前的检索排名排序；metadata 取首个切片，附 chunk_indices 与 merged_chunks，
+    _distance 取组内最小值。无 chunk_index 的结果与已按偏移扩展（metadata.expanded）的结果原样保留。
+    """
+    groups: dict[tuple[str, str], list[tuple[int, Document]]] = {}
+    passages: list[tuple[int, Document]] = []
+    for rank, doc in enumerate(documents):
+        meta = doc.metadata
+        if not isinstance(meta.get("chunk_index"), int) or meta.get("expanded"):
+            passages.append((rank, doc))
+            continue
+        key = (str(meta.get("doc_id") or meta.get("source_file") or ""), str(meta.get("section_title") or ""))
+        groups.setdefault(key, []).append((rank, doc))
+
+    for members in groups.values():
+        members.sort(key=lambda x: x[1].metadata["chunk_index"])
+        run: list[tuple[int, Document]] = []
+        for rank, doc in members:
+            idx = doc.metadata["chunk_index"]
+            if run and idx == run[-1][1].metadata["chunk_index"]:
+                continue  # 同一切片重复出现
+            if run and idx != run[-1][1].metadata["chunk_index"] + 1:
+                passages.append(_merge_run(run))
+                run = []
+            run.append((rank, doc))
+        if run:
+            passages.append(_merge_run(run))
+
+    passages.sort(key=lambda x: x[0])
+    return [doc for _, doc in passages]
+
+
+def _merge_run(run: list[tuple[int, Document]]) -> tuple[int, Document]:
+    best_rank = min(rank for rank, _ in run)
+    if len(run) == 1:
+        return best_rank, run[0][1]
+    text = run[0][1].page_content
+    for _, doc in run[1:]:
+        text = _join(text, doc.page_content)
+    meta = dict(run[0][1].metadata)
+    meta["chunk_indices"] = [doc.metadata["chunk_index"] for _, doc in run]
+    meta["merged_chunks"] = len(run)
+    distances = [doc.metadata["_distance"] for _, doc in run if doc.metadata.get("_distance") is not None]
+    if distances:
+        meta["_distance"] = min(distances)
+    return best_rank, Document(page_content=text, metadata=meta)
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """不超过 max_tokens 的最长前缀：一次 token_positions，在 token 边界处截断（不对各前缀重复计数）。"""
+    pos = token_positions(text)
+    return text[:int(np.searchsorted(pos, max_tokens, side="right")) - 1]
+
+
+def pack_to_budget(passages: list[Document], max_tokens: int = CONTEXT_TOKEN_BUDGET) -> list[Document]:
+    """
+    按顺序装入段落直到 token 预算用尽；放不下的段落在剩余预算足够时截断后装入（末尾加 "..."），随后停止。
+    max_tokens <= 0 表示不限制。
+    """
+    if max_tokens <= 0:
+        return list(passages)
+    out: list[Document] = []
+    remaining = max_tokens
+    for doc in passages:
+        cost = count_tokens(doc.page_content)
+        if cost <= remaining:
+            out.append(doc)
+            remaining -= cost
+            continue
+        if remaining >= MIN_PASSAGE_TOKENS:
+            text = _truncate_to_tokens(doc.page_content, remaining - 1)
+            out.append(Document(page_content=text + "...", metadata=dict(doc.metadata, truncated=True)))
+        break
+    return out
@@ -6,14 +6,19 @@ from __future__ import annotations
 
 import logging
 import os
-from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
 from langchain_core.documents import Document
 from langchain_core.tools import tool
 
-# 与 chroma_ingest 一致
-COLLECTION_NAME = "course_docs"
+from src.common.env import env_int
+
+# 与 chroma_ingest 一致；client/collection 句柄由 chroma_client 在进程内复用
+from src.preprocessing.chroma_client import COLLECTION_NAME, default_persist_dir, get_collection, get_generation
+from src.preprocessing import bm25_index, doc_store, embedding_cache, mmap_index
+
+from .passages import CONTEXT_TOKEN_BUDGET, merge_adjacent_chunks, pack_to_budget
+from .retrieval_cache import get_retrieval_cache, normalize_where
 
 # 轻量 query 扩展：检索时追加英文/同义词，提高与讲义表述的匹配率（数据中常含英文术语）
 _QUERY_EXPAND_TERMS: list[tuple[str, str]] = [
@@ -26,6 +31,15 @@ _QUERY_EXPAND_TERMS: list[tuple[str, str]] = [
 
 _logger = logging.getLogger(__name__)
 
+RetrieveMode = Literal["vector", "hybrid"]
+# chroma：collection.query；mmap：内存映射向量索引（mmap_index），检索路径不经过 SQLite，索引不存在时退回 chroma
+RetrieveBackend = Literal["chroma", "mmap"]
+# 命中切片按 start_offset / end_offset 从 doc_store 扩展：section 为所在章节，window 为前后各 EXPAND_WINDOW 字符
+RetrieveExpand = Literal["section", "window"]
+# hybrid：向量与 BM25 各取 top_k * HYBRID_CANDIDATE_FACTOR 个候选，再按 RRF 融合取前 top_k
+HYBRID_CANDIDATE_FACTOR = 4
+RRF_K = 60
+
 
 def _chroma_where(filters: dict[str, Any] | None) -> dict[str, Any] | None:
     """将 filters 转为 Chroma where 格式；标量值视为 $eq。Chroma 要求顶层为单一运算符，多条件用 $and。"""
@@ -61,6 +75,205 @@ def _expand_query_for_retrieve(query: str) -> str:
     return q
 
 
+def _cache_key(
+    search_query: str,
+    top_k: int,
+    where: dict[str, Any] | None,
+    persist_dir: str | None,
+    min_score: float | None,
+    mode: str = "vector",
+    backend: str = "chroma",
+    expand: str | None = None,
+) -> tuple:
+    """检索缓存键：入库代数 + 扩展后的 query + top_k + 归一化 where + min_score + 检索模式 + 后端 + 上下文扩展。"""
+    return (
+        get_generation(persist_dir),
+        persist_dir or "",
+        search_query,
+        top_k,
+        normalize_where(where),
+        min_score,
+        mode,
+        backend,
+        expand or "",
+    )
+
+
+def _row(res: dict[str, Any], field: str, row: int) -> list:
+    values = res.get(field) or []
+    return (values[row] or []) if len(values) > row else []
+
+
+def _hits_from_result(res: dict[str, Any] | None, row: int) -> list[tuple[str, Document]]:
+    """从 collection.query 结果中取第 row 个查询的命中，按排名返回 (id, Document)，metadata 附 _distance。"""
+    if not res:
+        return []
+    contents = _row(res, "documents", row)
+    ids = _row(res, "ids", row)
+    meta = _row(res, "metadatas", row)
+    distances = _row(res, "distances", row)
+    hits: list[tuple[str, Document]] = []
+    for i, content in enumerate(contents):
+        m = dict(meta[i]) if i < len(meta) and meta[i] else {}
+        if i < len(distances):
+            m["_distance"] = float(distances[i])
+        hits.append((str(ids[i]) if i < len(ids) else str(i), Document(page_content=content or "", metadata=m)))
+    return hits
+
+
+def _passes_min_score(doc: Document, min_score: float | None) -> bool:
+    # Chroma 默认 L2：距离越小越相似；若需按 similarity 过滤可后续扩展
+    if min_score is None or doc.metadata.get("_distance") is None:
+        return True
+    return doc.metadata["_distance"] <= min_score
+
+
+def _documents_from_result(res: dict[str, Any] | None, row: int, min_score: float | None) -> list[Document]:
+    """从 collection.query 结果中取第 row 个查询的命中，转为 Document 列表（附 _distance）。"""
+    return [doc for _, doc in _hits_from_result(res, row) if _passes_min_score(doc, min_score)]
+
+
+def _fuse_hybrid(
+    res: dict[str, Any] | None,
+    row: int,
+    index: bm25_index.BM25Index,
+    search_query: str,
+    top_k: int,
+    where: dict[str, Any] | None,
+    min_score: float | None,
+) -> list[Document]:
+    """
+    向量命中与 BM25 命中按 RRF 融合；仅 BM25 命中的切片直接取索引中保存的文本与元数据。
+    BM25 索引无法精确执行 where 时只返回向量命中（避免融合不满足 where 的切片）。
+    """
+    try:
+        bm25_hits = index.search(search_query, top_k * HYBRID_CANDIDATE_FACTOR, where)
+    except bm25_index.UnsupportedFilter as e:
+        _logger.info("BM25 index cannot apply where %s (%s); using vector results only", where, e)
+        return _documents_from_result(res, row, min_score)[:top_k]
+    vector_hits = _hits_from_result(res, row)
+    by_id = dict(vector_hits)
+    bm25_ids: list[str] = []
+    for i, score in bm25_hits:
+        cid = index.ids[i]
+        bm25_ids.append(cid)
+        doc = by_id.get(cid)
+        if doc is None:
+            doc = Document(page_content=index.documents[i], metadata=dict(index.metadatas[i]))
+            by_id[cid] = doc
+        doc.metadata["_bm25_score"] = round(score, 4)
+    docs: list[Document] = []
+    for cid, score in bm25_index.reciprocal_rank_fusion([[cid for cid, _ in vector_hits], bm25_ids], k=RRF_K):
+        doc = by_id[cid]
+        if not _passes_min_score(doc, min_score):
+            continue
+        doc.metadata["_rrf_score"] = round(score, 6)
+        docs.append(doc)
+        if len(docs) >= top_k:
+            break
+    return docs
+
+
+def _load_bm25(mode: str, persist_dir: str | None) -> bm25_index.BM25Index | None:
+    """hybrid 模式下加载 BM25 索引；索引不存在时返回 None，调用方退回纯向量检索。"""
+    if mode != "hybrid":
+        return None
+    index = bm25_index.load_cached(persist_dir or default_persist_dir())
+    if index is None and os.environ.get("RAG_DEBUG"):
+        _logger.info("RAG hybrid requested but no BM25 index under %s; using vector only", persist_dir)
+    return index
+
+
+def _vector_query(
+    texts: list[str],
+    n_results: int,
+    where: dict[str, Any] | None,
+    persist_dir: str | None,
+    backend: str,
+) -> dict[str, Any]:
+    """按 backend 执行向量查询，返回 collection.query 结构的结果。"""
+    if backend == "mmap":
+        index = mmap_index.load_cached(persist_dir or default_persist_dir())
+        if index is None:
+            _logger.warning("RAG backend=mmap but no mmap index under %s; falling back to chroma", persist_dir)
+        else:
+            try:
+                index.where_mask(where)
+            except mmap_index.UnsupportedFilter as e:
+                # 索引无法精确执行的过滤交给 Chroma，避免结果被放宽或收窄
+                _logger.info("RAG backend=mmap cannot apply where %s (%s); querying chroma", where, e)
+            else:
+                return index.query(mmap_index.embed_queries(texts), n_results, where)
+    # persist_dir 为空时取 CHROMA_PERSIST_DIR 或项目根下 chroma_db（与 chroma_ingest 默认一致）
+    collection = get_collection(persist_dir, COLLECTION_NAME)
+    if embedding_cache.ENABLED:
+        # query 嵌入走 embedding_cache.embed_queries（与入库共用默认嵌入模型；进程内 LRU，默认不读写嵌入缓存库）
+        return collection.query(
+            query_embeddings=embedding_cache.embed_queries(texts).tolist(),
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+    return collection.query(
+        query_texts=texts,
+        n_results=n_results,
+        where=where,
+        include=["documents", "metadatas", "distances"],
+    )
+
+
+def _expand_documents(documents: list[Document], expand: str, persist_dir: str | None) -> list[Document]:
+    """
+    按切片偏移从 doc_store（内存映射的清洗后全文）取父级上下文替换 page_content，不追加向量查询。
+    section：切片所在章节（同名且非 1 级标题的章节，否则为包含切片起点的最内层章节；文档无章节时为全文）；
+    window：切片前后各 EXPAND_WINDOW 字符。同一文档中重叠的区间合并为一段，保留最靠前的排名；
+    metadata 附 expanded、expand_start / expand_end 与 chunk_indices。无偏移或文档不在存储中的结果原样保留。
+    """
+    store = doc_store.load_cached(persist_dir or default_persist_dir())
+    if store is None:
+        _logger.warning("RAG expand=%s but no doc store under %s; returning chunks", expand, persist_dir)
+        return documents
+    passthrough: list[tuple[int, Document]] = []
+    intervals: dict[str, list[tuple[int, int, int]]] = {}  # doc_id -> [(start, end, rank)]
+    for rank, doc in enumerate(documents):
+        meta = doc.metadata
+        doc_id, start, end = meta.get("doc_id"), meta.get("start_offset"), meta.get("end_offset")
+        if not isinstance(start, int) or not isinstance(end, int) or doc_id not in store:
+            passthrough.append((rank, doc))
+            continue
+        if expand == "section":
+            a, b = store.section_span(doc_id, start, meta.get("section_title")) or (0, store.length(doc_id))
+        else:
+            a, b = max(0, start - EXPAND_WINDOW), min(store.length(doc_id), end + EXPAND_WINDOW)
+        intervals.setdefault(doc_id, []).append((a, b, rank))
+
+    expanded: list[tuple[int, Document]] = []
+    for doc_id, items in intervals.items():
+        items.sort()
+        groups: list[list[tuple[int, int, int]]] = []
+        for item in items:
+            if groups and item[0] < max(x[1] for x in groups[-1]):
+                groups[-1].append(item)
+            else:
+                groups.append([item])
+        for group in groups:
+            a, b = group[0][0], max(x[1] for x in group)
+            best = min(x[2] for x in group)
+            meta = dict(
+                documents[best].metadata,
+                expanded=expand,
+                expand_start=a,
+                expand_end=b,
+                chunk_indices=sorted(
+                    documents[x[2]].metadata["chunk_index"]
+                    for x in group
+                    if isinstance(documents[x[2]].metadata.get("chunk_index"), int)
+                ),
+            )
+            expanded.append((best, Document(page_content=store.slice(doc_id, a, b).strip(), metadata=meta)))
+    return [doc for _, doc in sorted(passthrough + expanded, key=lambda x: x[0])]
+
+
 def retrieve_documents(
     query: str,
     top_k: int = 5,
@@ -68,6 +281,10 @@ def retrieve_documents(
     *,
     persist_dir: str | None = None,
     min_score: float | None = None,
+    use_cache: bool = True,
+    mode: RetrieveMode = "vector",
+    backend: RetrieveBackend = "chroma",
+    expand: RetrieveExpand | None = None,
 ) -> list[Document]:
     """
     从 Chroma 检索相关文档片段。
@@ -76,79 +293,133 @@ def retrieve_documents(
     - filters: 元数据过滤，如 {"doc_id": "lec01", "doc_type": "lecture"}；与 splitter.chunk_metadata_for_chroma 字段一致
     - persist_dir: Chroma 持久化目录，默认从 CHROMA_PERSIST_DIR 或项目 chroma_db 读取
     - min_score: 可选最小相似度阈值，Chroma 返回的 distance 为越小越相似，部分版本返回 similarity 则越大越相似；不设则不按分数过滤
+    - use_cache: 是否走检索结果缓存（retrieval_cache）；键含入库代数，重新入库后自动失效
+    - mode: "vector" 纯向量；"hybrid" 向量 + BM25（bm25_index）按 RRF 融合，metadata 附 _rrf_score / _bm25_score；
+      无 BM25 索引时退回纯向量
+    - backend: "chroma" 走 collection.query；"mmap" 走 mmap_index 导出的内存映射矩阵（精确暴力检索），无索引时退回 chroma
+    - expand: None 返回切片本身；"section" / "window" 按切片偏移从 doc_store 取所在章节 / 前后窗口（见 _expand_documents），
+      无 doc_store 时返回切片
     返回 LangChain Document 列表（content + metadata）。
     """
-    try:
-        import chromadb
-    except ImportError:
-        raise RuntimeError("chromadb not installed. Run: pip install chromadb")
-
-    persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR")
-    if not persist_dir:
-        # 与 chroma_ingest 默认一致：项目根下 chroma_db
-        root = Path(__file__).resolve().parents[3]
-        persist_dir = str(root / "chroma_db")
-
-    client = chromadb.PersistentClient(path=persist_dir)
-    collection = client.get_or_create_collection(COLLECTION_NAME, metadata={"description": "course docs RAG"})
-
     # 轻量扩展 query，提高与讲义中英混合表述的匹配
     search_query = _expand_query_for_retrieve(query)
     where = _chroma_where(filters)
-    res = collection.query(
-        query_texts=[search_query],
-        n_results=top_k,
-        where=where,
-        include=["documents", "metadatas", "distances"],
+
+    cache = get_retrieval_cache()
+    cache_key = None
+    if use_cache and cache.enabled:
+        cache_key = _cache_key(search_query, top_k, where, persist_dir, min_score, mode, backend, expand)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if os.environ.get("RAG_DEBUG"):
+                _logger.info("RAG retrieve_documents query=%r cache hit -> %s docs", query, len(cached))
+            return cached
+
+    index = _load_bm25(mode, persist_dir)
+    res = _vector_query(
+        [search_query],
+        top_k * HYBRID_CANDIDATE_FACTOR if index is not None else top_k,
+        where,
+        persist_dir,
+        backend,
     )
-    docs: list[Document] = []
-    if not res or not res.get("documents") or not res["documents"][0]:
-        if os.environ.get("RAG_DEBUG"):
-            _logger.info("RAG retrieve_documents query=%r expanded=%r top_k=%s -> 0 docs", query, search_query, top_k)
-        return docs
+    if index is not None:
+        docs = _fuse_hybrid(res, 0, index, search_query, top_k, where, min_score)
+    else:
+        docs = _documents_from_result(res, 0, min_score)
+    if expand:
+        docs = _expand_documents(docs, expand, persist_dir)
     if os.environ.get("RAG_DEBUG"):
         _logger.info(
-            "RAG retrieve_documents query=%r expanded=%r top_k=%s -> %s docs",
+            "RAG retrieve_documents query=%r expanded=%r top_k=%s mode=%s -> %s docs",
             query,
             search_query,
             top_k,
-            len(res["documents"][0]),
+            mode if index is not None else "vector",
+            len(docs),
         )
-    for i, content in enumerate(res["documents"][0]):
-        meta = (res.get("metadatas") or [[]])[0]
-        m = dict(meta[i]) if i < len(meta) else {}
-        distances = (res.get("distances") or [[]])[0]
-        if distances and i < len(distances):
-            m["_distance"] = float(distances[i])
-        if min_score is not None and m.get("_distance") is not None:
-            # Chroma 默认 L2：距离越小越相似；若需按 similarity 过滤可后续扩展
-            if m["_distance"] > min_score:
-                continue
-        docs.append(Document(page_content=content or "", metadata=m))
+    if cache_key is not None:
+        cache.put(cache_key, docs)
     return docs
 
 
-# 默认 top_k 略增以提高召回，便于概念类问题命中
-DEFAULT_RAG_TOP_K = 8
-
-
-@tool
-def rag_retrieve(
-    query: str,
-    top_k: int = DEFAULT_RAG_TOP_K,
-    doc_id: str | None = None,
-    doc_type: str | None = None,
-    content_type: str | None = None,
-) -> str:
+def retrieve_documents_batch(
+    queries: list[str],
+    top_k: int = 5,
+    filters: dict[str, Any] | None = None,
+    *,
+    persist_dir: str | None = None,
+    min_score: float | None = None,
+    use_cache: bool = True,
+    mode: RetrieveMode = "vector",
+    backend: RetrieveBackend = "chroma",
+    expand: RetrieveExpand | None = None,
+) -> list[list[Document]]:
     """
-    从课程文档向量库中检索与问题相关的片段。用于答疑时查找讲义/作业中的依据。
-    - query: 用户问题或关键词
-    - top_k: 返回最多几条片段（默认 8）
-    - doc_id: 可选，限定文档 id，如 lec01、hw02
-    - doc_type: 可选，限定类型：lecture、homework、solution
-    - content_type: 可选，限定内容类型
-    返回检索到的片段摘要文本，供生成带引用的回答。
+    批量检索：多条 query 一次嵌入、一次向量查询（collection.query 或 mmap 矩阵乘），按输入顺序返回每条 query 的 Document 列表。
+    参数含义同 retrieve_documents；filters 对所有 query 生效。缓存命中的 query 与重复 query 不再参与查询。
     """
+    search_queries = [_expand_query_for_retrieve(q) for q in queries]
+    where = _chroma_where(filters)
+    results: list[list[Document] | None] = [None] * len(queries)
+
+    cache = get_retrieval_cache()
+    keys: list[tuple | None] = [None] * len(queries)
+    if use_cache and cache.enabled:
+        for i, sq in enumerate(search_queries):
+            keys[i] = _cache_key(sq, top_k, where, persist_dir, min_score, mode, backend, expand)
+            results[i] = cache.get(keys[i])
+
+    # 未命中的 query 去重后一次查询
+    pending: dict[str, list[int]] = {}
+    for i, sq in enumerate(search_queries):
+        if results[i] is None:
+            pending.setdefault(sq, []).append(i)
+    if pending:
+        texts = list(pending)
+        index = _load_bm25(mode, persist_dir)
+        res = _vector_query(
+            texts,
+            top_k * HYBRID_CANDIDATE_FACTOR if index is not None else top_k,
+            where,
+            persist_dir,
+            backend,
+        )
+        for row, sq in enumerate(texts):
+            if index is not None:
+                docs = _fuse_hybrid(res, row, index, sq, top_k, where, min_score)
+            else:
+                docs = _documents_from_result(res, row, min_score)
+            if expand:
+                docs = _expand_documents(docs, expand, persist_dir)
+            for n, i in enumerate(pending[sq]):
+                # 同一 query 多次出现时各自持有独立副本
+                results[i] = docs if n == 0 else [Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in docs]
+            if keys[pending[sq][0]] is not None:
+                cache.put(keys[pending[sq][0]], docs)
+    if os.environ.get("RAG_DEBUG"):
+        _logger.info(
+            "RAG retrieve_documents_batch n=%s queried=%s top_k=%s",
+            len(queries),
+            len(pending),
+            top_k,
+        )
+    return [r or [] for r in results]
+
+
+# 默认 top_k 略增以提高召回，便于概念类问题命中；hybrid 精度更高时可用 RAG_TOP_K 调低以减少送入 LLM 的 token
+DEFAULT_RAG_TOP_K = env_int("RAG_TOP_K", 8)
+# rag_retrieve / rag_retrieve_batch 使用的检索模式（vector | hybrid，默认 vector）；hybrid 在无 BM25 索引时自动退回 vector
+RAG_RETRIEVE_MODE: RetrieveMode = "hybrid" if os.environ.get("RAG_RETRIEVE_MODE", "vector") == "hybrid" else "vector"
+# 工具使用的向量后端；多 worker 部署可导出 mmap 索引（python -m src.preprocessing.mmap_index）后设为 mmap
+RAG_BACKEND: RetrieveBackend = "mmap" if os.environ.get("RAG_BACKEND", "chroma") == "mmap" else "chroma"
+# 工具是否把命中切片扩展为所在章节 / 窗口（section | window，默认不扩展）；扩展后仍按 CONTEXT_TOKEN_BUDGET 打包
+_expand_env = os.environ.get("RAG_EXPAND", "")
+RAG_EXPAND: RetrieveExpand | None = _expand_env if _expand_env in ("section", "window") else None  # type: ignore[assignment]
+EXPAND_WINDOW = env_int("RAG_EXPAND_WINDOW", 600)
+
+
+def _build_filters(doc_id: str | None, doc_type: str | None, content_type: str | None) -> dict[str, Any] | None:
     filters: dict[str, Any] = {}
     if doc_id is not None:
         filters["doc_id"] = doc_id
@@ -156,9 +427,16 @@ def rag_retrieve(
         filters["doc_type"] = doc_type
     if content_type is not None:
         filters["content_type"] = content_type
-    documents = retrieve_documents(query, top_k=top_k, filters=filters or None)
-    if not documents:
-        return "未在课程材料中找到相关片段。"
+    return filters or None
+
+
+def _prepare_passages(documents: list[Document], max_tokens: int = CONTEXT_TOKEN_BUDGET) -> list[Document]:
+    """相邻切片合并去重叠后按 token 预算打包，替代逐条 500 字符截断。"""
+    return pack_to_budget(merge_adjacent_chunks(documents), max_tokens)
+
+
+def _format_documents(documents: list[Document]) -> str:
+    """将检索结果（已经 _prepare_passages 处理）格式化为带引用来源的片段文本。"""
     parts = []
     for i, doc in enumerate(documents, 1):
         meta = doc.metadata
@@ -171,6 +449,73 @@ def rag_retrieve(
             cite_source = f"作业{int(doc_id[2:4])}"
         else:
             cite_source = doc_id or "课程材料"
-        line = f"[{i}] 参见：{cite_source}" + (f"，章节：{section}" if section else "") + f"\n{doc.page_content[:500]}{'...' if len(doc.page_content) > 500 else ''}"
+        line = f"[{i}] 参见：{cite_source}" + (f"，章节：{section}" if section else "") + f"\n{doc.page_content}"
         parts.append(line)
-    return "以下为检索到的课程材料片段（引用时请用「参见第 X 讲 / 章节 Y」）：\n\n" + "\n\n".join(parts)
+    return "\n\n".join(parts)
+
+
+@tool
+def rag_retrieve(
+    query: str,
+    top_k: int = DEFAULT_RAG_TOP_K,
+    doc_id: str | None = None,
+    doc_type: str | None = None,
+    content_type: str | None = None,
+) -> str:
+    """
+    从课程文档向量库中检索与问题相关的片段。用于答疑时查找讲义/作业中的依据。
+    - query: 用户问题或关键词
+    - top_k: 返回最多几条片段（默认 8）
+    - doc_id: 可选，限定文档 id，如 lec01、hw02
+    - doc_type: 可选，限定类型：lecture、homework、solution
+    - content_type: 可选，限定内容类型
+    返回检索到的片段摘要文本，供生成带引用的回答。
+    """
+    documents = retrieve_documents(
+        query,
+        top_k=top_k,
+        filters=_build_filters(doc_id, doc_type, content_type),
+        mode=RAG_RETRIEVE_MODE,
+        backend=RAG_BACKEND,
+        expand=RAG_EXPAND,
+    )
+    if not documents:
+        return "未在课程材料中找到相关片段。"
+    return "以下为检索到的课程材料片段（引用时请用「参见第 X 讲 / 章节 Y」）：\n\n" + _format_documents(
+        _prepare_passages(documents)
+    )
+
+
+@tool
+def rag_retrieve_batch(
+    queries: list[str],
+    top_k: int = DEFAULT_RAG_TOP_K,
+    doc_id: str | None = None,
+    doc_type: str | None = None,
+    content_type: str | None = None,
+) -> str:
+    """
+    一次检索多个问题或关键词（如拆分后的子问题、同一问题的多种表述），比多次调用 rag_retrieve 更快。
+    - queries: 问题或关键词列表
+    - top_k: 每条 query 返回最多几条片段（默认 8）
+    - doc_id / doc_type / content_type: 可选过滤，对所有 query 生效，含义同 rag_retrieve
+    返回按 query 分组的片段摘要文本，供生成带引用的回答。
+    """
+    queries = [q for q in queries if q and q.strip()]
+    if not queries:
+        return "未提供检索问题。"
+    batches = retrieve_documents_batch(
+        queries,
+        top_k=top_k,
+        filters=_build_filters(doc_id, doc_type, content_type),
+        mode=RAG_RETRIEVE_MODE,
+        backend=RAG_BACKEND,
+        expand=RAG_EXPAND,
+    )
+    # 总预算在各 query 间均分，避免多 query 时上下文成倍膨胀
+    per_query_budget = CONTEXT_TOKEN_BUDGET // len(queries) if CONTEXT_TOKEN_BUDGET > 0 else 0
+    sections = []
+    for q, documents in zip(queries, batches):
+        body = _format_documents(_prepare_passages(documents, per_query_budget)) if documents else "未在课程材料中找到相关片段。"
+        sections.append(f"【检索：{q}】\n{body}")
+    return "以下为检索到的课程材料片段（引用时请用「参见第 X 讲 / 章节 Y」）：\n\n" + "\n\n".join(sections)
@@ -0,0 +1,109 @@
+"""
+检索结果缓存：LRU + TTL，缓存 retrieve_documents 的返回，重复问题跳过嵌入与 Chroma 查询。
+键含入库代数（chroma_client.get_generation），重新入库后旧条目自然失效。
+进程内单例：API 与 Dash 在同一进程运行时共用同一份缓存与计数。
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from langchain_core.documents import Document
+
+from src.common.env import env_float, env_int
+
+
+# RAG_CACHE_SIZE=0 关闭缓存；TTL 单位秒
+CACHE_SIZE = env_int("RAG_CACHE_SIZE", 256)
+CACHE_TTL = env_float("RAG_CACHE_TTL", 600.0)
+
+
+def normalize_where(where: dict[str, Any] | None) -> str:
+    """将 Chroma where 归一化为稳定字符串（键排序），用作缓存键的一部分。"""
+    if not where:
+        return ""
+    return json.dumps(where, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class RetrievalCache:
+    """线程安全的 LRU + TTL 缓存；值为 (page_content, metadata) 元组，取出时复制为新 Document。"""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, tuple[tuple[str, dict[str, Any]], ...]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, key: Hashable) -> list[Document] | None:
+        """命中返回 Document 列表（副本），未命中或已过期返回 None。"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return [Document(page_content=content, metadata=dict(meta)) for content, meta in value]
+
+    def put(self, key: Hashable, docs: list[Document]) -> None:
+        if not self.enabled:
+            return
+        value = tuple((d.page_content, dict(d.metadata)) for d in docs)
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_cache: RetrievalCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """进程内共享的检索缓存单例。"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RetrievalCache()
+    return _cache
@@ -10,6 +10,7 @@ import os
 import time
 import uuid
 from collections import defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
@@ -21,10 +22,12 @@ try:
 except ImportError:
     pass
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 
+from src.knowledge_graph.subgraph import MAX_SUBGRAPH_DEPTH
+
 from .schemas import (
     ChatRequestSchema,
     ChatResponseSchema,
@@ -40,6 +43,26 @@ logger = logging.getLogger(__name__)
 # Agent 会话历史（LangChain 用），与 web.app 的 SESSION_STORE 用途一致
 SESSION_STORE: dict[str, Any] = {}
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    启动时预热 Chroma 句柄池，首个 rag_retrieve 不再承担打开 SQLite 与加载嵌入函数的开销；
+    读入图快照文件并在后台与 Neo4j 比对，首个图谱请求不等待 Neo4j；
+    同时创建共享 Neo4j Driver 并建立首条连接，关闭时释放连接池。
+    """
+    from src.knowledge_graph import driver as neo4j_driver
+    from src.knowledge_graph import snapshot as graph_snapshot
+    from src.preprocessing.chroma_client import warm_up
+    warm_up()
+    graph_snapshot.warm_up()
+    neo4j_driver.warm_up()
+    try:
+        yield
+    finally:
+        neo4j_driver.close_driver()
+
+
 app = FastAPI(
     title="课程助教 API",
     description="Agentic Edu Helper：对话、会话管理、系统状态（tasks 7.1-7.3）",
@@ -50,6 +73,7 @@ app = FastAPI(
         {"name": "status", "description": "7.1.3 系统状态"},
         {"name": "graph", "description": "11.1 知识图谱子图与学习路径"},
     ],
+    lifespan=lifespan,
 )
 
 
@@ -133,25 +157,40 @@ async def log_request_time(request: Request, call_next):
 def _check_chroma() -> str:
     """返回 'ok' 或 'error'。"""
     try:
-        from src.agent.tools.rag import retrieve_documents
-        retrieve_documents("test", top_k=1)
+        from src.preprocessing.chroma_client import get_collection
+        get_collection().count()
         return "ok"
     except Exception:
         return "error"
 
 
+def _rag_cache_stats() -> dict[str, Any] | None:
+    """检索缓存计数（与 Dash 同进程时共用同一缓存）。"""
+    try:
+        from src.agent.tools.retrieval_cache import get_retrieval_cache
+        return get_retrieval_cache().stats()
+    except Exception:
+        return None
+
+
 def _check_neo4j() -> str:
-    """返回 'ok' 或 'error'。"""
+    """返回 'ok' 或 'error'（经共享 Driver 校验，不新建连接池）。"""
     try:
-        from src.agent.tools.graph import _get_driver
-        driver = _get_driver()
-        driver.verify_connectivity()
-        driver.close()
-        return "ok"
+        from src.knowledge_graph.driver import check_health
+        return check_health()
     except Exception:
         return "error"
 
 
+def _neo4j_pool_stats() -> dict[str, Any] | None:
+    """共享 Neo4j Driver 的连接池计数。"""
+    try:
+        from src.knowledge_graph.driver import pool_stats
+        return pool_stats()
+    except Exception:
+        return None
+
+
 # ---------- 7.1.1 对话接口 ----------
 @app.post(
     "/api/chat",
@@ -310,12 +349,14 @@ def delete_session(session_id: str):
     summary="系统状态与依赖健康",
 )
 def get_status():
-    """返回服务存活及可选的 Chroma、Neo4j 状态。"""
+    """返回服务存活及可选的 Chroma、Neo4j 状态、检索缓存计数与 Neo4j 连接池计数。"""
     return StatusResponseSchema(
         ok=True,
         service="agent-edu-api",
         chroma=_check_chroma(),
         neo4j=_check_neo4j(),
+        rag_cache=_rag_cache_stats(),
+        neo4j_pool=_neo4j_pool_stats(),
     )
 
 
@@ -327,11 +368,11 @@ def get_status():
 )
 def get_graph_subgraph(
     seed_id: str = "lec01",
-    max_depth: int = 2,
+    max_depth: int = Query(2, ge=0, le=MAX_SUBGRAPH_DEPTH),
     max_nodes: int = 50,
 ):
     """
-    从 seed_id 出发 BFS 遍历，返回 nodes/edges，单次最多 max_nodes 个节点。
+    从 seed_id 出发 BFS 遍历，返回 nodes/edges，单次最多 max_nodes 个节点；max_depth 不超过 MAX_SUBGRAPH_DEPTH（超出返回 422）。
     防止一次性加载全图，供前端 Cytoscape 按需展示。
     """
     try:
@@ -354,15 +395,11 @@ def get_graph_subgraph(
 def get_graph_learning_path(topic_id: str = "lec01"):
     """供前端高亮「推荐下一步」路径。"""
     try:
-        from src.agent.tools.graph import _get_driver
+        from src.knowledge_graph.driver import session as neo4j_session
         from src.knowledge_graph.learning_path import get_learning_path_from_topic
-        driver = _get_driver()
-        try:
-            with driver.session() as session:
-                path = get_learning_path_from_topic(session, topic_id)
-            return {"path": path}
-        finally:
-            driver.close()
+        with neo4j_session() as session:
+            path = get_learning_path_from_topic(session, topic_id)
+        return {"path": path}
     except Exception as e:
         logger.exception("get_graph_learning_path failed")
         return JSONResponse(
@@ -52,3 +52,5 @@ class StatusResponseSchema(BaseModel):
     service: str = "agent-edu-api"
     chroma: str | None = Field(default=None, description="Chroma 状态：ok / error")
     neo4j: str | None = Field(default=None, description="Neo4j 状态：ok / error")
+    rag_cache: dict[str, Any] | None = Field(default=None, description="检索缓存计数：size、hits、misses、evictions 等")
+    neo4j_pool: dict[str, Any] | None = Field(default=None, description="Neo4j 连接池计数：driver_active、in_use、peak_in_use、sessions_opened 等")
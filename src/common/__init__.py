@@ -0,0 +1,6 @@
+# 跨包共用的小工具（不依赖 preprocessing / agent / knowledge_graph，导入无副作用）
+from .env import env_float, env_int
+from .files import file_sha256
+from .pool import pool_context
+
+__all__ = ["env_int", "env_float", "file_sha256", "pool_context"]
@@ -0,0 +1,27 @@
+"""
+环境变量读取：未设置或无法解析时返回默认值。
+各模块的可配置常量（SPLITTER_*、RAG_*、NEO4J_POOL_* 等）统一经此读取。
+"""
+from __future__ import annotations
+
+import os
+
+
+def env_int(name: str, default: int) -> int:
+    v = os.environ.get(name)
+    if v is None:
+        return default
+    try:
+        return int(v)
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    v = os.environ.get(name)
+    if v is None:
+        return default
+    try:
+        return float(v)
+    except ValueError:
+        return default
@@ -0,0 +1,16 @@
+"""
+文件内容 hash：PDF 转换清单、断点与增量入库清单按文件字节 sha256 判断内容是否变化。
+"""
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+
+def file_sha256(path: Path) -> str:
+    """文件字节的 sha256（十六进制），按 1 MiB 分块读取。"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,13 @@
+"""
+进程池启动方式：切片、PDF 页面提取 / 渲染、批量 PDF 转换的 ProcessPoolExecutor 共用。
+"""
+from __future__ import annotations
+
+import multiprocessing
+
+
+def pool_context():
+    """进程池的 multiprocessing 上下文：优先 forkserver，否则 spawn。"""
+    # 调用方可能是多线程（如入库流水线的切片线程），fork 有死锁风险
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
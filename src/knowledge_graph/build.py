@@ -4,7 +4,9 @@
 """
 from __future__ import annotations
 
+import logging
 import os
+import time
 from pathlib import Path
 from typing import Any, TypedDict
 
@@ -15,6 +17,9 @@ except ImportError:
     from preprocessing.doc_index import load_doc_index, build_doc_index
 
 
+logger = logging.getLogger(__name__)
+
+
 class Topic(TypedDict):
     id: str
     name: str
@@ -77,6 +82,25 @@ def build_topics_and_exercises(doc_index: list[dict]) -> tuple[list[Topic], list
     return topics, exercises
 
 
+def build_topic_relations(topics: list[Topic], exercises: list[Exercise]) -> tuple[list[dict], list[dict]]:
+    """
+    生成 PREREQUISITE 与 COVERS 关系行 {"from_id", "to_id", ...属性}，供 Neo4j 导入与内存图快照共用。
+    PREREQUISITE: lec01 -> lec02 -> ... -> lec05（3.2.2 按讲次细化 strength：首尾稍低、中间稍高）；
+    COVERS: lec0i -> hw0i（3.2.2 relevance 固定 0.9，与 design 一致）。
+    """
+    n_t = len(topics)
+    prerequisites = [
+        {
+            "from_id": topics[i]["id"],
+            "to_id": topics[i + 1]["id"],
+            "strength": 0.75 if (i == 0 or i == n_t - 2) else 0.85,
+        }
+        for i in range(n_t - 1)
+    ]
+    covers = [{"from_id": t["id"], "to_id": ex["id"], "relevance": 0.9} for t, ex in zip(topics, exercises)]
+    return prerequisites, covers
+
+
 def ingest_to_neo4j(
     topics: list[Topic],
     exercises: list[Exercise],
@@ -87,11 +111,14 @@ def ingest_to_neo4j(
     clear_first: bool = True,
     doc_index: list[dict] | None = None,
     results_dir: Path | None = None,
+    batch_size: int | None = None,
 ) -> None:
     """
     2.4.4：将 Topic、Exercise 及 PREREQUISITE、COVERS 写入 Neo4j；
     若提供 doc_index 与 results_dir，则再写入 2.4.2 的 Concept 与 TEACHES/PRACTICES/DEPENDS_ON。
+    结束时写入 PREREQUISITE / DEPENDS_ON 传递闭包文件、图版本号与内存图快照文件（同一版本号）。
     clear_first: 是否先删除本课程相关节点与关系（含 Concept），避免重复导入。
+    各类节点 / 关系以 UNWIND 参数列表分批写入，每批一个显式事务；batch_size 默认 GRAPH_INGEST_BATCH_SIZE。
     """
     uri = uri or os.getenv("NEO4J_URI", "bolt://localhost:7687")
     user = user or os.getenv("NEO4J_USER", "neo4j")
@@ -103,9 +130,19 @@ def ingest_to_neo4j(
 
     try:
         from src.knowledge_graph import concepts as concepts_module
+        from src.knowledge_graph import snapshot as snapshot_module
+        from src.knowledge_graph import validate as validate_module
+        from src.knowledge_graph.closure import build_reachability, save_closures
+        from src.knowledge_graph.ingest_batch import write_batches
     except ImportError:
         from . import concepts as concepts_module
+        from . import snapshot as snapshot_module
+        from . import validate as validate_module
+        from .closure import build_reachability, save_closures
+        from .ingest_batch import write_batches
 
+    # 本次导入的图版本号：Neo4j (:GraphMeta)、快照文件与闭包文件一致
+    version = snapshot_module.new_version()
     driver = GraphDatabase.driver(uri, auth=(user, password))
     try:
         with driver.session() as session:
@@ -114,74 +151,95 @@ def ingest_to_neo4j(
                 session.run("MATCH (t:Topic) WHERE t.id STARTS WITH 'lec' OR t.id STARTS WITH 'hw' DETACH DELETE t")
                 session.run("MATCH (e:Exercise) WHERE e.id STARTS WITH 'hw' DETACH DELETE e")
 
-            for t in topics:
-                session.run(
-                    """
-                    MERGE (t:Topic {id: $id})
-                    SET t.name = $name, t.name_en = $name_en, t.order = $order,
-                        t.difficulty = $difficulty, t.description = $description
-                    """,
-                    id=t["id"],
-                    name=t["name"],
-                    name_en=t["name_en"],
-                    order=t["order"],
-                    difficulty=t["difficulty"],
-                    description=t["description"],
-                )
-
-            for e in exercises:
-                session.run(
-                    """
-                    MERGE (e:Exercise {id: $id})
-                    SET e.title = $title, e.difficulty = $difficulty, e.source = $source, e.problem_type = $problem_type
-                    """,
-                    id=e["id"],
-                    title=e["title"],
-                    difficulty=e["difficulty"],
-                    source=e["source"],
-                    problem_type=e["problem_type"],
-                )
+            # 2.4.3.3 索引（优化 MATCH 查询）：先于 MERGE 创建，MERGE / MATCH 按 id 走索引
+            validate_module.ensure_indexes(session)
 
-            # PREREQUISITE: lec01 -> lec02 -> ... -> lec05（3.2.2 按讲次细化 strength：首尾稍低、中间稍高）
-            n_t = len(topics)
-            for i in range(n_t - 1):
-                strength = 0.75 if (i == 0 or i == n_t - 2) else 0.85
-                session.run(
-                    """
-                    MATCH (a:Topic {id: $from_id}), (b:Topic {id: $to_id})
-                    MERGE (a)-[r:PREREQUISITE]->(b)
-                    SET r.strength = $strength
-                    """,
-                    from_id=topics[i]["id"],
-                    to_id=topics[i + 1]["id"],
-                    strength=strength,
-                )
+            t0 = time.perf_counter()
+            n_rows = write_batches(
+                session,
+                """
+                UNWIND $rows AS row
+                MERGE (t:Topic {id: row.id})
+                SET t.name = row.name, t.name_en = row.name_en, t.order = row.order,
+                    t.difficulty = row.difficulty, t.description = row.description
+                """,
+                topics,
+                batch_size=batch_size,
+                name="Topic",
+            )
+            n_rows += write_batches(
+                session,
+                """
+                UNWIND $rows AS row
+                MERGE (e:Exercise {id: row.id})
+                SET e.title = row.title, e.difficulty = row.difficulty, e.source = row.source,
+                    e.problem_type = row.problem_type
+                """,
+                exercises,
+                batch_size=batch_size,
+                name="Exercise",
+            )
 
-            # COVERS: lec0i -> hw0i（3.2.2 relevance 固定 0.9，与 design 一致）
-            for t, ex in zip(topics, exercises):
-                session.run(
-                    """
-                    MATCH (t:Topic {id: $topic_id}), (e:Exercise {id: $ex_id})
-                    MERGE (t)-[r:COVERS]->(e)
-                    SET r.relevance = $relevance
-                    """,
-                    topic_id=t["id"],
-                    ex_id=ex["id"],
-                    relevance=0.9,
-                )
+            prerequisites, covers = build_topic_relations(topics, exercises)
+            n_rows += write_batches(
+                session,
+                """
+                UNWIND $rows AS row
+                MATCH (a:Topic {id: row.from_id}), (b:Topic {id: row.to_id})
+                MERGE (a)-[r:PREREQUISITE]->(b)
+                SET r.strength = row.strength
+                """,
+                prerequisites,
+                batch_size=batch_size,
+                name="PREREQUISITE",
+            )
+            n_rows += write_batches(
+                session,
+                """
+                UNWIND $rows AS row
+                MATCH (t:Topic {id: row.from_id}), (e:Exercise {id: row.to_id})
+                MERGE (t)-[r:COVERS]->(e)
+                SET r.relevance = row.relevance
+                """,
+                covers,
+                batch_size=batch_size,
+                name="COVERS",
+            )
 
             # 2.4.2 概念抽取与细粒度关系
+            concept_graph = None
             if doc_index is not None and results_dir is not None:
+                concept_graph = concepts_module.build_concept_graph(doc_index, Path(results_dir))
                 concepts_module.ingest_concepts_and_relations_to_neo4j(
-                    session, doc_index, Path(results_dir)
+                    session,
+                    doc_index,
+                    Path(results_dir),
+                    concept_graph=concept_graph,
+                    version=version,
+                    batch_size=batch_size,
+                    ensure_schema=False,
                 )
+                n_rows += len(concept_graph["concepts"]) + sum(
+                    len(concept_graph[k]) for k in ("teaches", "practices", "depends_on")
+                )
+            elapsed = time.perf_counter() - t0
+            logger.info("Neo4j ingest: %d rows in %.2fs (%.0f rows/s)", n_rows, elapsed, n_rows / max(elapsed, 1e-9))
 
-            # 2.4.3.3 索引（优化 MATCH 查询）
-            try:
-                from src.knowledge_graph import validate as validate_module
-            except ImportError:
-                from . import validate as validate_module
-            validate_module.ensure_indexes(session)
+            # 先修传递闭包（无概念层时 DEPENDS_ON 闭包为空）；随后写入图版本号并导出同版本的内存快照文件
+            closures = {
+                "PREREQUISITE": build_reachability(
+                    [t["id"] for t in topics], ((row["from_id"], row["to_id"]) for row in prerequisites)
+                )
+            }
+            if concept_graph is None:
+                closures["DEPENDS_ON"] = build_reachability([], [])
+            save_closures(closures, version)
+            snapshot_module.write_neo4j_version(session, version)
+            snapshot_module.save_snapshot(
+                snapshot_module.graph_records(
+                    topics, exercises, concept_graph, prerequisites=prerequisites, covers=covers, version=version
+                )
+            )
     finally:
         driver.close()
 
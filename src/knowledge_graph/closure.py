@@ -0,0 +1,183 @@
+"""
+先修可达性索引：PREREQUISITE / DEPENDS_ON 的传递闭包，按节点存祖先与后代位集（uint64 字数组）。
+路径验证变为一次位运算：missing = ancestors(target) & ~learned；批量验证对候选行整体运算，不再逐个做变长遍历。
+图谱导入时构建并写入 GRAPH_CLOSURE_PATH（默认 config/graph_closure.npz，带图版本号），
+内存图快照（snapshot.GraphSnapshot.reachability）版本一致时直接加载，否则由快照邻接现算。
+"""
+from __future__ import annotations
+
+import os
+from collections import deque
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+CLOSURE_RELATIONSHIPS = ("PREREQUISITE", "DEPENDS_ON")
+
+
+def default_closure_path() -> Path:
+    """GRAPH_CLOSURE_PATH 或项目根下 config/graph_closure.npz。"""
+    path = os.getenv("GRAPH_CLOSURE_PATH")
+    if path:
+        return Path(path)
+    return Path(__file__).resolve().parents[2] / "config" / "graph_closure.npz"
+
+
+def _bit_words(n: int) -> int:
+    return max(1, (n + 63) // 64)
+
+
+class Reachability:
+    """
+    单一关系的传递闭包。ids[i] 的祖先集合为 ancestors[i] 中置位的下标（沿关系能走到 i 的节点，不含自身，
+    除非在环上），后代集合同理。位集按 64 位字存储，n 个节点占 n * ceil(n / 64) * 16 字节。
+    """
+
+    def __init__(self, ids: list[str], ancestors: np.ndarray, descendants: np.ndarray):
+        self.ids = list(ids)
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        self.ancestors_bits = ancestors
+        self.descendants_bits = descendants
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask(self, node_ids: Iterable[str]) -> np.ndarray:
+        """节点 id 集合 -> 位集（不在索引中的 id 忽略）。"""
+        flags = np.zeros(self.ancestors_bits.shape[1] * 64, dtype=np.uint8)
+        idx = [i for i in map(self.index.get, node_ids) if i is not None]
+        flags[idx] = 1
+        return np.packbits(flags, bitorder="little").view(np.uint64)
+
+    def _decode(self, bits: np.ndarray) -> list[str]:
+        flags = np.unpackbits(bits.view(np.uint8), bitorder="little")[: len(self.ids)]
+        return [self.ids[i] for i in np.flatnonzero(flags)]
+
+    def ancestors(self, node_id: str) -> list[str]:
+        i = self.index.get(node_id)
+        return [] if i is None else self._decode(self.ancestors_bits[i])
+
+    def descendants(self, node_id: str) -> list[str]:
+        i = self.index.get(node_id)
+        return [] if i is None else self._decode(self.descendants_bits[i])
+
+    def missing(self, target: str, learned: Iterable[str]) -> list[str]:
+        """target 的祖先中未在 learned 里的（不含 target 自身），按索引顺序。"""
+        i = self.index.get(target)
+        if i is None:
+            return []
+        bits = self.ancestors_bits[i] & ~self.mask(learned)
+        bits[i >> 6] &= ~np.uint64(1 << (i & 63))
+        return self._decode(bits)
+
+    def missing_many(self, targets: list[str], learned: Iterable[str]) -> dict[str, list[str]]:
+        """批量：每个候选 target 缺失的祖先；整批一次位运算，只对有缺失的行解码。"""
+        rows = [self.index.get(t) for t in targets]
+        known = [k for k, i in enumerate(rows) if i is not None]
+        out: dict[str, list[str]] = {t: [] for t in targets}
+        if not known:
+            return out
+        idx = np.array([rows[k] for k in known], dtype=np.int64)
+        bits = self.ancestors_bits[idx] & ~self.mask(learned)
+        # 去掉自身位（环上的节点会是自己的祖先）
+        bits[np.arange(len(idx)), idx >> 6] &= ~(np.uint64(1) << (idx & 63).astype(np.uint64))
+        for row in np.flatnonzero(bits.any(axis=1)):
+            out[targets[known[row]]] = self._decode(bits[row])
+        return out
+
+
+def build_reachability(ids: list[str], edges: Iterable[tuple[str, str]]) -> Reachability:
+    """
+    由节点 id 与有向边 (from_id, to_id) 计算传递闭包。按拓扑序合并前驱位集（DAG 上每条边一次字级 OR）；
+    有环时剩余节点按边迭代到不动点。端点不在 ids 中的边忽略。
+    """
+    ids = list(ids)
+    index = {node_id: i for i, node_id in enumerate(ids)}
+    n = len(ids)
+    words = _bit_words(n)
+    preds: list[list[int]] = [[] for _ in range(n)]
+    succs: list[list[int]] = [[] for _ in range(n)]
+    for a, b in edges:
+        i, j = index.get(a), index.get(b)
+        if i is not None and j is not None:
+            preds[j].append(i)
+            succs[i].append(j)
+    anc = np.zeros((n, words), dtype=np.uint64)
+    self_bit = np.zeros((n, words), dtype=np.uint64)
+    rows = np.arange(n)
+    self_bit[rows, rows >> 6] = np.left_shift(np.uint64(1), (rows & 63).astype(np.uint64))
+
+    indeg = [len(p) for p in preds]
+    queue = deque(i for i in range(n) if indeg[i] == 0)
+    done = 0
+    while queue:
+        v = queue.popleft()
+        done += 1
+        for p in preds[v]:
+            anc[v] |= anc[p] | self_bit[p]
+        for s in succs[v]:
+            indeg[s] -= 1
+            if indeg[s] == 0:
+                queue.append(s)
+    if done < n:
+        changed = True
+        while changed:
+            changed = False
+            for v in range(n):
+                for p in preds[v]:
+                    merged = anc[v] | anc[p] | self_bit[p]
+                    if not np.array_equal(merged, anc[v]):
+                        anc[v] = merged
+                        changed = True
+    return Reachability(ids, anc, _transpose_bits(anc, n))
+
+
+def _transpose_bits(bits: np.ndarray, n: int) -> np.ndarray:
+    """位矩阵转置：ancestors -> descendants。"""
+    dense = np.unpackbits(bits.view(np.uint8), axis=1, bitorder="little")[:, :n]
+    out = np.zeros((n, bits.shape[1] * 64), dtype=np.uint8)
+    out[:, :n] = dense.T
+    return np.packbits(out, axis=1, bitorder="little").view(np.uint64).reshape(n, bits.shape[1])
+
+
+def save_closures(closures: dict[str, Reachability], version: str, path: Path | None = None) -> Path:
+    """
+    写入各关系闭包，原子替换。文件中已有的其他关系仅在版本号相同时保留（同一次导入分步写入），
+    不同版本的一律丢弃，避免混用新旧图。
+    """
+    path = Path(path) if path else default_closure_path()
+    merged = {rel: r for rel, r in load_closures(path, version=version)[1].items() if rel not in closures}
+    merged.update(closures)
+    arrays: dict[str, np.ndarray] = {"version": np.array(version)}
+    for rel, r in merged.items():
+        arrays[f"{rel}__ids"] = np.array(r.ids, dtype=str)
+        arrays[f"{rel}__ancestors"] = r.ancestors_bits
+        arrays[f"{rel}__descendants"] = r.descendants_bits
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+def load_closures(path: Path | None = None, *, version: str | None = None) -> tuple[str | None, dict[str, Reachability]]:
+    """
+    读闭包文件，返回 (版本号, 关系 -> Reachability)；文件不存在或损坏时为 (None, {})。
+    指定 version 且与文件不一致时同样返回空，调用方应改为现算。
+    """
+    try:
+        with np.load(Path(path) if path else default_closure_path(), allow_pickle=False) as data:
+            file_version = str(data["version"])
+            if version is not None and file_version != version:
+                return None, {}
+            rels = {key.split("__")[0] for key in data.files if "__" in key}
+            return file_version, {
+                rel: Reachability(
+                    [str(x) for x in data[f"{rel}__ids"]], data[f"{rel}__ancestors"], data[f"{rel}__descendants"]
+                )
+                for rel in rels
+            }
+    except (OSError, ValueError, KeyError):
+        return None, {}
@@ -8,9 +8,9 @@ from pathlib import Path
 from typing import TypedDict
 
 try:
-    from src.preprocessing.md_loader import load_md
+    from src.preprocessing.artifact_cache import load_document
 except ImportError:
-    from preprocessing.md_loader import load_md
+    from preprocessing.artifact_cache import load_document
 
 
 class Concept(TypedDict):
@@ -35,12 +35,12 @@ def slugify(title: str) -> str:
 def extract_concepts_from_lecture(path: Path, doc_id: str) -> list[Concept]:
     """
     从讲义 .md 的章节标题（## / ###）抽取概念列表。
-    使用 md_loader.load_md 与 parse_md_headings 的 section 列表，跳过 level 1（文档标题）。
+    使用 artifact_cache.load_document（同 md_loader.load_md，与切片共用解析结果）的 section 列表，跳过 level 1（文档标题）。
     """
     path = Path(path)
     if not path.is_file():
         return []
-    _, sections = load_md(path)
+    _, sections = load_document(path)
     concepts: list[Concept] = []
     order = 0
     for sec in sections:
@@ -100,20 +100,22 @@ def _homework_entries(doc_index: list[dict]) -> list[dict]:
     return sorted(hw, key=lambda e: e.get("lecture_index", 0))
 
 
-def ingest_concepts_and_relations_to_neo4j(
-    session,
-    doc_index: list[dict],
-    results_dir: Path | None = None,
-) -> int:
+class ConceptGraph(TypedDict):
+    """概念层：Concept 节点及 TEACHES、PRACTICES、DEPENDS_ON 关系行 {"from_id", "to_id", ...属性}。"""
+    concepts: list[Concept]
+    teaches: list[dict]
+    practices: list[dict]
+    depends_on: list[dict]
+
+
+def build_concept_graph(doc_index: list[dict], results_dir: Path | None = None) -> ConceptGraph:
     """
-    将 Concept 节点及 TEACHES、PRACTICES、DEPENDS_ON 关系写入当前 Neo4j session。
-    使用 doc_index 中的 file_path 定位讲义；results_dir 未用时由 file_path 推导。
-    返回写入的 Concept 数量。
+    从讲义抽取 Concept 并生成 TEACHES、PRACTICES、DEPENDS_ON 关系行（不写库），供 Neo4j 导入与内存图快照共用。
+    使用 doc_index 中的 file_path 定位讲义；找不到时在 results_dir 下按文件名查找。
     """
     lectures = _lecture_entries(doc_index)
     homework = _homework_entries(doc_index)
     concepts_by_lecture: dict[str, list[Concept]] = {}
-
     for entry in lectures:
         doc_id = entry["doc_id"]
         path = Path(entry.get("file_path", ""))
@@ -121,83 +123,122 @@ def ingest_concepts_and_relations_to_neo4j(
             path = Path(results_dir) / path.name
         if not path.is_file():
             continue
-        concepts = extract_concepts_from_lecture(path, doc_id)
-        concepts_by_lecture[doc_id] = concepts
-
-        for c in concepts:
-            session.run(
-                """
-                MERGE (c:Concept {id: $id})
-                SET c.name = $name, c.name_en = $name_en, c.source_lecture = $source_lecture,
-                    c.description = $description, c.order = $order, c.difficulty = $difficulty
-                """,
-                id=c["id"],
-                name=c["name"],
-                name_en=c["name_en"],
-                source_lecture=c["source_lecture"],
-                description=c["description"],
-                order=c["order"],
-                difficulty=c.get("difficulty", "intermediate"),
-            )
-
-        topic_id = doc_id
-        for c in concepts:
-            session.run(
-                """
-                MATCH (t:Topic {id: $topic_id}), (c:Concept {id: $concept_id})
-                MERGE (t)-[:TEACHES]->(c)
-                """,
-                topic_id=topic_id,
-                concept_id=c["id"],
-            )
+        concepts_by_lecture[doc_id] = extract_concepts_from_lecture(path, doc_id)
 
+    teaches = [
+        {"from_id": doc_id, "to_id": c["id"]}
+        for doc_id, concepts in concepts_by_lecture.items()
+        for c in concepts
+    ]
     # PRACTICES: hw0i -> 该讲下全部 Concept（related_lec 对应）
-    for hw_entry in homework:
-        ex_id = hw_entry["doc_id"]
-        related_lec = hw_entry.get("related_lec")
-        if not related_lec or related_lec not in concepts_by_lecture:
-            continue
-        for c in concepts_by_lecture[related_lec]:
-            session.run(
-                """
-                MATCH (e:Exercise {id: $ex_id}), (c:Concept {id: $concept_id})
-                MERGE (e)-[:PRACTICES]->(c)
-                """,
-                ex_id=ex_id,
-                concept_id=c["id"],
-            )
-
+    practices = [
+        {"from_id": hw_entry["doc_id"], "to_id": c["id"]}
+        for hw_entry in homework
+        for c in concepts_by_lecture.get(hw_entry.get("related_lec") or "", [])
+    ]
     # DEPENDS_ON: 同讲内按 order 链（3.2.2 type=same_lecture, weight=1.0）；跨讲（type=cross_lecture, weight=0.8）
-    for doc_id, concepts in concepts_by_lecture.items():
-        for i in range(len(concepts) - 1):
-            session.run(
-                """
-                MATCH (a:Concept {id: $from_id}), (b:Concept {id: $to_id})
-                MERGE (a)-[r:DEPENDS_ON]->(b)
-                SET r.type = $rel_type, r.weight = $weight
-                """,
-                from_id=concepts[i]["id"],
-                to_id=concepts[i + 1]["id"],
-                rel_type="same_lecture",
-                weight=1.0,
-            )
+    depends_on = [
+        {"from_id": concepts[i]["id"], "to_id": concepts[i + 1]["id"], "rel_type": "same_lecture", "weight": 1.0}
+        for concepts in concepts_by_lecture.values()
+        for i in range(len(concepts) - 1)
+    ]
     # 跨讲：前一讲最后一个概念 -> 下一讲第一个概念
     for k in range(len(lectures) - 1):
-        curr_id = lectures[k]["doc_id"]
-        next_id = lectures[k + 1]["doc_id"]
-        curr_c = concepts_by_lecture.get(curr_id, [])
-        next_c = concepts_by_lecture.get(next_id, [])
+        curr_c = concepts_by_lecture.get(lectures[k]["doc_id"], [])
+        next_c = concepts_by_lecture.get(lectures[k + 1]["doc_id"], [])
         if curr_c and next_c:
-            session.run(
-                """
-                MATCH (a:Concept {id: $from_id}), (b:Concept {id: $to_id})
-                MERGE (a)-[r:DEPENDS_ON]->(b)
-                SET r.type = $rel_type, r.weight = $weight
-                """,
-                from_id=curr_c[-1]["id"],
-                to_id=next_c[0]["id"],
-                rel_type="cross_lecture",
-                weight=0.8,
+            depends_on.append(
+                {"from_id": curr_c[-1]["id"], "to_id": next_c[0]["id"], "rel_type": "cross_lecture", "weight": 0.8}
             )
+    return {
+        "concepts": [c for concepts in concepts_by_lecture.values() for c in concepts],
+        "teaches": teaches,
+        "practices": practices,
+        "depends_on": depends_on,
+    }
+
 
-    return sum(len(cs) for cs in concepts_by_lecture.values())
+def ingest_concepts_and_relations_to_neo4j(
+    session,
+    doc_index: list[dict],
+    results_dir: Path | None = None,
+    *,
+    concept_graph: ConceptGraph | None = None,
+    version: str | None = None,
+    batch_size: int | None = None,
+    ensure_schema: bool = True,
+) -> int:
+    """
+    将 Concept 节点及 TEACHES、PRACTICES、DEPENDS_ON 关系写入当前 Neo4j session。
+    关系由 build_concept_graph 生成；已生成时可经 concept_graph 传入，避免重复解析讲义。
+    先建索引（ensure_schema=False 时由调用方负责），再以 UNWIND 参数列表分批写入，每批一个显式事务。
+    version 为本次导入的图版本号（build.ingest_to_neo4j 传入）时，同时计算 DEPENDS_ON 传递闭包并写入闭包文件；
+    单独导入概念（version=None）不写闭包：新版本号既对不上任何快照，还会使闭包文件丢弃同版本的 PREREQUISITE 闭包。
+    返回写入的 Concept 数量。
+    """
+    from .ingest_batch import write_batches
+
+    graph = concept_graph if concept_graph is not None else build_concept_graph(doc_index, results_dir)
+    if ensure_schema:
+        from .validate import ensure_indexes
+        ensure_indexes(session)
+    write_batches(
+        session,
+        """
+        UNWIND $rows AS row
+        MERGE (c:Concept {id: row.id})
+        SET c.name = row.name, c.name_en = row.name_en, c.source_lecture = row.source_lecture,
+            c.description = row.description, c.order = row.order, c.difficulty = row.difficulty
+        """,
+        ({**c, "difficulty": c.get("difficulty", "intermediate")} for c in graph["concepts"]),
+        batch_size=batch_size,
+        name="Concept",
+    )
+    write_batches(
+        session,
+        """
+        UNWIND $rows AS row
+        MATCH (t:Topic {id: row.from_id}), (c:Concept {id: row.to_id})
+        MERGE (t)-[:TEACHES]->(c)
+        """,
+        graph["teaches"],
+        batch_size=batch_size,
+        name="TEACHES",
+    )
+    write_batches(
+        session,
+        """
+        UNWIND $rows AS row
+        MATCH (e:Exercise {id: row.from_id}), (c:Concept {id: row.to_id})
+        MERGE (e)-[:PRACTICES]->(c)
+        """,
+        graph["practices"],
+        batch_size=batch_size,
+        name="PRACTICES",
+    )
+    write_batches(
+        session,
+        """
+        UNWIND $rows AS row
+        MATCH (a:Concept {id: row.from_id}), (b:Concept {id: row.to_id})
+        MERGE (a)-[r:DEPENDS_ON]->(b)
+        SET r.type = row.rel_type, r.weight = row.weight
+        """,
+        graph["depends_on"],
+        batch_size=batch_size,
+        name="DEPENDS_ON",
+    )
+    if version is not None:
+        save_depends_on_closure(graph, version)
+    return len(graph["concepts"])
+
+
+def save_depends_on_closure(graph: ConceptGraph, version: str) -> None:
+    """DEPENDS_ON 传递闭包（概念 -> 全部前置 / 后续概念位集）以图版本号 version 写入 closure.default_closure_path()。"""
+    from .closure import build_reachability, save_closures
+
+    reach = build_reachability(
+        [c["id"] for c in graph["concepts"]],
+        ((row["from_id"], row["to_id"]) for row in graph["depends_on"]),
+    )
+    save_closures({"DEPENDS_ON": reach}, version)
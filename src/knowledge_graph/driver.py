@@ -0,0 +1,146 @@
+"""
+Neo4j 驱动单例：进程内共享一个带连接池的 Driver，图谱工具、子图查询与 API 复用已建立的 Bolt 连接。
+避免每次查询都重新 TCP 握手 + Bolt 握手 + 认证；API 启动时 warm_up、关闭时 close_driver。
+连接池参数可由环境变量配置（NEO4J_POOL_SIZE 等）；pool_stats() 给出会话计数，供 /api/status 展示。
+fork 出的子进程不复用父进程的连接（按 pid 重建）。
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from src.common.env import env_float, env_int
+
+
+_logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_driver: Any = None
+_driver_pid: int | None = None
+_driver_settings: dict[str, Any] = {}
+_stats = {
+    "drivers_created": 0,
+    "sessions_opened": 0,
+    "sessions_failed": 0,
+    "in_use": 0,
+    "peak_in_use": 0,
+}
+
+
+def pool_settings() -> dict[str, Any]:
+    """连接池配置（读环境变量）：最大连接数、取连接超时、连接最长存活、建连超时（秒）。"""
+    return {
+        "max_connection_pool_size": env_int("NEO4J_POOL_SIZE", 50),
+        "connection_acquisition_timeout": env_float("NEO4J_POOL_ACQUIRE_TIMEOUT", 30.0),
+        "max_connection_lifetime": env_float("NEO4J_MAX_CONNECTION_LIFETIME", 3600.0),
+        "connection_timeout": env_float("NEO4J_CONNECTION_TIMEOUT", 15.0),
+    }
+
+
+def _connection_params() -> tuple[str, str, str]:
+    uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+    user = os.getenv("NEO4J_USER", "neo4j")
+    password = os.getenv("NEO4J_PASSWORD")
+    if not password:
+        raise ValueError("NEO4J_PASSWORD is required for Neo4j. Set it in .env")
+    return uri, user, password
+
+
+def get_driver():
+    """返回进程内共享的 Driver（首次调用时创建）；Driver 线程安全，每次查询各自开 session。"""
+    global _driver, _driver_pid, _driver_settings
+    driver = _driver
+    if driver is not None and _driver_pid == os.getpid():
+        return driver
+    with _lock:
+        if _driver is not None and _driver_pid == os.getpid():
+            return _driver
+        uri, user, password = _connection_params()
+        from neo4j import GraphDatabase
+        settings = pool_settings()
+        # 父进程的连接不能在子进程里用，也不在子进程里 close（会影响父进程的 socket），直接丢弃
+        _driver = GraphDatabase.driver(uri, auth=(user, password), **settings)
+        _driver_pid = os.getpid()
+        _driver_settings = {"uri": uri, **settings}
+        _stats["drivers_created"] += 1
+        _logger.info("Neo4j driver created: %s (pool size %d)", uri, settings["max_connection_pool_size"])
+        return _driver
+
+
+@contextmanager
+def session(**kwargs: Any) -> Iterator[Any]:
+    """从共享 Driver 的连接池借一个 session，退出时归还（session 非线程安全，不要跨线程共享）。"""
+    try:
+        s = get_driver().session(**kwargs)
+    except Exception:
+        with _lock:
+            _stats["sessions_failed"] += 1
+        raise
+    with _lock:
+        _stats["sessions_opened"] += 1
+        _stats["in_use"] += 1
+        _stats["peak_in_use"] = max(_stats["peak_in_use"], _stats["in_use"])
+    try:
+        with s:
+            yield s
+    finally:
+        with _lock:
+            _stats["in_use"] -= 1
+
+
+def run(fn):
+    """在共享连接池的 session 上执行 fn(session)，返回 fn 的返回值。"""
+    with session() as s:
+        return fn(s)
+
+
+def close_driver() -> None:
+    """关闭共享 Driver 并释放连接池（API 关闭时调用）；下次 get_driver 重新创建。"""
+    global _driver, _driver_pid
+    with _lock:
+        driver, owner = _driver, _driver_pid
+        _driver, _driver_pid = None, None
+    if driver is not None and owner == os.getpid():
+        try:
+            driver.close()
+        except Exception as e:
+            _logger.warning("Neo4j driver close failed: %s", e)
+
+
+def check_health() -> str:
+    """返回 'ok' 或 'error'：用共享 Driver 校验连通性（复用池内连接，不新建 Driver）。"""
+    try:
+        get_driver().verify_connectivity()
+        return "ok"
+    except Exception:
+        return "error"
+
+
+def warm_up() -> bool:
+    """预先创建 Driver 并建立一条连接（供 API 启动时调用）；未配置或连不上只记日志，返回是否成功。"""
+    if not os.getenv("NEO4J_PASSWORD"):
+        return False
+    t0 = time.perf_counter()
+    try:
+        get_driver().verify_connectivity()
+    except Exception as e:
+        _logger.warning("Neo4j warm-up failed: %s", e)
+        return False
+    _logger.info("Neo4j warm-up done in %.0f ms", (time.perf_counter() - t0) * 1000)
+    return True
+
+
+def pool_stats() -> dict[str, Any]:
+    """连接池计数：是否已创建 Driver、配置的池大小、已借出 session 数与峰值、累计 session 数等。"""
+    with _lock:
+        out: dict[str, Any] = dict(_stats)
+        active = _driver is not None and _driver_pid == os.getpid()
+        out["driver_active"] = active
+        out["max_connection_pool_size"] = (
+            _driver_settings.get("max_connection_pool_size") if active else pool_settings()["max_connection_pool_size"]
+        )
+    return out
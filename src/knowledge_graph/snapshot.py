@@ -0,0 +1,427 @@
+"""
+进程内知识图谱快照：课程图很小（lec01～lec05、作业、概念），只读查询无需每次往返 Neo4j。
+- 节点 id 驻留为连续整数下标；属性按列存储（struct-of-arrays）
+- 每种关系一组 CSR 邻接数组（offsets + targets），正反两向
+来源以 Neo4j 为准：每 GRAPH_SNAPSHOT_CHECK_SECONDS 秒（后台线程）比对一次 Neo4j 图状态
+（(:GraphMeta).version 与节点 / 关系总数），与当前快照不一致即整体重建，其他主机上的导入、单独的概念导入、
+手工增删同样可见。图谱导入时写出的快照文件（GRAPH_SNAPSHOT_PATH，默认 config/graph_snapshot.json）
+用作首次后台比对完成前的初始快照（请求路径从不同步等待 Neo4j），以及 Neo4j 不可用时的后备
+（比对失败时沿用；其后文件被重新导出则改读文件）。API 启动时 warm_up 即读文件并开始后台比对。
+graph 工具优先查快照，取不到快照时退回 Neo4j；Neo4j 宕机时仍可用最近一次加载的快照。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Iterable, TypedDict
+
+import numpy as np
+
+from src.common.env import env_int
+
+RELATIONSHIPS = ("PREREQUISITE", "COVERS", "TEACHES", "PRACTICES", "DEPENDS_ON")
+NODE_LABELS = ("Topic", "Exercise", "Concept")
+# 工具与子图展示用到的节点属性（description 等长文本不进快照）
+PROPERTY_COLUMNS = ("name", "name_en", "title", "order", "difficulty", "source_lecture")
+# 传递闭包索引覆盖的关系及其节点标签
+CLOSURE_LABELS = {"PREREQUISITE": "Topic", "DEPENDS_ON": "Concept"}
+META_LABEL = "GraphMeta"
+META_ID = "course"
+SNAPSHOT_FORMAT = 1
+
+
+SNAPSHOT_DISABLED = os.getenv("GRAPH_SNAPSHOT_DISABLED", "").strip().lower() in ("1", "true", "yes")
+# 多久比对一次 Neo4j 图状态（秒）；取 Neo4j 失败后同样间隔再重试
+CHECK_SECONDS = env_int("GRAPH_SNAPSHOT_CHECK_SECONDS", 30)
+
+_logger = logging.getLogger(__name__)
+
+
+class GraphRecords(TypedDict):
+    version: str
+    nodes: list[dict[str, Any]]  # {"id", "label", ...PROPERTY_COLUMNS}
+    edges: list[list[str]]  # [from_id, rel_type, to_id]
+
+
+def default_snapshot_path() -> Path:
+    """GRAPH_SNAPSHOT_PATH 或项目根下 config/graph_snapshot.json。"""
+    path = os.getenv("GRAPH_SNAPSHOT_PATH")
+    if path:
+        return Path(path)
+    return Path(__file__).resolve().parents[2] / "config" / "graph_snapshot.json"
+
+
+def new_version() -> str:
+    return str(time.time_ns())
+
+
+def _csr(n: int, src: np.ndarray, dst: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """按 src 分组的邻接数组：targets[offsets[i]:offsets[i + 1]] 为 i 的邻居（保持边的输入顺序）。"""
+    order = np.argsort(src, kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+    return offsets, dst[order].astype(np.int32)
+
+
+class GraphSnapshot:
+    """不可变的图快照；按节点下标访问，id 与下标经 index / ids 互转。"""
+
+    def __init__(self, records: GraphRecords):
+        self.version = str(records.get("version") or "")
+        nodes = records.get("nodes") or []
+        self.ids: list[str] = [n["id"] for n in nodes]
+        self.index: dict[str, int] = {node_id: i for i, node_id in enumerate(self.ids)}
+        label_code = {label: k for k, label in enumerate(NODE_LABELS)}
+        self.labels = np.array([label_code.get(n.get("label"), -1) for n in nodes], dtype=np.int8)
+        self.props: dict[str, list[Any]] = {col: [n.get(col) for n in nodes] for col in PROPERTY_COLUMNS}
+        n = len(self.ids)
+        pairs: dict[str, list[tuple[int, int]]] = {rel: [] for rel in RELATIONSHIPS}
+        for a, rel, b in records.get("edges") or []:
+            i, j = self.index.get(a), self.index.get(b)
+            if i is not None and j is not None and rel in pairs:
+                pairs[rel].append((i, j))
+        self._out: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._in: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for rel, edges in pairs.items():
+            arr = np.array(edges, dtype=np.int64).reshape(-1, 2)
+            self._out[rel] = _csr(n, arr[:, 0], arr[:, 1])
+            self._in[rel] = _csr(n, arr[:, 1], arr[:, 0])
+        self._reachability: dict[str, Any] = {}
+        self._undirected: list[list[int]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def edge_count(self, rel: str | None = None) -> int:
+        rels = RELATIONSHIPS if rel is None else (rel,)
+        return sum(len(self._out[r][1]) for r in rels)
+
+    def node(self, node_id: str, label: str | None = None) -> int | None:
+        """id 对应的下标；指定 label 时标签不符也返回 None。"""
+        i = self.index.get(node_id)
+        if i is None or (label is not None and self.label(i) != label):
+            return None
+        return i
+
+    def label(self, i: int) -> str:
+        code = int(self.labels[i])
+        return NODE_LABELS[code] if code >= 0 else "Node"
+
+    def prop(self, i: int, name: str) -> Any:
+        return self.props[name][i]
+
+    def successors(self, i: int, rel: str) -> list[int]:
+        offsets, targets = self._out[rel]
+        return targets[offsets[i]:offsets[i + 1]].tolist()
+
+    def predecessors(self, i: int, rel: str) -> list[int]:
+        offsets, targets = self._in[rel]
+        return targets[offsets[i]:offsets[i + 1]].tolist()
+
+    def undirected(self) -> list[list[int]]:
+        """全部关系合并的无向邻接表（按关系、出边后入边排列，平行边保留），首次调用时构建并缓存。"""
+        if self._undirected is None:
+            self._undirected = [
+                [v for rel in RELATIONSHIPS for v in self.successors(i, rel) + self.predecessors(i, rel)]
+                for i in range(len(self.ids))
+            ]
+        return self._undirected
+
+    def reachable(self, i: int, rel: str, *, reverse: bool = False) -> list[int]:
+        """沿 rel 走 1 步及以上可达的节点（BFS 序；起点只在有环回到自身时出现），reverse=True 时逆向。"""
+        offsets, targets = (self._in if reverse else self._out)[rel]
+        seen = {i}
+        out: list[int] = []
+        queue = deque([i])
+        while queue:
+            u = queue.popleft()
+            for v in targets[offsets[u]:offsets[u + 1]].tolist():
+                if v == i and i not in out:
+                    out.append(i)
+                if v not in seen:
+                    seen.add(v)
+                    out.append(v)
+                    queue.append(v)
+        return out
+
+    def reachability(self, rel: str):
+        """
+        rel（PREREQUISITE 或 DEPENDS_ON）的传递闭包位集（closure.Reachability），节点为该关系对应的标签。
+        导入时写出的闭包文件版本与快照一致时直接加载，否则由快照邻接现算；结果缓存在快照上。
+        """
+        cached = self._reachability.get(rel)
+        if cached is not None:
+            return cached
+        from .closure import build_reachability, load_closures
+
+        persisted = load_closures(version=self.version)[1] if self.version else {}
+        for name, reach in persisted.items():
+            self._reachability.setdefault(name, reach)
+        if rel not in self._reachability:
+            label = CLOSURE_LABELS[rel]
+            nodes = [i for i in range(len(self.ids)) if self.label(i) == label]
+            edges = ((self.ids[i], self.ids[j]) for i in nodes for j in self.successors(i, rel))
+            self._reachability[rel] = build_reachability([self.ids[i] for i in nodes], edges)
+        return self._reachability[rel]
+
+    def to_records(self) -> GraphRecords:
+        nodes = [
+            {"id": node_id, "label": self.label(i), **{col: self.props[col][i] for col in PROPERTY_COLUMNS}}
+            for i, node_id in enumerate(self.ids)
+        ]
+        edges = [
+            [self.ids[i], rel, self.ids[j]]
+            for rel in RELATIONSHIPS
+            for i in range(len(self.ids))
+            for j in self.successors(i, rel)
+        ]
+        return {"version": self.version, "nodes": nodes, "edges": edges}
+
+
+def graph_records(
+    topics: Iterable[dict],
+    exercises: Iterable[dict],
+    concept_graph: dict | None = None,
+    *,
+    prerequisites: Iterable[dict] | None = None,
+    covers: Iterable[dict] | None = None,
+    version: str | None = None,
+) -> GraphRecords:
+    """由 build / concepts 的构建结果组装快照记录（与写入 Neo4j 的内容一致），无需连接数据库。"""
+    from .build import build_topic_relations
+
+    topics, exercises = list(topics), list(exercises)
+    if prerequisites is None or covers is None:
+        prerequisites, covers = build_topic_relations(topics, exercises)  # type: ignore[arg-type]
+
+    def node(label: str, item: dict) -> dict[str, Any]:
+        return {"id": item["id"], "label": label, **{col: item.get(col) for col in PROPERTY_COLUMNS if col in item}}
+
+    nodes = [node("Topic", t) for t in topics] + [node("Exercise", e) for e in exercises]
+    rels: list[tuple[str, Iterable[dict]]] = [("PREREQUISITE", prerequisites), ("COVERS", covers)]
+    if concept_graph is not None:
+        nodes += [node("Concept", c) for c in concept_graph["concepts"]]
+        rels += [
+            ("TEACHES", concept_graph["teaches"]),
+            ("PRACTICES", concept_graph["practices"]),
+            ("DEPENDS_ON", concept_graph["depends_on"]),
+        ]
+    edges = [[row["from_id"], rel, row["to_id"]] for rel, rows in rels for row in rows]
+    return {"version": version or new_version(), "nodes": nodes, "edges": edges}
+
+
+def build_records_from_doc_index(doc_index: list[dict], results_dir: Path | None = None) -> GraphRecords:
+    """直接调用 build / concepts 的构建函数得到快照记录（不经 Neo4j）。"""
+    from .build import build_topics_and_exercises
+    from .concepts import build_concept_graph
+
+    topics, exercises = build_topics_and_exercises(doc_index)
+    return graph_records(topics, exercises, build_concept_graph(doc_index, results_dir))
+
+
+def read_neo4j_version(session) -> str | None:
+    row = session.run(
+        f"MATCH (m:{META_LABEL} {{id: $id}}) RETURN m.version AS version", id=META_ID
+    ).single()
+    return row["version"] if row else None
+
+
+def read_neo4j_state(session) -> tuple[str | None, int, int]:
+    """
+    (版本号, 节点总数, 关系总数)：一次往返，计数走 Neo4j 计数存储，不扫描图。
+    导入会更新版本号；单独执行的概念导入、手工 Cypher 增删节点 / 关系改变计数，同样触发快照重建
+    （只改属性的手工修改需调用 write_neo4j_version 写入新版本号）。
+    """
+    row = session.run(
+        f"""
+        OPTIONAL MATCH (m:{META_LABEL} {{id: $id}})
+        WITH m.version AS version LIMIT 1
+        CALL {{ MATCH (n) RETURN count(n) AS nodes }}
+        CALL {{ MATCH ()-[r]->() RETURN count(r) AS rels }}
+        RETURN version, nodes, rels
+        """,
+        id=META_ID,
+    ).single()
+    return (row["version"], int(row["nodes"]), int(row["rels"])) if row else (None, 0, 0)
+
+
+def write_neo4j_version(session, version: str) -> None:
+    """导入结束时写入图版本号，其他进程的 Neo4j 来源快照据此刷新。"""
+    session.run(f"MERGE (m:{META_LABEL} {{id: $id}}) SET m.version = $version", id=META_ID, version=version)
+
+
+def load_records_from_neo4j(session) -> GraphRecords:
+    """读 Topic/Exercise/Concept 节点（仅 PROPERTY_COLUMNS）及五类关系。"""
+    columns = ", ".join(f"n.{col} AS {col}" for col in PROPERTY_COLUMNS)
+    labels = " OR ".join(f"n:{label}" for label in NODE_LABELS)
+    nodes = []
+    for r in session.run(f"MATCH (n) WHERE ({labels}) AND n.id IS NOT NULL RETURN n.id AS id, labels(n) AS labels, {columns}"):
+        label = next((lb for lb in r["labels"] if lb in NODE_LABELS), None)
+        nodes.append({"id": r["id"], "label": label, **{col: r[col] for col in PROPERTY_COLUMNS if r[col] is not None}})
+    rel_pattern = "|".join(RELATIONSHIPS)
+    edges = [
+        [r["a"], r["rel"], r["b"]]
+        for r in session.run(f"MATCH (a)-[r:{rel_pattern}]->(b) RETURN a.id AS a, type(r) AS rel, b.id AS b")
+    ]
+    return {"version": read_neo4j_version(session) or "", "nodes": nodes, "edges": edges}
+
+
+def save_snapshot(records: GraphRecords, path: Path | None = None) -> Path:
+    """原子写入快照文件（临时文件 + os.replace），读侧按文件 stamp 感知新版本。"""
+    path = Path(path) if path else default_snapshot_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"format": SNAPSHOT_FORMAT, **records}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+    return path
+
+
+def load_snapshot_file(path: Path | None = None) -> GraphSnapshot | None:
+    """读快照文件；不存在、损坏或格式不符时返回 None。"""
+    try:
+        with open(Path(path) if path else default_snapshot_path(), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("format") != SNAPSHOT_FORMAT:
+        return None
+    return GraphSnapshot(data)
+
+
+_lock = threading.Lock()
+# 同一时刻只有一个刷新（首次同步加载或后台比对）
+_refreshing = threading.Lock()
+# 当前快照、其对应的 Neo4j 图状态（read_neo4j_state；来自文件且尚未比对时为 None）、
+# 最近看到的快照文件 stamp、上次比对 Neo4j 的时间（monotonic，0 表示从未）
+_state: dict[str, Any] = {"snapshot": None, "neo4j": None, "stamp": None, "checked": 0.0}
+
+
+def _file_stamp(path: Path) -> tuple[int, int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_ino, st.st_size
+
+
+def _matches(snap: GraphSnapshot, known: tuple | None, state: tuple) -> bool:
+    """Neo4j 当前状态是否仍对应 snap：比对过的比较完整状态，文件来源的首次比较版本号。"""
+    if known is not None:
+        return state == known
+    return state[0] is not None and state[0] == snap.version
+
+
+def _load_file_fallback(stamp: tuple[int, int, int] | None) -> None:
+    """Neo4j 不可用时：尚无快照，或快照文件自上次以来有变化，才从文件加载。"""
+    if stamp is None or (_state["snapshot"] is not None and stamp == _state["stamp"]):
+        return
+    path = default_snapshot_path()
+    loaded = load_snapshot_file(path)
+    if loaded is None:
+        return
+    with _lock:
+        _state.update(snapshot=loaded, neo4j=None, stamp=stamp)
+    _logger.info("Graph snapshot loaded from %s: version %s", path, loaded.version)
+
+
+def refresh() -> GraphSnapshot | None:
+    """
+    比对 Neo4j 的图状态（(:GraphMeta).version 与节点 / 关系总数），与当前快照不一致时从 Neo4j 重读整图。
+    Neo4j 不可用时保留当前快照；尚无快照（或快照文件有更新）时改用快照文件。返回刷新后的快照。
+    """
+    with _refreshing:
+        return _refresh_locked()
+
+
+def _refresh_locked() -> GraphSnapshot | None:
+    _state["checked"] = time.monotonic()
+    stamp = _file_stamp(default_snapshot_path())
+    current, known = _state["snapshot"], _state["neo4j"]
+    try:
+        from .driver import session as driver_session
+
+        with driver_session() as session:
+            state = read_neo4j_state(session)
+            if current is not None and _matches(current, known, state):
+                _state["neo4j"] = state
+                return current
+            snap = GraphSnapshot(load_records_from_neo4j(session))
+    except Exception as e:
+        _logger.debug("Graph snapshot refresh from Neo4j failed: %s", e)
+        _load_file_fallback(stamp)
+        return _state["snapshot"]
+    if not len(snap):
+        _load_file_fallback(stamp)
+        return _state["snapshot"]
+    with _lock:
+        _state.update(snapshot=snap, neo4j=state, stamp=stamp)
+    _logger.info("Graph snapshot loaded from Neo4j: version %s, %d nodes, %d edges", snap.version, len(snap), snap.edge_count())
+    return snap
+
+
+def _refresh_in_background() -> None:
+    """到期时起一个后台线程执行 refresh；已有刷新在进行时直接返回（请求路径不阻塞）。"""
+    if not _refreshing.acquire(blocking=False):
+        return
+    _state["checked"] = time.monotonic()
+
+    def run() -> None:
+        try:
+            _refresh_locked()
+        except Exception as e:
+            _logger.warning("Graph snapshot refresh failed: %s", e)
+        finally:
+            _refreshing.release()
+
+    try:
+        threading.Thread(target=run, name="graph-snapshot-refresh", daemon=True).start()
+    except RuntimeError:
+        _refreshing.release()
+
+
+def _load_file_if_empty() -> None:
+    """尚无快照时先读快照文件（不访问 Neo4j），之后由后台比对替换。"""
+    path = default_snapshot_path()
+    stamp = _file_stamp(path)
+    if stamp is None:
+        return
+    loaded = load_snapshot_file(path)
+    if loaded is None:
+        return
+    with _lock:
+        if _state["snapshot"] is None:
+            _state.update(snapshot=loaded, neo4j=None, stamp=stamp)
+            _logger.info("Graph snapshot loaded from %s: version %s (pending Neo4j check)", path, loaded.version)
+
+
+def get_snapshot() -> GraphSnapshot | None:
+    """
+    返回当前图快照。Neo4j 为准，但请求路径从不等待 Neo4j：首次调用先读快照文件（若有），
+    并在后台线程比对 Neo4j 图状态；之后每 GRAPH_SNAPSHOT_CHECK_SECONDS 秒后台比对一次，变化时整体重建。
+    尚无快照时返回 None（调用方退回直接查询 Neo4j）；GRAPH_SNAPSHOT_DISABLED=1 时恒为 None。
+    """
+    if SNAPSHOT_DISABLED:
+        return None
+    if _state["snapshot"] is None and not _state["checked"]:
+        _load_file_if_empty()
+    snap = _state["snapshot"]
+    if not _state["checked"] or time.monotonic() - _state["checked"] >= CHECK_SECONDS:
+        _refresh_in_background()
+    return snap
+
+
+def warm_up() -> None:
+    """API 启动时调用：读入快照文件并在后台开始与 Neo4j 比对，首个请求不承担加载与 Neo4j 连接超时。"""
+    get_snapshot()
+
+
+def invalidate() -> None:
+    """丢弃当前快照，下次 get_snapshot 重新加载。"""
+    with _lock:
+        _state.update(snapshot=None, neo4j=None, stamp=None, checked=0.0)
@@ -1,40 +1,159 @@
 """
-子图查询：从指定节点出发有界 BFS 遍历，返回 nodes/edges 供前端可视化。
+子图查询：从指定节点出发沿五类关系（无向）有界遍历，返回 nodes/edges 供前端 Cytoscape 可视化。
 防止一次性加载全图，单次最多返回 max_nodes 个节点（默认 50）。
+- 有内存图快照（snapshot.get_snapshot）时在进程内按 CSR 邻接 BFS，不访问 Neo4j，耗时与 max_depth 基本无关；
+- 否则一条 Cypher 逐层扩展（每层只从上一层新到达的节点出发，已到达的节点不再展开，节点数达到 max_nodes 即停），
+  每层去重后最多取 max_nodes × LAYER_LIMIT_FACTOR 个新节点（枢纽节点不会拉回无界的行），
+  在库内按 (距离, -度数, id) 截到 max_nodes 个后再取其间的边，一次往返；
+  不用变长路径匹配，避免按路径条数指数增长；各处列表成员判断的列表长度都有上界。
+max_depth 上限为 MAX_SUBGRAPH_DEPTH（API 参数校验，get_subgraph 内同样截断）。
+超过 max_nodes 时用堆按 (距离, -度数, id) 选出保留的节点：先保留离 seed 近的，同距离保留度数大的。
+节点只含前端需要的 id/label/type，边为有向、去重的 source/target/type。
 """
 from __future__ import annotations
 
-import os
+import heapq
 from typing import Any
 
+from .driver import session as driver_session
+
 MAX_SUBGRAPH_NODES = 50
+MAX_SUBGRAPH_DEPTH = 4
+# Cypher 逐层扩展时每层最多保留的新节点数 = max_nodes × 该系数（给按度数挑选留余量）
+LAYER_LIMIT_FACTOR = 4
 REL_TYPES = "PREREQUISITE", "COVERS", "TEACHES", "PRACTICES", "DEPENDS_ON"
+LABEL_MAX_LEN = 24
 
 
-def _get_driver():
-    from neo4j import GraphDatabase
-    uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-    user = os.getenv("NEO4J_USER", "neo4j")
-    password = os.getenv("NEO4J_PASSWORD")
-    if not password:
-        raise ValueError("NEO4J_PASSWORD is required for Neo4j. Set it in .env")
-    return GraphDatabase.driver(uri, auth=(user, password))
-
-
-def _node_label_and_display(node) -> tuple[str, str]:
-    """从 Neo4j Node 得到 type（Topic/Exercise/Concept）和展示用 label。"""
-    labels = list(node.labels) if hasattr(node, "labels") else []
-    node_type = labels[0] if labels else "Node"
-    node_id = node.get("id", "") if hasattr(node, "get") else ""
+def _display_label(node_type: str, node_id: str, name: Any, name_en: Any, title: Any) -> str:
+    """展示用 label：Topic 取 name_en / name，Exercise 取 title，Concept 取 name，缺省为 id。"""
     if node_type == "Topic":
-        label = node.get("name_en") or node.get("name") or node_id
+        label = name_en or name or node_id
     elif node_type == "Exercise":
-        label = node.get("title") or node_id
+        label = title or node_id
     elif node_type == "Concept":
-        label = node.get("name") or node_id
+        label = name or node_id
     else:
         label = node_id
-    return node_type, (label or node_id)[:24]
+    return str(label or node_id)[:LABEL_MAX_LEN]
+
+
+def _select(candidates: dict[str, tuple[int, int]], max_nodes: int) -> list[str]:
+    """candidates: id -> (距离, 度数)；按 (距离, -度数, id) 取最小的 max_nodes 个（seed 距离 0 总在其中）。"""
+    if len(candidates) <= max_nodes:
+        return sorted(candidates, key=lambda k: (candidates[k][0], -candidates[k][1], k))
+    return heapq.nsmallest(max(0, max_nodes), candidates, key=lambda k: (candidates[k][0], -candidates[k][1], k))
+
+
+def _subgraph_from_snapshot(snap, seed_id: str, max_depth: int, max_nodes: int) -> dict[str, Any]:
+    seed = snap.node(seed_id)
+    if seed is None:
+        return {"nodes": [], "edges": [], "error": None}
+
+    adj = snap.undirected()
+    dist = {seed: 0}
+    frontier = [seed]
+    for depth in range(1, max_depth + 1):
+        # 已有完整的若干层且节点数达到 max_nodes：更远的节点不会入选，不再扩展
+        if len(dist) >= max_nodes:
+            break
+        nxt = []
+        for u in frontier:
+            for v in adj[u]:
+                if v not in dist:
+                    dist[v] = depth
+                    nxt.append(v)
+        if not nxt:
+            break
+        frontier = nxt
+    candidates = {snap.ids[i]: (d, len(adj[i])) for i, d in dist.items()}
+    keep = _select(candidates, max_nodes)
+    kept = {snap.index[k] for k in keep}
+    nodes = []
+    for node_id in keep:
+        i = snap.index[node_id]
+        node_type = snap.label(i)
+        label = _display_label(node_type, node_id, snap.prop(i, "name"), snap.prop(i, "name_en"), snap.prop(i, "title"))
+        nodes.append({"id": node_id, "label": label, "type": node_type})
+    edges = [
+        {"source": snap.ids[i], "target": snap.ids[j], "type": rel}
+        for i in sorted(kept)
+        for rel in REL_TYPES
+        for j in snap.successors(i, rel)
+        if j in kept
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def _subgraph_query(max_depth: int) -> str:
+    """
+    单条 Cypher：从 seed 起逐层 BFS（每层一个 CALL 子查询，只展开上一层新到达的节点，
+    已到达节点数达到 $max_nodes 后不再展开；每层 DISTINCT 去重后最多取 $layer_limit 个新节点），
+    按 (距离, -度数, id) 取前 $max_nodes 个节点，返回其投影字段、最短距离与度数，以及这些节点之间的有向边。
+    """
+    rels = "|".join(REL_TYPES)
+    layers = "".join(
+        f"""
+        CALL {{
+            WITH seen, frontier
+            WITH seen, frontier WHERE size(seen) < $max_nodes
+            UNWIND frontier AS f
+            MATCH (f)-[:{rels}]-(n)
+            WITH DISTINCT seen, n
+            WHERE NOT n IN seen
+            WITH n LIMIT $layer_limit
+            RETURN collect(n) AS layer
+        }}
+        WITH seen + layer AS seen, layer AS frontier, hits + [x IN layer | {{node: x, dist: {depth}}}] AS hits"""
+        for depth in range(1, max_depth + 1)
+    )
+    return f"""
+        MATCH (s) WHERE s.id = $seed_id
+        WITH s LIMIT 1
+        WITH [s] AS seen, [s] AS frontier, [{{node: s, dist: 0}}] AS hits{layers}
+        UNWIND hits AS hit
+        WITH hit.node AS n, hit.dist AS dist
+        WITH n, dist, size([(n)-[:{rels}]-() | 1]) AS degree
+        ORDER BY dist, degree DESC, n.id
+        LIMIT $max_nodes
+        WITH collect({{
+            id: n.id, labels: labels(n), name: n.name, name_en: n.name_en, title: n.title,
+            dist: dist, degree: degree
+        }}) AS nodes, collect(n) AS ns
+        UNWIND ns AS a
+        OPTIONAL MATCH (a)-[r:{rels}]->(b) WHERE b IN ns
+        WITH nodes, collect(CASE WHEN r IS NULL THEN null ELSE [a.id, type(r), b.id] END) AS edges
+        RETURN nodes, edges
+    """
+
+
+def _subgraph_from_neo4j(seed_id: str, max_depth: int, max_nodes: int) -> dict[str, Any]:
+    max_nodes = max(0, int(max_nodes))
+    with driver_session() as session:
+        row = session.run(
+            _subgraph_query(max_depth),
+            seed_id=seed_id,
+            max_nodes=max_nodes,
+            layer_limit=max_nodes * LAYER_LIMIT_FACTOR,
+        ).single()
+    if not row or not row["nodes"]:
+        return {"nodes": [], "edges": [], "error": None}
+    info = {n["id"]: n for n in row["nodes"] if n.get("id")}
+    keep = _select({k: (n["dist"], n["degree"]) for k, n in info.items()}, max_nodes)
+    kept = set(keep)
+    nodes = []
+    for node_id in keep:
+        n = info[node_id]
+        node_type = (n.get("labels") or ["Node"])[0]
+        label = _display_label(node_type, node_id, n.get("name"), n.get("name_en"), n.get("title"))
+        nodes.append({"id": node_id, "label": label, "type": node_type})
+    edges = []
+    seen: set[tuple[str, str, str]] = set()
+    for a, rel, b in row["edges"]:
+        if a in kept and b in kept and (a, b, rel) not in seen:
+            seen.add((a, b, rel))
+            edges.append({"source": a, "target": b, "type": rel})
+    return {"nodes": nodes, "edges": edges}
 
 
 def get_subgraph(
@@ -43,82 +162,16 @@ def get_subgraph(
     max_nodes: int = MAX_SUBGRAPH_NODES,
 ) -> dict[str, Any]:
     """
-    从 seed_id 出发 BFS 遍历，返回 { "nodes": [ { "id", "label", "type" } ], "edges": [ { "source", "target", "type" } ] }。
-    节点数超过 max_nodes 时按与 seed 的距离优先保留，再按度数截断；边只保留两端均在节点集合内的。
+    从 seed_id 出发有界遍历，返回 { "nodes": [ { "id", "label", "type" } ], "edges": [ { "source", "target", "type" } ] }。
+    节点数超过 max_nodes 时按与 seed 的距离优先保留，同距离按度数（五类关系的无向度）从大到小截断；
+    边只保留两端均在节点集合内的。seed 不存在时 nodes/edges 为空。max_depth 截断到 [0, MAX_SUBGRAPH_DEPTH]。
     """
-    driver = _get_driver()
-    nodes_list: list[dict[str, Any]] = []
-    edges_list: list[dict[str, Any]] = []
-    node_ids: set[str] = set()
-    edges_set: set[tuple[str, str, str]] = set()
-    node_info: dict[str, dict[str, Any]] = {}
-
+    max_depth = min(max(0, int(max_depth)), MAX_SUBGRAPH_DEPTH)
     try:
-        with driver.session() as session:
-            # 解析关系类型用于 Cypher
-            rel_pattern = "|".join(REL_TYPES)
-
-            # 1) 取种子节点
-            r = session.run(
-                """
-                MATCH (n) WHERE n.id = $seed_id
-                RETURN n LIMIT 1
-                """,
-                seed_id=seed_id,
-            )
-            rec = r.single()
-            if not rec or not rec.get("n"):
-                return {"nodes": [], "edges": [], "error": None}
-
-            seed_node = rec["n"]
-            node_type, label = _node_label_and_display(seed_node)
-            node_info[seed_id] = {"id": seed_id, "label": label, "type": node_type}
-            node_ids.add(seed_id)
-
-            frontier = {seed_id}
-            depth = 0
-
-            while depth < max_depth:
-                if not frontier:
-                    break
-                next_frontier = set()
-                # 2) 从当前 frontier 沿所有关系类型找邻居（无向）
-                q = (
-                    f"MATCH (a)-[r:{rel_pattern}]-(b) "
-                    "WHERE a.id IN $frontier RETURN a.id AS aid, type(r) AS rel, b AS bnode"
-                )
-                result = session.run(q, frontier=list(frontier))
-                for row in result:
-                    aid = row["aid"]
-                    rel = row["rel"]
-                    bnode = row["bnode"]
-                    bid = bnode.get("id") if hasattr(bnode, "get") else None
-                    if not bid:
-                        continue
-                    edges_set.add((aid, bid, rel))
-                    next_frontier.add(bid)
-                    if bid not in node_ids:
-                        node_ids.add(bid)
-                        b_type, b_label = _node_label_and_display(bnode)
-                        node_info[bid] = {"id": bid, "label": b_label, "type": b_type}
-                frontier = next_frontier
-                depth += 1
-                if len(node_ids) >= max_nodes:
-                    break
-    finally:
-        driver.close()
-
-    # 3) 若超过 max_nodes，按“距离”优先：先保留 seed，再保留 1 跳、2 跳…（此处用 BFS 顺序即距离），再按度数截断
-    if len(node_ids) > max_nodes:
-        # 简单策略：按 node_info 键顺序截断到 max_nodes（BFS 时插入顺序近似距离）
-        ordered_ids = [seed_id] + [i for i in node_info if i != seed_id][: max_nodes - 1]
-        node_ids = set(ordered_ids[:max_nodes])
-        edges_set = {(a, b, t) for a, b, t in edges_set if a in node_ids and b in node_ids}
-
-    for nid in node_ids:
-        if nid in node_info:
-            nodes_list.append(node_info[nid])
-    for a, b, t in edges_set:
-        edges_list.append({"source": a, "target": b, "type": t})
-
-    return {"nodes": nodes_list, "edges": edges_list}
+        from .snapshot import get_snapshot
+        snap = get_snapshot()
+    except Exception:
+        snap = None
+    if snap is not None:
+        return _subgraph_from_snapshot(snap, seed_id, max_depth, max_nodes)
+    return _subgraph_from_neo4j(seed_id, max_depth, max_nodes)
@@ -0,0 +1,208 @@
+"""
+解析产物缓存：同一 .md 在一次流水线中只读取、清洗、解析章节一次，切片结果按切片配置复用。
+产物 = (cleaned_text, sections, 各切片配置下的 (section_title, content, token_count, start_offset, end_offset) 列表)，与 doc_index 条目无关；
+splitter.slice_document、section_chunk_map、quality_metrics、knowledge_graph.concepts 共用。
+内存层按路径 + (mtime_ns, size) 判新鲜，stat 变化时按内容 sha256 复核（仅 touch 不重新解析）；
+PREPROCESS_CACHE_DIR 设置时另写磁盘层 <dir>/<sha256>.json，跨进程 / 跨次运行复用（默认关闭）。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, TypedDict
+
+from .md_loader import Section, clean_md_text, parse_md_headings
+
+# 清洗 / 章节解析逻辑变化时递增，使磁盘层旧产物失效
+ARTIFACT_VERSION = 3
+CACHE_DIR = os.environ.get("PREPROCESS_CACHE_DIR", "")
+MEMORY_DOCS = 512
+
+_logger = logging.getLogger(__name__)
+
+# (section_title, content, token_count, start_offset, end_offset)，按切片顺序
+Piece = tuple[str, str, int, int, int]
+StatKey = tuple[int, int]
+
+
+class DocumentArtifact(TypedDict):
+    content_hash: str  # 源文件字节 sha256
+    cleaned: str
+    sections: list[Section]
+    pieces: dict[str, list[Piece]]  # 切片配置键 -> 切片列表
+
+
+_lock = threading.Lock()
+_memory: OrderedDict[str, tuple[StatKey, DocumentArtifact]] = OrderedDict()
+_stats = {"parsed": 0, "memory_hits": 0, "disk_hits": 0, "adopted": 0}
+
+
+def _stat_key(path: Path) -> StatKey:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def _disk_path(content_hash: str) -> Path | None:
+    return Path(CACHE_DIR) / f"{content_hash}.json" if CACHE_DIR else None
+
+
+def _load_disk(content_hash: str) -> DocumentArtifact | None:
+    path = _disk_path(content_hash)
+    if path is None:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != ARTIFACT_VERSION:
+        return None
+    return {
+        "content_hash": content_hash,
+        "cleaned": data["cleaned"],
+        "sections": data["sections"],
+        "pieces": {k: [tuple(p) for p in v] for k, v in data["pieces"].items()},
+    }
+
+
+def _save_disk(artifact: DocumentArtifact) -> None:
+    """原子写入（临时文件 + os.replace）；失败只记日志，不影响调用方。"""
+    path = _disk_path(artifact["content_hash"])
+    if path is None:
+        return
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": ARTIFACT_VERSION, **artifact}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        _logger.warning("preprocess cache write failed (%s): %s", path, e)
+
+
+def _remember(key: str, stat: StatKey, artifact: DocumentArtifact) -> None:
+    _memory[key] = (stat, artifact)
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_DOCS:
+        _memory.popitem(last=False)
+
+
+def _fresh(key: str, stat: StatKey) -> DocumentArtifact | None:
+    cached = _memory.get(key)
+    if cached is not None and cached[0] == stat:
+        _memory.move_to_end(key)
+        return cached[1]
+    return None
+
+
+def get_artifact(path: Path) -> DocumentArtifact:
+    """返回文件的解析产物（内存 -> 磁盘 -> 重新解析）。调用方不应修改返回值。"""
+    path = Path(path)
+    key = str(path.resolve())
+    stat = _stat_key(path)
+    with _lock:
+        artifact = _fresh(key, stat)
+        if artifact is not None:
+            _stats["memory_hits"] += 1
+            return artifact
+        previous = _memory.get(key)
+    raw = path.read_bytes()
+    content_hash = hashlib.sha256(raw).hexdigest()
+    with _lock:
+        if previous is not None and previous[1]["content_hash"] == content_hash:
+            # 仅 mtime 变化（touch / 重新拷贝），产物不变
+            _stats["memory_hits"] += 1
+            _remember(key, stat, previous[1])
+            return previous[1]
+    artifact = _load_disk(content_hash)
+    if artifact is not None:
+        counter = "disk_hits"
+    else:
+        counter = "parsed"
+        cleaned = clean_md_text(raw.decode("utf-8", errors="replace"))
+        artifact = {
+            "content_hash": content_hash,
+            "cleaned": cleaned,
+            "sections": parse_md_headings(cleaned),
+            "pieces": {},
+        }
+        _save_disk(artifact)
+    with _lock:
+        _stats[counter] += 1
+        _remember(key, stat, artifact)
+    return artifact
+
+
+def load_document(path: Path) -> tuple[str, list[Section]]:
+    """同 md_loader.load_md，经缓存；返回的 sections 为副本，可修改。"""
+    artifact = get_artifact(path)
+    return artifact["cleaned"], [dict(s) for s in artifact["sections"]]  # type: ignore[misc]
+
+
+def get_pieces(
+    path: Path,
+    config_key: str,
+    build: Callable[[str, list[Section]], list[Piece]],
+) -> list[Piece]:
+    """返回 config_key 对应的切片；未缓存时以 build(cleaned, sections) 计算并写回内存 / 磁盘层。"""
+    artifact = get_artifact(path)
+    pieces = artifact["pieces"].get(config_key)
+    if pieces is not None:
+        return pieces
+    pieces = build(artifact["cleaned"], artifact["sections"])
+    with _lock:
+        artifact["pieces"][config_key] = pieces
+    _save_disk(artifact)
+    return pieces
+
+
+def has_pieces(path: Path, config_key: str) -> bool:
+    """内存层中是否已有该文件（且未变化）在 config_key 下的切片。"""
+    path = Path(path)
+    try:
+        stat = _stat_key(path)
+    except OSError:
+        return False
+    with _lock:
+        artifact = _fresh(str(path.resolve()), stat)
+        return artifact is not None and config_key in artifact["pieces"]
+
+
+def snapshot(path: Path) -> tuple[StatKey, DocumentArtifact] | None:
+    """当前进程内存层中该文件的 (stat, 产物)；供进程池 worker 回传给父进程。"""
+    with _lock:
+        return _memory.get(str(Path(path).resolve()))
+
+
+def adopt(path: Path, record: tuple[StatKey, DocumentArtifact] | None) -> None:
+    """父进程接收 worker 的产物；文件在此期间已变化则丢弃。"""
+    if record is None:
+        return
+    path = Path(path)
+    try:
+        stat = _stat_key(path)
+    except OSError:
+        return
+    if stat != record[0]:
+        return
+    with _lock:
+        _stats["adopted"] += 1
+        _remember(str(path.resolve()), stat, record[1])
+
+
+def stats() -> dict[str, Any]:
+    with _lock:
+        return {"documents": len(_memory), "disk_dir": CACHE_DIR or None, **_stats}
+
+
+def clear() -> None:
+    """清空内存层与计数（磁盘层保留）。"""
+    with _lock:
+        _memory.clear()
+        for k in _stats:
+            _stats[k] = 0
@@ -0,0 +1,284 @@
+"""
+BM25 倒排索引：与 Chroma 中的切片一一对应（同 id），入库时构建并持久化到 persist_dir/bm25_index。
+检索时与向量结果做 RRF 融合（rag.retrieve_documents(mode="hybrid")），补足 "Fourier"、"LTI"、公式符号等精确词命中。
+打分用 NumPy 向量化：倒排表为 CSR（indptr / doc_idx / weight），每个 posting 预先算好含 idf 的 BM25 权重，
+查询时只需拼接命中词的 posting 段并 np.bincount 累加。
+where 只支持 FILTER_FIELDS 上的 $eq / $ne / $in / $nin 及 $and / $or；其余抛出 UnsupportedFilter（与 mmap_index 相同），
+调用方退回纯向量结果，不会融合不满足 where 的切片。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+
+from .mmap_index import UnsupportedFilter
+
+INDEX_DIR_NAME = "bm25_index"
+K1 = 1.5
+B = 0.75
+
+# 可做 where 过滤的元数据列（与 splitter.chunk_metadata_for_chroma 一致）
+FILTER_FIELDS = ("doc_id", "doc_type", "content_type", "source_file", "section_title")
+
+_logger = logging.getLogger(__name__)
+
+# LaTeX 命令（\sum、\omega）、英文/数字词、连续中文
+_TOKEN_RE = re.compile(r"\\[a-zA-Z]+|[a-zA-Z0-9]+|[\u4e00-\u9fff]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """中英混合分词：英文小写词与 LaTeX 命令整体为词；中文按单字 + 相邻二字切分。"""
+    tokens: list[str] = []
+    for m in _TOKEN_RE.finditer(text or ""):
+        tok = m.group(0)
+        if "\u4e00" <= tok[0] <= "\u9fff":
+            tokens.extend(tok)
+            tokens.extend(tok[i:i + 2] for i in range(len(tok) - 1))
+        else:
+            tokens.append(tok.lower())
+    return tokens
+
+
+class BM25Index:
+    """内存 BM25 索引；ids / documents / metadatas 与 Chroma 集合中的记录对齐。"""
+
+    def __init__(
+        self,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict[str, Any]],
+        vocab: dict[str, int],
+        indptr: np.ndarray,
+        doc_idx: np.ndarray,
+        weights: np.ndarray,
+    ) -> None:
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_idx = doc_idx
+        self.weights = weights
+        # 过滤列：object 数组，== 比较即得布尔掩码
+        self._columns = {
+            f: np.array([str(m.get(f, "")) for m in metadatas], dtype=object) for f in FILTER_FIELDS
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict[str, Any]],
+        *,
+        k1: float = K1,
+        b: float = B,
+    ) -> "BM25Index":
+        """从切片文本构建索引。"""
+        n = len(documents)
+        vocab: dict[str, int] = {}
+        rows: list[int] = []
+        cols: list[int] = []
+        tfs: list[int] = []
+        doc_len = np.zeros(n, dtype=np.float32)
+        for i, text in enumerate(documents):
+            toks = tokenize(text)
+            doc_len[i] = len(toks)
+            counts: dict[int, int] = {}
+            for t in toks:
+                tid = vocab.setdefault(t, len(vocab))
+                counts[tid] = counts.get(tid, 0) + 1
+            for tid, c in counts.items():
+                rows.append(tid)
+                cols.append(i)
+                tfs.append(c)
+
+        term = np.asarray(rows, dtype=np.int64)
+        doc = np.asarray(cols, dtype=np.int32)
+        tf = np.asarray(tfs, dtype=np.float32)
+        order = np.argsort(term, kind="stable")
+        term, doc, tf = term[order], doc[order], tf[order]
+        df_count = np.bincount(term, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(df_count)
+        df = df_count.astype(np.float32)
+
+        avgdl = float(doc_len.mean()) if n else 0.0
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * doc_len[doc] / avgdl) if avgdl else np.full(len(doc), k1, dtype=np.float32)
+        weights = (idf[term] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        return cls(list(ids), list(documents), [dict(m) for m in metadatas], vocab, indptr, doc, weights)
+
+    def _where_mask(self, where: dict[str, Any] | None) -> np.ndarray | None:
+        """
+        将 Chroma where（字段上的 $eq/$ne/$in/$nin，$and/$or）转为布尔掩码。
+        FILTER_FIELDS 以外的字段、其余运算符与非字符串取值抛出 UnsupportedFilter（忽略某个分支会改变结果集）。
+        """
+        if not where:
+            return None
+        if "$and" in where or "$or" in where:
+            op = "$and" if "$and" in where else "$or"
+            clauses = where[op]
+            if len(where) != 1 or not isinstance(clauses, list) or not clauses:
+                raise UnsupportedFilter(f"malformed {op} clause")
+            masks = [self._where_mask(c) for c in clauses]
+            if any(m is None for m in masks):
+                raise UnsupportedFilter(f"empty clause in {op}")
+            return np.logical_and.reduce(masks) if op == "$and" else np.logical_or.reduce(masks)
+        masks = []
+        for field, cond in where.items():
+            col = self._columns.get(field)
+            if col is None:
+                raise UnsupportedFilter(f"field not in BM25 index: {field!r}")
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            if not cond:
+                raise UnsupportedFilter(f"empty condition on {field!r}")
+            for op, value in cond.items():
+                if op not in ("$eq", "$ne", "$in", "$nin"):
+                    raise UnsupportedFilter(f"operator not supported by BM25 index: {op!r}")
+                values = value if op in ("$in", "$nin") else [value]
+                if not isinstance(values, (list, tuple)) or not all(isinstance(v, str) for v in values):
+                    raise UnsupportedFilter(f"{op} on {field!r} with {value!r}")
+                hit = np.isin(col, list(values))
+                masks.append(hit if op in ("$eq", "$in") else ~hit)
+        return np.logical_and.reduce(masks)
+
+    def scores(self, query: str) -> np.ndarray:
+        """返回每个切片对 query 的 BM25 分数（float32，长度 = 切片数）。"""
+        tids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not tids or not len(self.ids):
+            return np.zeros(len(self.ids), dtype=np.float32)
+        spans = [np.arange(self.indptr[t], self.indptr[t + 1]) for t in tids]
+        pos = np.concatenate(spans)
+        return np.bincount(self.doc_idx[pos], weights=self.weights[pos], minlength=len(self.ids)).astype(np.float32)
+
+    def search(self, query: str, top_k: int, where: dict[str, Any] | None = None) -> list[tuple[int, float]]:
+        """返回按分数降序的 (行号, 分数)，仅含分数 > 0 且满足 where 的切片；where 无法精确执行时抛出 UnsupportedFilter。"""
+        s = self.scores(query)
+        mask = self._where_mask(where)
+        if mask is not None:
+            s = np.where(mask, s, 0.0)
+        nonzero = int(np.count_nonzero(s))
+        k = min(top_k, nonzero)
+        if k <= 0:
+            return []
+        top = np.argpartition(-s, k - 1)[:k]
+        top = top[np.argsort(-s[top], kind="stable")]
+        return [(int(i), float(s[i])) for i in top]
+
+    def save(self, index_dir: Path) -> None:
+        """写入 index_dir/postings.npz 与 index_dir/meta.json（先写临时文件再替换）。"""
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        terms = [""] * len(self.vocab)
+        for t, i in self.vocab.items():
+            terms[i] = t
+        tmp_npz = index_dir / "postings.tmp.npz"
+        np.savez(tmp_npz, indptr=self.indptr, doc_idx=self.doc_idx, weights=self.weights)
+        tmp_meta = index_dir / "meta.tmp.json"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(
+                {"terms": terms, "ids": self.ids, "documents": self.documents, "metadatas": self.metadatas},
+                f,
+                ensure_ascii=False,
+            )
+        # 先替换 meta 再替换 postings：读侧以 postings 的 mtime 判断是否重载
+        os.replace(tmp_meta, index_dir / "meta.json")
+        os.replace(tmp_npz, index_dir / "postings.npz")
+
+    @classmethod
+    def load(cls, index_dir: Path) -> "BM25Index":
+        index_dir = Path(index_dir)
+        with open(index_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(index_dir / "postings.npz") as z:
+            indptr, doc_idx, weights = z["indptr"], z["doc_idx"], z["weights"]
+        vocab = {t: i for i, t in enumerate(meta["terms"])}
+        return cls(meta["ids"], meta["documents"], meta["metadatas"], vocab, indptr, doc_idx, weights)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """RRF：score(id) = Σ 1 / (k + rank)，rank 从 1 开始；返回按分数降序的 (id, score)。"""
+    fused: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda x: -x[1])
+
+
+def index_dir_for(persist_dir: str) -> Path:
+    return Path(persist_dir) / INDEX_DIR_NAME
+
+
+def build_from_collection(collection, persist_dir: str, *, page_size: int = 1000) -> int:
+    """从 Chroma 集合全量读取切片（分页 get）构建 BM25 并持久化；返回切片数。"""
+    ids: list[str] = []
+    documents: list[str] = []
+    metadatas: list[dict[str, Any]] = []
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        page_ids = page.get("ids") or []
+        if not page_ids:
+            break
+        ids.extend(page_ids)
+        documents.extend(d or "" for d in (page.get("documents") or [""] * len(page_ids)))
+        metadatas.extend(dict(m or {}) for m in (page.get("metadatas") or [{}] * len(page_ids)))
+        offset += len(page_ids)
+        if len(page_ids) < page_size:
+            break
+    BM25Index.build(ids, documents, metadatas).save(index_dir_for(persist_dir))
+    return len(ids)
+
+
+_cache_lock = threading.Lock()
+_loaded: dict[str, tuple[int, BM25Index]] = {}
+
+
+def load_cached(persist_dir: str) -> BM25Index | None:
+    """按 postings 文件 mtime 缓存已加载的索引；索引不存在返回 None。"""
+    index_dir = index_dir_for(persist_dir)
+    try:
+        mtime = (index_dir / "postings.npz").stat().st_mtime_ns
+    except OSError:
+        return None
+    key = str(index_dir.resolve())
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with _cache_lock:
+        cached = _loaded.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            index = BM25Index.load(index_dir)
+        except (OSError, ValueError, KeyError) as e:
+            _logger.warning("BM25 index load failed (%s): %s", index_dir, e)
+            return None
+        _loaded[key] = (mtime, index)
+        return index
+
+
+if __name__ == "__main__":
+    # 为已有 chroma_db 补建 BM25 索引：python -m src.preprocessing.bm25_index
+    import sys
+    root = Path(__file__).resolve().parents[2]
+    sys.path.insert(0, str(root))
+    from dotenv import load_dotenv
+    load_dotenv(root / ".env")
+    from src.preprocessing.chroma_client import default_persist_dir, get_collection
+
+    persist_dir = default_persist_dir()
+    n = build_from_collection(get_collection(persist_dir), persist_dir)
+    print(f"BM25 index built over {n} chunks -> {index_dir_for(persist_dir)}")
@@ -0,0 +1,131 @@
+"""
+Chroma 客户端与集合句柄池：按 (persist_dir, collection_name) 在进程内复用 PersistentClient 与 collection。
+避免每次检索 / 状态探测都重新打开 SQLite 与加载默认嵌入函数；入库后显式 invalidate，API 启动时 warm_up。
+另维护入库代数（generation）：每次入库写入 persist_dir 下的戳文件，检索缓存以此判断是否失效（跨进程可见）。
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+COLLECTION_NAME = "course_docs"
+COLLECTION_METADATA = {"description": "course docs RAG"}
+GENERATION_FILE = "ingest_generation"
+
+_logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_clients: dict[str, Any] = {}
+_collections: dict[tuple[str, str], Any] = {}
+# 戳文件路径 -> ((mtime_ns, inode), generation)；文件未变时不重复读取
+_generations: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def default_persist_dir() -> str:
+    """CHROMA_PERSIST_DIR 或项目根下 chroma_db。"""
+    persist_dir = os.getenv("CHROMA_PERSIST_DIR")
+    if persist_dir:
+        return persist_dir
+    root = Path(__file__).resolve().parents[2]
+    return str(root / "chroma_db")
+
+
+def _key(persist_dir: str | None) -> str:
+    return os.path.abspath(persist_dir or default_persist_dir())
+
+
+def get_client(persist_dir: str | None = None):
+    """返回 persist_dir 对应的 PersistentClient，进程内只创建一次。"""
+    key = _key(persist_dir)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            try:
+                import chromadb
+            except ImportError:
+                raise RuntimeError("chromadb not installed. Run: pip install chromadb")
+            client = chromadb.PersistentClient(path=key)
+            _clients[key] = client
+        return client
+
+
+def get_collection(persist_dir: str | None = None, name: str = COLLECTION_NAME):
+    """返回 (persist_dir, name) 对应的 collection 句柄（不存在则创建），进程内复用。"""
+    key = (_key(persist_dir), name)
+    collection = _collections.get(key)
+    if collection is not None:
+        return collection
+    with _lock:
+        collection = _collections.get(key)
+        if collection is None:
+            client = get_client(key[0])
+            collection = client.get_or_create_collection(name, metadata=COLLECTION_METADATA)
+            _collections[key] = collection
+        return collection
+
+
+def invalidate(persist_dir: str | None = None, name: str | None = None) -> None:
+    """
+    丢弃缓存的句柄，下次 get_collection 重新获取。
+    - persist_dir 为 None：清空全部；name 为 None：清空该目录下全部集合及其 client。
+    入库（ingest_results_to_chroma）结束后调用，保证读侧看到最新集合。
+    """
+    with _lock:
+        if persist_dir is None:
+            _collections.clear()
+            _clients.clear()
+            return
+        key = _key(persist_dir)
+        for k in [k for k in _collections if k[0] == key and (name is None or k[1] == name)]:
+            _collections.pop(k, None)
+        if name is None:
+            _clients.pop(key, None)
+
+
+def warm_up(persist_dir: str | None = None, name: str = COLLECTION_NAME) -> bool:
+    """预先打开 client 与 collection（供 API 启动时调用）；失败只记日志，返回是否成功。"""
+    try:
+        get_collection(persist_dir, name).count()
+        return True
+    except Exception as e:
+        _logger.warning("Chroma warm-up failed: %s", e)
+        return False
+
+
+def get_generation(persist_dir: str | None = None) -> str:
+    """返回 persist_dir 当前入库代数；从未入库时为 "0"。"""
+    path = os.path.join(_key(persist_dir), GENERATION_FILE)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "0"
+    stamp = (st.st_mtime_ns, st.st_ino)
+    cached = _generations.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    try:
+        value = Path(path).read_text(encoding="utf-8").strip() or "0"
+    except OSError:
+        return "0"
+    _generations[path] = (stamp, value)
+    return value
+
+
+def bump_generation(persist_dir: str | None = None) -> str:
+    """入库后调用：写入新的代数戳（原子替换），使所有按代数缓存的检索结果失效。返回新代数。"""
+    key = _key(persist_dir)
+    os.makedirs(key, exist_ok=True)
+    value = str(time.time_ns())
+    path = os.path.join(key, GENERATION_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    Path(tmp).write_text(value, encoding="utf-8")
+    os.replace(tmp, path)
+    _generations.pop(path, None)
+    return value
@@ -1,20 +1,27 @@
 """
 将 results/*.md 经文档索引与切片后向量化并写入 Chroma。
-对应任务 2.3.3：向量化并存储到 Chroma。
+对应任务 2.3.3：向量化并存储到 Chroma。增量（ingest_manifest）、流式分批（切片 / 嵌入 / 写入三阶段流水线）。
 使用 Chroma 默认嵌入（或可选的 LangChain Embeddings），集合名 course_docs。
 """
 from __future__ import annotations
 
+import logging
 import os
-import uuid
+import queue
+import threading
+import time
 from pathlib import Path
 from typing import List
 
-from .doc_index import build_doc_index, load_doc_index, DocEntry
-from .splitter import slice_document, chunk_metadata_for_chroma, ChunkWithMeta
-from .dedup import dedup_chunks
+from src.common.env import env_int
+from src.common.files import file_sha256
 
-COLLECTION_NAME = "course_docs"
+from .doc_index import build_doc_index, load_doc_index, resolve_entry_path, DocEntry
+from .splitter import slice_corpus, slice_document, chunk_metadata_for_chroma, ChunkWithMeta
+from . import artifact_cache, bm25_index, chroma_client, dedup, doc_store, embedding_cache, ingest_manifest, mmap_index
+from .chroma_client import COLLECTION_NAME
+
+_logger = logging.getLogger(__name__)
 
 
 def _ensure_chroma_metadata(meta: dict) -> dict:
@@ -30,6 +37,107 @@ def _ensure_chroma_metadata(meta: dict) -> dict:
     return out
 
 
+def _clear_collection(collection, page_size: int = 1000) -> None:
+    """删除集合中全部切片（无清单的旧版 uuid 入库、或集合与清单不一致时使用）。"""
+    while True:
+        ids = collection.get(include=[], limit=page_size).get("ids") or []
+        if not ids:
+            return
+        collection.delete(ids=ids)
+
+
+# 每批嵌入 / 写入的切片数（写入批需小于 Chroma max batch size）；阶段间队列容量（批数），决定内存上限
+EMBED_BATCH_SIZE = env_int("INGEST_EMBED_BATCH", 64)
+UPSERT_BATCH_SIZE = env_int("INGEST_UPSERT_BATCH", 256)
+QUEUE_BATCHES = env_int("INGEST_QUEUE_BATCHES", 4)
+# 每写入多少切片记录一次进度（0 关闭）
+PROGRESS_EVERY = env_int("INGEST_PROGRESS_EVERY", 1000)
+
+_DONE = object()
+
+
+class _StageStats:
+    """流水线单个阶段的处理量与耗时（只计阶段自身工作时间，不含队列等待）。"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.items = 0
+        self.seconds = 0.0
+
+    def add(self, items: int, seconds: float) -> None:
+        self.items += items
+        self.seconds += seconds
+
+    def __str__(self) -> str:
+        rate = self.items / self.seconds if self.seconds > 0 else 0.0
+        return f"{self.name} {self.items} ({rate:.0f}/s)"
+
+
+class _Pipeline:
+    """
+    阶段线程与有界队列的协调：任一阶段异常时置 stop，其余阶段在队列读写处退出，
+    异常在调用线程重新抛出。嵌入模型在创建时选定一次，整次入库的所有批次共用（见 _choose_embedder）。
+    """
+
+    def __init__(self, use_langchain_embeddings: bool = False) -> None:
+        self.error: BaseException | None = None
+        self.stop = threading.Event()
+        self.embed_fn, self.model_id = _choose_embedder(use_langchain_embeddings)
+
+    def embed(self, documents: list[str]):
+        """嵌入一批切片（经 embedding_cache，只对未缓存的文本调用模型）；嵌入失败直接抛出，不换模型。"""
+        return embedding_cache.embed_texts(documents, embed_fn=self.embed_fn, model_id=self.model_id)
+
+    def put(self, q: queue.Queue, item) -> bool:
+        """放入队列（满则等待）；流水线已终止时返回 False。"""
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q: queue.Queue):
+        """取出队列项；流水线已终止时返回 _DONE。"""
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def start(self, target) -> threading.Thread:
+        def run():
+            try:
+                target()
+            except BaseException as e:  # 转交调用线程
+                self.error = self.error or e
+                self.stop.set()
+
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        return t
+
+
+def _choose_embedder(use_langchain_embeddings: bool) -> tuple[embedding_cache.EmbedFn | None, str]:
+    """
+    返回 (embed_fn, model_id)；embed_fn 为 None 表示 Chroma 默认嵌入（与集合一致）。
+    要求 LangChain（OpenAI）嵌入但无法创建时记录警告并改用默认嵌入；只在入库开始时选一次，
+    同一集合与嵌入缓存中不会混入不同模型（可能不同维度）的向量。
+    """
+    if use_langchain_embeddings:
+        try:
+            from langchain_openai import OpenAIEmbeddings
+            emb = OpenAIEmbeddings()
+        except Exception as e:
+            _logger.warning("LangChain embeddings unavailable (%s); using Chroma default embedding for this ingest", e)
+        else:
+            _logger.info("Chroma ingest embedding model: openai:%s", emb.model)
+            return emb.embed_documents, f"openai:{emb.model}"
+    return None, embedding_cache.DEFAULT_MODEL_ID
+
+
 def ingest_results_to_chroma(
     results_dir: Path,
     data_root: Path | None,
@@ -38,15 +146,39 @@ def ingest_results_to_chroma(
     *,
     use_langchain_embeddings: bool = False,
     dedup_before_ingest: bool = False,
+    dedup_method: str = "hash",
+    build_bm25: bool = True,
+    export_mmap: bool | None = None,
+    full_rebuild: bool = False,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE,
+    workers: int | None = None,
 ) -> tuple[int, str]:
     """
-    从 results_dir 的 .md 构建索引、切片、写入 Chroma。
-    返回 (写入的切片数, 集合名)。
+    从 results_dir 的 .md 构建索引、切片、增量写入 Chroma。
+    返回 (集合中当前切片数, 集合名)。
+    增量：按 persist_dir/ingest_manifest.json 比对源文件 sha256，未变文件不重新切片；
+    切片 id 由 (doc_id, 内容 md5) 确定，只嵌入并 upsert 新切片，仅 metadata 变化的切片 update，消失的切片 delete。
+    流式：切片+去重（线程）→ 分批嵌入（线程）→ 分批 upsert（调用线程），阶段间为有界队列，
+    内存中最多约 QUEUE_BATCHES 批切片，与语料规模无关；每 PROGRESS_EVERY 条记录进度与各阶段吞吐。
     persist_dir: Chroma 持久化目录，默认从环境变量 CHROMA_PERSIST_DIR 或项目 chroma_db 读取。
     index_path: 若提供则从该 JSON 加载文档索引，否则从 results_dir + data_root 构建。
-    use_langchain_embeddings: 若 True 且已配置，使用 LangChain Embeddings；否则使用 Chroma 默认嵌入。
-    dedup_before_ingest: 若 True，写入前按文本 hash 去重（3.3.1）。
+    use_langchain_embeddings: 若 True 且已配置，使用 LangChain Embeddings；否则使用 Chroma 默认嵌入。两者都经 embedding_cache 复用已算过的向量。
+        模型在入库开始时选定一次（无法创建时记录警告并整次使用默认嵌入）；之后某批嵌入失败时入库中止，不换用其他模型。
+    dedup_before_ingest: 若 True，写入前去重（3.3.1）。
+    dedup_method: "hash"（归一化文本完全相同）、"minhash"（另按 MinHash LSH 去近似重复）或 "embedding"
+        （另按嵌入余弦相似度去语义重复，向量在切片阶段算出并直接用于写入，不重复嵌入）；近似 / 语义索引跨文件共用，
+        未变文件需重新取切片文本，经 artifact_cache 通常不重新解析。
+    build_bm25: 若 True，集合有变化（或索引缺失）时基于集合全量切片重建 BM25 索引（persist_dir/bm25_index），供 hybrid 检索。
+    清洗后全文另写入 persist_dir/doc_store（集合变化或缺失时），供 retrieve_documents(expand=...) 按切片偏移取上下文。
+    export_mmap: 是否重新导出内存映射向量索引（persist_dir/mmap_index，供 backend="mmap"）；None 表示仅在索引已存在时导出，避免其过期。
+    full_rebuild: 若 True，忽略清单，清空集合后全量入库。
+    embed_batch_size / upsert_batch_size: 每批嵌入 / 写入的切片数。
+    workers: 切片进程数（splitter.slice_corpus），None 取 SPLITTER_WORKERS。
     """
+    if dedup_method not in dedup.METHODS:
+        raise ValueError(f"Unsupported dedup method: {dedup_method}")
+    near_dedup = dedup_before_ingest and dedup_method != "hash"
     results_dir = Path(results_dir)
     persist_dir = persist_dir or os.getenv("CHROMA_PERSIST_DIR", str(results_dir.parent / "chroma_db"))
     if index_path and Path(index_path).is_file():
@@ -54,45 +186,217 @@ def ingest_results_to_chroma(
     else:
         entries = build_doc_index(results_dir, data_root)
 
-    all_chunks: List[ChunkWithMeta] = []
-    for e in entries:
-        path = Path(e["file_path"])
-        if not path.is_file():
-            continue
-        chunks = slice_document(path, e)
-        all_chunks.extend(chunks)
+    collection = chroma_client.get_collection(persist_dir, COLLECTION_NAME)
+    manifest = None if full_rebuild else ingest_manifest.load_manifest(persist_dir)
+    old_files: dict[str, ingest_manifest.FileRecord] = manifest["files"] if manifest else {}
+    prev_live = {cid for rec in old_files.values() for cid in rec["live_ids"]}
+    if collection.count() != len(prev_live):
+        # 无清单（含旧版 uuid 入库）或集合被外部改动：清空后全量入库
+        _clear_collection(collection)
+        old_files, prev_live = {}, set()
 
-    if dedup_before_ingest and all_chunks:
-        all_chunks = dedup_chunks(all_chunks, method="hash")
+    files: dict[str, ingest_manifest.FileRecord] = {}
+    doc_paths: list[tuple[str, Path]] = []  # (doc_id, 源文件)，供重写 doc_store
+    pipeline = _Pipeline(use_langchain_embeddings)
+    slice_q: queue.Queue = queue.Queue(maxsize=QUEUE_BATCHES)
+    write_q: queue.Queue = queue.Queue(maxsize=QUEUE_BATCHES)
+    slice_stats, embed_stats, write_stats = _StageStats("slice"), _StageStats("embed"), _StageStats("write")
 
-    if not all_chunks:
-        return 0, COLLECTION_NAME
+    def produce() -> None:
+        """阶段 1：逐文件比对 hash；变更文件经 slice_corpus 多进程并行切片。"""
+        plan: list[tuple[DocEntry, str, Path, str, str, bool]] = []
+        for e in entries:
+            path = resolve_entry_path(e, results_dir)
+            if path is None:
+                continue
+            key = e.get("file_name") or path.name
+            file_hash = file_sha256(path)
+            e_hash = ingest_manifest.entry_hash(e)
+            old = old_files.get(key)
+            unchanged = old is not None and old["file_hash"] == file_hash and old["entry_hash"] == e_hash
+            plan.append((e, key, path, file_hash, e_hash, unchanged))
+            doc_paths.append((e.get("doc_id") or key, path))
+        # 结果按提交顺序产出，与 plan 中变更文件的顺序一一对应
+        sliced = slice_corpus([p[0] for p in plan if not p[5]], workers, results_dir=results_dir)
+        try:
+            _emit(plan, sliced)
+        finally:
+            # 提前退出（下游失败）时关闭生成器，回收进程池
+            sliced.close()
 
-    try:
-        import chromadb
-    except ImportError:
-        raise RuntimeError("chromadb not installed. Run: pip install chromadb")
+    def _emit(plan, sliced) -> None:
+        """流式去重（按索引顺序保留首次出现，与 dedup_chunks 一致），待写入切片按批送入 slice_q。"""
+        seen_hashes: set[str] = set()
+        lsh = dedup.MinHashLSH() if dedup_method == "minhash" else None
+        vec_index = dedup.EmbeddingDedupIndex() if dedup_method == "embedding" else None
+        n_kept = 0
+        # (op, id, content, metadata, 向量或 None)，op 为 add / update
+        batch: list[tuple[str, str, str, dict, object]] = []
+        for e, key, path, file_hash, e_hash, unchanged in plan:
+            t0 = time.perf_counter()
+            chunks: List[ChunkWithMeta] | None = None
+            if unchanged:
+                rec: ingest_manifest.FileRecord = dict(old_files[key])
+            else:
+                chunks = next(sliced)[2]
+                rec = {
+                    "file_hash": file_hash,
+                    "entry_hash": e_hash,
+                    "chunk_ids": ingest_manifest.chunk_ids_for(e.get("doc_id") or key, [c["content"] for c in chunks]),
+                    "content_hashes": [ingest_manifest.content_hash(c["content"]) for c in chunks],
+                    "live_ids": [],
+                }
+            if near_dedup and chunks is None:
+                chunks = slice_document(path, e)
+            # 先按文本 hash 去完全重复，剩余切片再做近似 / 语义去重
+            kept: list[int] = []
+            for i, h in enumerate(rec["content_hashes"]):
+                if dedup_before_ingest:
+                    if h in seen_hashes:
+                        continue
+                    seen_hashes.add(h)
+                kept.append(i)
+            vectors: dict[int, object] = {}  # 切片下标 -> 已算好的向量（embedding 去重时），嵌入阶段直接复用
+            if near_dedup and kept:
+                texts = [chunks[i]["content"] for i in kept]
+                if vec_index is not None:
+                    embedded = pipeline.embed(texts)
+                    vectors = dict(zip(kept, embedded))
+                    matches = vec_index.add(embedded)
+                else:
+                    matches = []
+                    for sig in dedup.minhash_signatures(texts):
+                        m = lsh.query(sig)
+                        if m is None:
+                            lsh.add(n_kept, sig)
+                            n_kept += 1
+                        matches.append(m)
+                kept = [i for i, m in zip(kept, matches) if m is None]
+            live = [rec["chunk_ids"][i] for i in kept]
+            rec["live_ids"] = live
+            files[key] = rec
+            # 未变文件中有切片需新增（去重结果随其他文件变化）时补切片
+            if unchanged and chunks is None and any(cid not in prev_live for cid in live):
+                chunks = slice_document(path, e)
+            if chunks:
+                live_set = set(live)
+                for i, (cid, c) in enumerate(zip(rec["chunk_ids"], chunks)):
+                    if cid not in live_set:
+                        continue
+                    meta = _ensure_chroma_metadata(chunk_metadata_for_chroma(c))
+                    if cid not in prev_live:
+                        batch.append(("add", cid, c["content"], meta, vectors.get(i)))
+                    elif not unchanged:
+                        # 变更文件中 id 未变的切片只更新 metadata（chunk_index 等可能移动），不重新嵌入
+                        batch.append(("update", cid, "", meta, None))
+            slice_stats.add(len(chunks or ()), time.perf_counter() - t0)
+            while len(batch) >= embed_batch_size:
+                if not pipeline.put(slice_q, batch[:embed_batch_size]):
+                    return
+                batch = batch[embed_batch_size:]
+        if batch and not pipeline.put(slice_q, batch):
+            return
+        pipeline.put(slice_q, _DONE)
 
-    client = chromadb.PersistentClient(path=persist_dir)
-    collection = client.get_or_create_collection(COLLECTION_NAME, metadata={"description": "course docs RAG"})
+    def embed() -> None:
+        """阶段 2：新增切片分批嵌入（embedding 去重时已算好的向量直接复用）；update 项原样透传。"""
+        while True:
+            batch = pipeline.get(slice_q)
+            if batch is _DONE:
+                pipeline.put(write_q, _DONE)
+                return
+            t0 = time.perf_counter()
+            adds = [item for item in batch if item[0] == "add"]
+            vectors = [item[4] for item in adds]
+            pending = [i for i, v in enumerate(vectors) if v is None]
+            if pending:
+                for i, vec in zip(pending, pipeline.embed([adds[i][2] for i in pending])):
+                    vectors[i] = vec
+            embed_stats.add(len(pending), time.perf_counter() - t0)
+            updates = [item for item in batch if item[0] == "update"]
+            if not pipeline.put(write_q, (adds, vectors, updates)):
+                return
 
-    ids = [str(uuid.uuid4()) for _ in all_chunks]
-    documents = [c["content"] for c in all_chunks]
-    metadatas = [_ensure_chroma_metadata(chunk_metadata_for_chroma(c)) for c in all_chunks]
+    # 阶段 3（调用线程）：累积到 upsert_batch_size 后写入
+    adds_buf: list[tuple[str, str, dict, object]] = []
+    updates_buf: list[tuple[str, dict]] = []
+    n_added = n_updated = 0
 
-    if use_langchain_embeddings:
-        try:
-            from langchain_openai import OpenAIEmbeddings
-            emb = OpenAIEmbeddings()
-            embeddings = emb.embed_documents(documents)
-            collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
-        except Exception:
-            # 回退：不传 embeddings，让 Chroma 用默认
-            collection.add(ids=ids, documents=documents, metadatas=metadatas)
-    else:
-        collection.add(ids=ids, documents=documents, metadatas=metadatas)
+    def flush(force: bool) -> None:
+        nonlocal adds_buf, updates_buf, n_added, n_updated
+        t0 = time.perf_counter()
+        while adds_buf and (force or len(adds_buf) >= upsert_batch_size):
+            part, adds_buf = adds_buf[:upsert_batch_size], adds_buf[upsert_batch_size:]
+            collection.upsert(
+                ids=[cid for cid, _, _, _ in part],
+                documents=[content for _, content, _, _ in part],
+                metadatas=[meta for _, _, meta, _ in part],
+                embeddings=[[float(x) for x in vec] for _, _, _, vec in part],
+            )
+            n_added += len(part)
+        while updates_buf and (force or len(updates_buf) >= upsert_batch_size):
+            part, updates_buf = updates_buf[:upsert_batch_size], updates_buf[upsert_batch_size:]
+            collection.update(ids=[cid for cid, _ in part], metadatas=[meta for _, meta in part])
+            n_updated += len(part)
+        write_stats.items = n_added + n_updated
+        write_stats.seconds += time.perf_counter() - t0
+
+    started = time.perf_counter()
+    threads = [pipeline.start(produce), pipeline.start(embed)]
+    last_report = 0
+    try:
+        while True:
+            item = pipeline.get(write_q)
+            if item is _DONE:
+                break
+            adds, vectors, updates = item
+            adds_buf.extend((cid, content, meta, vec) for (_, cid, content, meta, _), vec in zip(adds, vectors))
+            updates_buf.extend((cid, meta) for _, cid, _, meta, _ in updates)
+            flush(force=False)
+            if PROGRESS_EVERY > 0 and n_added + n_updated - last_report >= PROGRESS_EVERY:
+                last_report = n_added + n_updated
+                _logger.info(
+                    "Chroma ingest progress: %d written in %.1fs | %s | %s | %s",
+                    last_report, time.perf_counter() - started, slice_stats, embed_stats, write_stats,
+                )
+        if pipeline.error is None:
+            flush(force=True)
+    except BaseException:
+        pipeline.stop.set()
+        raise
+    finally:
+        for t in threads:
+            t.join()
+    if pipeline.error is not None:
+        raise pipeline.error
+
+    desired = {cid for rec in files.values() for cid in rec["live_ids"]}
+    to_delete = sorted(prev_live - desired)
+    for i in range(0, len(to_delete), upsert_batch_size):
+        collection.delete(ids=to_delete[i:i + upsert_batch_size])
+    changed = bool(to_delete or n_added or n_updated)
+    ingest_manifest.save_manifest(persist_dir, files, dedup=dedup_method if dedup_before_ingest else False)
+    _logger.info(
+        "Chroma ingest: %d files, +%d new, ~%d updated, -%d deleted, %d live chunks in %.1fs | %s | %s | %s",
+        len(files), n_added, n_updated, len(to_delete), len(desired), time.perf_counter() - started,
+        slice_stats, embed_stats, write_stats,
+    )
+
+    if build_bm25 and (changed or not bm25_index.index_dir_for(persist_dir).is_dir()):
+        bm25_index.build_from_collection(collection, persist_dir)
+    if export_mmap or (export_mmap is None and changed and mmap_index.exists(persist_dir)):
+        mmap_index.export_from_collection(collection, persist_dir)
+    if changed or not doc_store.exists(persist_dir):
+        # 清洗后全文（切片 start_offset / end_offset 所指），供检索时 expand 上下文；解析结果来自 artifact_cache
+        doc_store.write_store(
+            persist_dir, ((doc_id, *artifact_cache.load_document(path)) for doc_id, path in doc_paths)
+        )
 
-    return len(all_chunks), COLLECTION_NAME
+    if changed:
+        # 读侧（rag_retrieve）复用的句柄作废，并推进入库代数使检索缓存整体失效
+        chroma_client.invalidate(persist_dir)
+        chroma_client.bump_generation(persist_dir)
+    return len(desired), COLLECTION_NAME
 
 
 if __name__ == "__main__":
@@ -106,5 +410,7 @@ if __name__ == "__main__":
     results_dir = root / "results"
     data_root = root / "data" / "res.6-007-spring-2011"
     index_path = root / "config" / "doc_index.json"
-    n, name = ingest_results_to_chroma(results_dir, data_root, index_path=index_path)
-    print(f"Ingested {n} chunks into collection '{name}'.")
+    n, name = ingest_results_to_chroma(
+        results_dir, data_root, index_path=index_path, full_rebuild="--full" in sys.argv[1:]
+    )
+    print(f"Collection '{name}' now holds {n} chunks.")
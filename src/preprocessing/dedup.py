@@ -1,30 +1,268 @@
 """
 3.3.1 重复内容检测和去重：基于文本 hash 或向量相似度，对切片列表去重。
 供 chroma_ingest 或独立脚本调用。
+- hash：归一化文本 MD5 完全相同
+- minhash：字符 shingle 的 MinHash 签名 + 分带 LSH，估计 Jaccard >= 阈值视为近似重复；
+  只与同桶的已保留切片比较，不做两两比较，可扩展到十万级切片
+- embedding：嵌入向量余弦相似度 >= 阈值视为语义重复；分块矩阵乘（每次 block × block），
+  内存 O(block²) 而非 O(n²)；向量缺省经 embedding_cache 取得，与 Chroma 入库共用
 """
 from __future__ import annotations
 
 import hashlib
-from typing import List, Tuple
+from typing import Any, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from src.common.env import env_float, env_int
 
 from .splitter import ChunkWithMeta
 
+# MinHash：字符 shingle 长度、置换数、LSH 分带数（每带 MINHASH_PERMUTATIONS // MINHASH_BANDS 行）
+SHINGLE_SIZE = 5
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 16
+MINHASH_SEED = 1
+# 估计 Jaccard 不低于该值视为近似重复；16 带 × 8 行时 Jaccard 0.8 的切片对约 95% 概率落入同一桶
+MINHASH_THRESHOLD = env_float("DEDUP_MINHASH_THRESHOLD", 0.8)
+# embedding：余弦相似度不低于该值视为语义重复；分块矩阵乘的块大小（行数）
+EMBEDDING_THRESHOLD = env_float("DEDUP_EMBEDDING_THRESHOLD", 0.95)
+EMBEDDING_BLOCK = env_int("DEDUP_EMBEDDING_BLOCK", 1024)
+# 一批签名计算中 shingle 总数上限：(置换数, shingle 数) 的 uint32 中间矩阵约 MINHASH_PERMUTATIONS × 该值 × 4 字节
+_SIGNATURE_BATCH_SHINGLES = 32768
+
+METHODS = ("hash", "minhash", "embedding")
+
 
 def _normalize_text(content: str) -> str:
     """归一化文本：去首尾空白、合并空白，便于 hash 判重。"""
     return " ".join(content.split())
 
 
+def _shingles(text: str, k: int = SHINGLE_SIZE) -> np.ndarray:
+    """归一化（合并空白、小写）后字符 k-gram 的 32 位多项式 hash（uint32，已去重）；不足 k 字符时整段为一个 shingle。"""
+    codes = np.frombuffer(_normalize_text(text).lower().encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) == 0:
+        return np.zeros(1, dtype=np.uint32)
+    k = min(k, len(codes))
+    n = len(codes) - k + 1
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        h = h * np.uint64(1000003) + codes[j:j + n]  # uint64 溢出即取模 2^64
+    return np.unique(((h ^ (h >> np.uint64(32))) & np.uint64(0xFFFFFFFF)).astype(np.uint32))
+
+
+def _permutations(num_perm: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    32 位置换族 h(x) = mix((a·x + b) mod 2^32)，a 为奇数（乘法在 2^32 下可逆，故为置换），mix 为 xorshift。
+    全程 uint32 原地运算，比 64 位取模快一个数量级。
+    """
+    rng = np.random.default_rng(seed)
+    a = (rng.integers(0, 1 << 31, size=(num_perm, 1), dtype=np.uint32) << np.uint32(1)) | np.uint32(1)
+    b = rng.integers(0, 1 << 32, size=(num_perm, 1), dtype=np.uint64).astype(np.uint32)
+    return a, b
+
+
+def minhash_signatures(
+    texts: Sequence[str],
+    num_perm: int = MINHASH_PERMUTATIONS,
+    seed: int = MINHASH_SEED,
+) -> np.ndarray:
+    """
+    返回 (len(texts), num_perm) uint32 MinHash 签名。多篇文本的 shingle 拼接后一次矩阵运算，
+    再按文本边界 np.minimum.reduceat 取每个置换下的最小值。
+    """
+    a, b = _permutations(num_perm, seed)
+    out = np.empty((len(texts), num_perm), dtype=np.uint32)
+    batch: list[np.ndarray] = []
+    first = 0
+
+    def flush(end: int) -> None:
+        x = np.concatenate(batch)
+        starts = np.cumsum([0] + [len(s) for s in batch[:-1]])
+        hv = a * x[None, :]
+        hv += b
+        hv ^= hv >> np.uint32(15)
+        out[first:end] = np.minimum.reduceat(hv, starts, axis=1).T
+
+    total = 0
+    for i, text in enumerate(texts):
+        sh = _shingles(text)
+        if batch and total + len(sh) > _SIGNATURE_BATCH_SHINGLES:
+            flush(i)
+            batch, first, total = [], i, 0
+        batch.append(sh)
+        total += len(sh)
+    if batch:
+        flush(len(texts))
+    return out
+
+
+class MinHashLSH:
+    """
+    分带 LSH 索引：签名切成 bands 段，每段字节串为桶键；查询只与同桶的已收录签名比较，
+    以签名逐位相等的比例估计 Jaccard。可逐条增量使用（入库流式去重）。
+    """
+
+    def __init__(
+        self,
+        threshold: float = MINHASH_THRESHOLD,
+        bands: int = MINHASH_BANDS,
+        num_perm: int = MINHASH_PERMUTATIONS,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self._sigs: dict[int, np.ndarray] = {}
+
+    def _keys(self, sig: np.ndarray) -> Iterable[tuple[dict[bytes, list[int]], bytes]]:
+        for band, bucket in enumerate(self._buckets):
+            yield bucket, sig[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def query(self, sig: np.ndarray) -> int | None:
+        """返回估计 Jaccard >= threshold 的已收录 key 中最小者；无则 None。"""
+        candidates: set[int] = set()
+        for bucket, key in self._keys(sig):
+            candidates.update(bucket.get(key, ()))
+        for c in sorted(candidates):
+            if float(np.mean(self._sigs[c] == sig)) >= self.threshold:
+                return c
+        return None
+
+    def add(self, key: int, sig: np.ndarray) -> None:
+        self._sigs[key] = sig
+        for bucket, band_key in self._keys(sig):
+            bucket.setdefault(band_key, []).append(key)
+
+
+class EmbeddingDedupIndex:
+    """
+    已保留向量的分块索引（单位化后按 block 行一块存放）。add 按顺序逐块处理新向量：
+    先与各已保留块做 (block, block) 矩阵乘，再在块内按顺序贪心，只收录未命中的向量。
+    可跨多次 add 增量使用（入库逐文件去重）。
+    """
+
+    def __init__(self, threshold: float = EMBEDDING_THRESHOLD, block: int = EMBEDDING_BLOCK) -> None:
+        self.threshold = threshold
+        self.block = max(1, block)
+        self._blocks: list[np.ndarray] = []
+        self._keys: list[np.ndarray] = []
+        self._next_key = 0
+
+    def __len__(self) -> int:
+        return sum(len(k) for k in self._keys)
+
+    def _append(self, vecs: np.ndarray, keys: np.ndarray) -> None:
+        """收录向量，先填满最后一块再开新块。"""
+        while len(vecs):
+            if self._blocks and len(self._blocks[-1]) < self.block:
+                room = self.block - len(self._blocks[-1])
+                self._blocks[-1] = np.concatenate([self._blocks[-1], vecs[:room]])
+                self._keys[-1] = np.concatenate([self._keys[-1], keys[:room]])
+            else:
+                room = self.block
+                self._blocks.append(vecs[:room])
+                self._keys.append(keys[:room])
+            vecs, keys = vecs[room:], keys[room:]
+
+    def add(self, vectors: Any) -> list[int | None]:
+        """
+        依次处理 vectors（按调用顺序编号 key，从 0 起）：与已收录向量余弦 >= threshold 的返回最早者的 key，
+        否则收录并返回 None。
+        """
+        vecs = np.asarray(vectors, dtype=np.float32)
+        if vecs.ndim != 2 or len(vecs) == 0:
+            return []
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        vecs = vecs / np.where(norms > 0, norms, 1.0)
+        out: list[int | None] = []
+        for s in range(0, len(vecs), self.block):
+            rows = vecs[s:s + self.block]
+            keys = np.arange(self._next_key, self._next_key + len(rows), dtype=np.int64)
+            self._next_key += len(rows)
+            match = np.full(len(rows), -1, dtype=np.int64)
+            for blk, blk_keys in zip(self._blocks, self._keys):
+                open_rows = np.flatnonzero(match < 0)
+                if len(open_rows) == 0:
+                    break
+                hit = rows[open_rows] @ blk.T >= self.threshold
+                found = hit.any(axis=1)
+                match[open_rows[found]] = blk_keys[hit[found].argmax(axis=1)]
+            # 块内按顺序贪心：只与本块中已收录的行比较
+            sims = rows @ rows.T
+            kept: list[int] = []
+            for r in range(len(rows)):
+                if match[r] >= 0:
+                    continue
+                if kept:
+                    hit = sims[r, kept] >= self.threshold
+                    if hit.any():
+                        match[r] = keys[kept[int(hit.argmax())]]
+                        continue
+                kept.append(r)
+            self._append(rows[kept], keys[kept])
+            out.extend(None if m < 0 else int(m) for m in match)
+        return out
+
+
+def embedding_duplicate_pairs(
+    vectors: Any,
+    threshold: float = EMBEDDING_THRESHOLD,
+    block: int = EMBEDDING_BLOCK,
+) -> List[Tuple[int, int]]:
+    """按顺序贪心：与更早保留的向量余弦 >= threshold 的记为 (保留向量, 当前)。"""
+    index = EmbeddingDedupIndex(threshold, block)
+    return [(m, i) for i, m in enumerate(index.add(vectors)) if m is not None]
+
+
+def _chunk_embeddings(chunks: List[ChunkWithMeta]) -> np.ndarray:
+    """切片向量：经 embedding_cache（与 Chroma 入库同一缓存与默认嵌入函数）。"""
+    from .embedding_cache import embed_texts
+
+    return embed_texts([c.get("content", "") for c in chunks])
+
+
+def _minhash_pairs(texts: Sequence[str], threshold: float) -> List[Tuple[int, int]]:
+    """按顺序逐条查询 LSH：与已保留切片近似重复则记为 (保留切片, 当前)，否则收录为保留切片。"""
+    lsh = MinHashLSH(threshold)
+    pairs: List[Tuple[int, int]] = []
+    for i, sig in enumerate(minhash_signatures(texts)):
+        j = lsh.query(sig)
+        if j is None:
+            lsh.add(i, sig)
+        else:
+            pairs.append((j, i))
+    return pairs
+
+
 def find_duplicate_chunks(
     chunks: List[ChunkWithMeta],
     method: str = "hash",
+    *,
+    threshold: float | None = None,
+    embeddings: Any = None,
 ) -> List[Tuple[int, int]]:
     """
     检测重复切片，返回重复对 (index_first, index_duplicate) 列表。
     method="hash"：文本归一化后 MD5，相同 hash 视为重复（保留首次出现的索引为 first）。
+    method="minhash"：MinHash LSH 近似重复，估计 Jaccard >= threshold（缺省 MINHASH_THRESHOLD）；
+    first 为按顺序最早保留、且与之近似的切片。
+    method="embedding"：余弦相似度 >= threshold（缺省 EMBEDDING_THRESHOLD），first 同 minhash；
+    embeddings 为与 chunks 对齐的 (n, dim) 向量（如入库时已算好的），缺省经 embedding_cache 计算。
     """
-    if method != "hash":
+    if method not in METHODS:
         raise ValueError(f"Unsupported method: {method}")
+    if method == "embedding":
+        if not chunks:
+            return []
+        vectors = _chunk_embeddings(chunks) if embeddings is None else embeddings
+        return embedding_duplicate_pairs(vectors, EMBEDDING_THRESHOLD if threshold is None else threshold)
+    if method == "minhash":
+        return _minhash_pairs(
+            [c.get("content", "") for c in chunks], MINHASH_THRESHOLD if threshold is None else threshold
+        )
     seen: dict[str, int] = {}
     pairs: List[Tuple[int, int]] = []
     for i, c in enumerate(chunks):
@@ -37,16 +275,30 @@ def find_duplicate_chunks(
     return pairs
 
 
+def duplicate_clusters(pairs: List[Tuple[int, int]]) -> dict[int, list[int]]:
+    """把重复对按保留切片分组：{保留切片索引: [重复切片索引, ...]}。"""
+    clusters: dict[int, list[int]] = {}
+    for first, dup in pairs:
+        clusters.setdefault(first, []).append(dup)
+    return clusters
+
+
 def dedup_chunks(
     chunks: List[ChunkWithMeta],
     method: str = "hash",
+    *,
+    threshold: float | None = None,
+    embeddings: Any = None,
 ) -> List[ChunkWithMeta]:
     """
     去重：保留首次出现的切片，后续重复项丢弃。
-    返回去重后的切片列表（顺序保持首次出现顺序）。
+    返回去重后的切片列表（顺序保持首次出现顺序）。method / threshold / embeddings 同 find_duplicate_chunks。
     """
-    if method != "hash":
+    if method not in METHODS:
         raise ValueError(f"Unsupported method: {method}")
+    if method != "hash":
+        dropped = {j for _, j in find_duplicate_chunks(chunks, method, threshold=threshold, embeddings=embeddings)}
+        return [c for i, c in enumerate(chunks) if i not in dropped]
     seen: dict[str, int] = {}
     out: List[ChunkWithMeta] = []
     for c in chunks:
@@ -35,6 +35,8 @@ class DocEntry(TypedDict, total=False):
     related_hw: str | None
     related_sol: str | None
     related_lec: str | None
+    source_pdf: str  # 仅 build_doc_index(manifest=...)：转换来源 PDF 文件名
+    pdf_sha256: str
 
 
 def parse_md_filename(name: str) -> tuple[str, str, str] | None:
@@ -84,18 +86,28 @@ def build_doc_index(
     data_root: Path | None = None,
     *,
     include_relations: bool = True,
+    manifest: Path | None = None,
 ) -> list[DocEntry]:
     """
     扫描 results_dir 下所有 .md，构建文档索引。
     若提供 data_root（如 data/res.6-007-spring-2011），则通过 content_map + data.json 补全 title/description。
     include_relations 为 True 时填充 related_hw / related_sol / related_lec。
+    manifest 为批量转换清单（pdf_batch，如 results/convert_manifest.json）时，只索引其中转换成功的输出，
+    并填充 source_pdf / pdf_sha256。
     """
     results_dir = Path(results_dir)
     data_root = Path(data_root) if data_root else None
     content_map = load_content_map(data_root) if data_root else {}
+    converted = None
+    if manifest is not None:
+        from .pdf_batch import converted_outputs
+
+        converted = converted_outputs(Path(manifest))
 
     entries: list[DocEntry] = []
     md_files = sorted(results_dir.glob("*.md"))
+    if converted is not None:
+        md_files = [p for p in md_files if p.name in converted]
 
     for path in md_files:
         name = path.name
@@ -110,6 +122,9 @@ def build_doc_index(
             "doc_id": doc_id,
             "doc_type": doc_type,
         }
+        if converted is not None:
+            entry["source_pdf"] = converted[name]["source_pdf"]  # type: ignore[typeddict-item]
+            entry["pdf_sha256"] = converted[name]["pdf_sha256"]
         if doc_type == "lecture":
             entry["lecture_index"] = int(doc_id[3:], 10)
         elif doc_type == "homework":
@@ -186,6 +201,22 @@ def save_doc_index(entries: list[DocEntry], out_path: Path) -> None:
         json.dump(entries, f, ensure_ascii=False, indent=2)
 
 
+def resolve_entry_path(entry: DocEntry, results_dir: Path | None = None) -> Path | None:
+    """
+    定位索引条目对应的 .md：优先 file_path；不存在时（索引可能生成于其他机器，如 Windows 绝对路径）
+    在 results_dir 下按 file_name 查找。找不到返回 None。
+    """
+    path = Path(entry.get("file_path", ""))
+    if path.is_file():
+        return path
+    if results_dir is not None:
+        name = entry.get("file_name") or path.name
+        candidate = Path(results_dir) / name
+        if candidate.is_file():
+            return candidate
+    return None
+
+
 def load_doc_index(index_path: Path) -> list[DocEntry]:
     """从 JSON 文件加载文档索引。"""
     with open(index_path, "r", encoding="utf-8") as f:
@@ -0,0 +1,139 @@
+"""
+清洗后文档存储：各文档的 cleaned_text（md_loader.load_md）按 UTF-32-LE 拼接写入 persist_dir/doc_store/texts.u32，
+定长编码下字符下标 × 4 即字节偏移，np.memmap 打开后按切片 metadata 的 start_offset / end_offset 直接切出父级上下文。
+retrieve_documents(expand="section" | "window") 由此扩展命中切片，不再为取上下文追加向量查询，向量库也不必存整节文本。
+- texts.u32：全部文档码点拼接（多个 worker 共享同一份页缓存）
+- docs.json：doc_id -> {"start": 起始字符, "length": 字符数, "sections": [[level, title, start_offset, end_offset], ...]}
+入库（chroma_ingest）在集合变化或存储缺失时重写。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Iterable
+
+import numpy as np
+
+from .md_loader import Section
+
+STORE_DIR_NAME = "doc_store"
+
+_logger = logging.getLogger(__name__)
+
+
+class DocStore:
+    """只读文档存储；文本为内存映射，切片时只解码所需区间。"""
+
+    def __init__(self, store_dir: Path) -> None:
+        store_dir = Path(store_dir)
+        with open(store_dir / "docs.json", "r", encoding="utf-8") as f:
+            self.docs: dict[str, dict[str, Any]] = json.load(f)
+        self.store_dir = store_dir
+        path = store_dir / "texts.u32"
+        # 空文件不能 memmap
+        self.texts = np.memmap(path, dtype="<u4", mode="r") if path.stat().st_size else np.zeros(0, dtype="<u4")
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.docs
+
+    def length(self, doc_id: str) -> int:
+        return int(self.docs[doc_id]["length"])
+
+    def slice(self, doc_id: str, start: int, end: int) -> str:
+        """doc_id 清洗后全文的 [start, end) 字符区间（越界部分截掉）。"""
+        doc = self.docs[doc_id]
+        n = int(doc["length"])
+        start, end = max(0, min(start, n)), max(0, min(end, n))
+        base = int(doc["start"])
+        return self.texts[base + start:base + end].tobytes().decode("utf-32-le")
+
+    def section_span(self, doc_id: str, offset: int, title: str | None = None) -> tuple[int, int] | None:
+        """
+        切片所在章节区间：优先取包含 offset、标题为 title 的最内层非 1 级章节（即切片的 section_title，
+        1 级标题通常覆盖全文），否则取包含 offset 的最内层章节；文档无章节时返回 None。
+        """
+        best: tuple[int, int] | None = None
+        titled: tuple[int, int] | None = None
+        for level, sec_title, s, e in self.docs[doc_id]["sections"]:
+            if not s <= offset < e:
+                continue
+            if best is None or e - s < best[1] - best[0]:
+                best = (s, e)
+            if level >= 2 and sec_title == title and (titled is None or e - s < titled[1] - titled[0]):
+                titled = (s, e)
+        return titled or best
+
+
+def store_dir_for(persist_dir: str) -> Path:
+    return Path(persist_dir) / STORE_DIR_NAME
+
+
+def exists(persist_dir: str) -> bool:
+    return (store_dir_for(persist_dir) / "docs.json").is_file()
+
+
+def write_store(persist_dir: str, documents: Iterable[tuple[str, str, list[Section]]]) -> int:
+    """
+    写入 (doc_id, cleaned_text, sections) 序列：先写同级临时目录再整体替换（同 mmap_index.write_index）。
+    doc_id 重复时保留首个。返回文档数。
+    """
+    store_dir = store_dir_for(persist_dir)
+    tmp_dir = store_dir.with_name(f"{store_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    docs: dict[str, dict[str, Any]] = {}
+    pos = 0
+    with open(tmp_dir / "texts.u32", "wb") as f:
+        for doc_id, cleaned, sections in documents:
+            if doc_id in docs:
+                continue
+            f.write(cleaned.encode("utf-32-le"))
+            docs[doc_id] = {
+                "start": pos,
+                "length": len(cleaned),
+                "sections": [[s["level"], s["title"], s["start_offset"], s["end_offset"]] for s in sections],
+            }
+            pos += len(cleaned)
+    with open(tmp_dir / "docs.json", "w", encoding="utf-8") as f:
+        json.dump(docs, f, ensure_ascii=False)
+
+    old_dir = store_dir.with_name(f"{store_dir.name}.old-{os.getpid()}")
+    if store_dir.exists():
+        os.replace(store_dir, old_dir)
+    os.replace(tmp_dir, store_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return len(docs)
+
+
+_cache_lock = threading.Lock()
+_loaded: dict[str, tuple[tuple[int, int], DocStore]] = {}
+
+
+def load_cached(persist_dir: str) -> DocStore | None:
+    """按 docs.json 的 (mtime, inode) 缓存已打开的存储；不存在返回 None。"""
+    store_dir = store_dir_for(persist_dir)
+    try:
+        st = (store_dir / "docs.json").stat()
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_ino)
+    key = str(store_dir.resolve())
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with _cache_lock:
+        cached = _loaded.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            store = DocStore(store_dir)
+        except (OSError, ValueError, KeyError) as e:
+            _logger.warning("doc store load failed (%s): %s", store_dir, e)
+            return None
+        _loaded[key] = (stamp, store)
+        return store
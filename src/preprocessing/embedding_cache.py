@@ -0,0 +1,262 @@
+"""
+持久化嵌入缓存：SQLite 表，键为 (嵌入模型 id, dedup._normalize_text 归一化文本的 md5)，值为 float32 向量。
+入库（chroma_ingest）在嵌入前查缓存，只对未命中的切片调用嵌入模型并写回。
+检索时 query 嵌入（embed_queries）默认不碰 SQLite：只查进程内 query LRU，未命中时调用嵌入模型，
+检索路径不打开库文件、不争用写锁；EMBEDDING_CACHE_QUERY_READ=1 时 query 也查库（只读），
+EMBEDDING_CACHE_QUERY_WRITE=1 时查库并写回。
+切片参数扫描（SPLITTER_CHUNK_SIZE / SPLITTER_CHUNK_OVERLAP）与反复重新入库时大部分切片文本不变，可直接命中。
+EMBEDDING_CACHE=0 关闭；EMBEDDING_CACHE_PATH 指定库文件（默认项目根 .cache/embedding_cache.sqlite3，多个 persist_dir 共用）。
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from .dedup import _normalize_text
+
+# Chroma 集合默认嵌入函数（DefaultEmbeddingFunction = ONNX all-MiniLM-L6-v2）
+DEFAULT_MODEL_ID = "chroma-default:all-MiniLM-L6-v2"
+ENABLED = os.environ.get("EMBEDDING_CACHE", "1") != "0"
+CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH") or str(
+    Path(__file__).resolve().parents[2] / ".cache" / "embedding_cache.sqlite3"
+)
+# 检索 query 是否查 SQLite 库（默认否：只用进程内 query LRU + 嵌入模型）
+QUERY_READ_DB = os.environ.get("EMBEDDING_CACHE_QUERY_READ", "0") == "1"
+# 检索 query 的新嵌入是否写回 SQLite（默认否；开启时隐含查库）
+QUERY_WRITE_BACK = os.environ.get("EMBEDDING_CACHE_QUERY_WRITE", "0") == "1"
+# 进程内热点层：检索时重复 query 不必每次读 SQLite
+MEMORY_ITEMS = 4096
+# SQLite IN (...) 参数上限以内的分批大小
+_QUERY_CHUNK = 500
+
+_logger = logging.getLogger(__name__)
+
+EmbedFn = Callable[[list[str]], Any]
+
+
+def text_key(text: str) -> str:
+    """缓存键：与 dedup 相同的空白归一化后取 md5。"""
+    return hashlib.md5(_normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """线程安全的 SQLite 嵌入缓存，前置一层进程内 LRU。"""
+
+    def __init__(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, dim INTEGER NOT NULL, vec BLOB NOT NULL, "
+            "PRIMARY KEY (model, key)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model_id: str, keys: Sequence[str]) -> dict[str, np.ndarray]:
+        """返回已缓存的 key -> 向量；未命中的 key 不在结果中。"""
+        found: dict[str, np.ndarray] = {}
+        with self._lock:
+            missing = []
+            for k in dict.fromkeys(keys):
+                vec = self._memory.get((model_id, k))
+                if vec is None:
+                    missing.append(k)
+                else:
+                    self._memory.move_to_end((model_id, k))
+                    found[k] = vec
+            for i in range(0, len(missing), _QUERY_CHUNK):
+                part = missing[i:i + _QUERY_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(part))})",
+                    (model_id, *part),
+                ).fetchall()
+                for k, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    found[k] = vec
+                    self._remember(model_id, k, vec)
+        return found
+
+    def remember_many(self, model_id: str, items: dict[str, np.ndarray]) -> None:
+        """只放入进程内 LRU，不写 SQLite。"""
+        with self._lock:
+            for k, vec in items.items():
+                self._remember(model_id, k, np.asarray(vec, dtype=np.float32))
+
+    def put_many(self, model_id: str, items: dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        rows = []
+        for k, vec in items.items():
+            v = np.ascontiguousarray(vec, dtype=np.float32)
+            rows.append((model_id, k, int(v.shape[0]), v.tobytes()))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            for k, vec in items.items():
+                self._remember(model_id, k, np.asarray(vec, dtype=np.float32))
+
+    def _remember(self, model_id: str, key: str, vec: np.ndarray) -> None:
+        self._memory[(model_id, key)] = vec
+        self._memory.move_to_end((model_id, key))
+        while len(self._memory) > MEMORY_ITEMS:
+            self._memory.popitem(last=False)
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        embed_fn: EmbedFn,
+        model_id: str = DEFAULT_MODEL_ID,
+        *,
+        write_back: bool = True,
+    ) -> np.ndarray:
+        """
+        返回 (len(texts), dim) 向量；只对未命中（且去重后）的文本调用 embed_fn。
+        write_back=False 时新向量只进进程内 LRU，不写 SQLite。
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        keys = [text_key(t) for t in texts]
+        found = self.get_many(model_id, keys)
+        pending: dict[str, str] = {}
+        for k, t in zip(keys, texts):
+            if k not in found:
+                pending.setdefault(k, t)
+        with self._lock:
+            self.hits += len(keys) - sum(1 for k in keys if k in pending)
+            self.misses += sum(1 for k in keys if k in pending)
+        if pending:
+            vectors = np.asarray(embed_fn(list(pending.values())), dtype=np.float32)
+            fresh = dict(zip(pending, vectors))
+            if write_back:
+                self.put_many(model_id, fresh)
+            else:
+                self.remember_many(model_id, fresh)
+            found.update(fresh)
+        return np.stack([found[k] for k in keys])
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "path": self.path,
+                "memory_items": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_lock = threading.Lock()
+_caches: dict[str, EmbeddingCache] = {}
+_default_fn: EmbedFn | None = None
+# 检索 query 的进程内 LRU：(模型 id, 文本键) -> 向量，不落盘
+_query_lock = threading.Lock()
+_query_memory: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+
+
+def get_cache(path: str | None = None) -> EmbeddingCache:
+    """按库文件路径在进程内复用 EmbeddingCache。"""
+    key = os.path.abspath(path or CACHE_PATH)
+    cache = _caches.get(key)
+    if cache is not None:
+        return cache
+    with _lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = EmbeddingCache(key)
+            _caches[key] = cache
+        return cache
+
+
+def default_embedding_function() -> EmbedFn:
+    """与 Chroma 集合相同的默认嵌入函数，进程内只加载一次（不打开 Chroma client）。"""
+    global _default_fn
+    if _default_fn is None:
+        with _lock:
+            if _default_fn is None:
+                try:
+                    from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+                except ImportError:
+                    raise RuntimeError("chromadb not installed. Run: pip install chromadb")
+                _default_fn = DefaultEmbeddingFunction()
+    return _default_fn
+
+
+def embed_texts(
+    texts: Sequence[str],
+    *,
+    embed_fn: EmbedFn | None = None,
+    model_id: str = DEFAULT_MODEL_ID,
+    write_back: bool = True,
+) -> np.ndarray:
+    """
+    嵌入文本，经缓存去重；embed_fn 缺省为 Chroma 默认嵌入函数。write_back=False 时未命中的新向量不写 SQLite。
+    缓存关闭或不可用（如只读文件系统）时直接调用 embed_fn。
+    """
+    fn = embed_fn or default_embedding_function()
+    if ENABLED:
+        try:
+            cache = get_cache()
+        except (OSError, sqlite3.Error) as e:
+            _logger.warning("embedding cache unavailable (%s): %s", CACHE_PATH, e)
+        else:
+            return cache.embed(texts, fn, model_id, write_back=write_back)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.asarray(fn(list(texts)), dtype=np.float32)
+
+
+def embed_queries(
+    texts: Sequence[str],
+    *,
+    embed_fn: EmbedFn | None = None,
+    model_id: str = DEFAULT_MODEL_ID,
+) -> np.ndarray:
+    """
+    检索 query 嵌入：默认只查进程内 query LRU，未命中的（去重后）调用嵌入模型，不打开 SQLite 库。
+    EMBEDDING_CACHE_QUERY_READ=1 / EMBEDDING_CACHE_QUERY_WRITE=1 时改走 embed_texts（查库，后者还写回）。
+    """
+    if ENABLED and (QUERY_READ_DB or QUERY_WRITE_BACK):
+        return embed_texts(texts, embed_fn=embed_fn, model_id=model_id, write_back=QUERY_WRITE_BACK)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    fn = embed_fn or default_embedding_function()
+    keys = [text_key(t) for t in texts]
+    found: dict[str, np.ndarray] = {}
+    pending: dict[str, str] = {}
+    with _query_lock:
+        for k, t in zip(keys, texts):
+            vec = _query_memory.get((model_id, k))
+            if vec is None:
+                pending.setdefault(k, t)
+            else:
+                _query_memory.move_to_end((model_id, k))
+                found[k] = vec
+    if pending:
+        fresh = dict(zip(pending, np.asarray(fn(list(pending.values())), dtype=np.float32)))
+        found.update(fresh)
+        with _query_lock:
+            for k, vec in fresh.items():
+                _query_memory[(model_id, k)] = vec
+                _query_memory.move_to_end((model_id, k))
+            while len(_query_memory) > MEMORY_ITEMS:
+                _query_memory.popitem(last=False)
+    return np.stack([found[k] for k in keys])
@@ -0,0 +1,337 @@
+"""
+PDF-Extract-Kit 流水线模式：页面分块渲染，交给常驻的提取进程（模型只加载一次），渲染下一块与提取当前块并行。
+- 常驻进程：tools/docker/pdf-extract-kit/entrypoint.py --serve（Docker 容器内或本地 PDF_EXTRACT_KIT_ROOT 环境），
+  stdin / stdout 逐行 JSON 通信：启动完成输出 {"ready": true}；每个请求 {"id", "input", "output"} 回复 {"id", "ok"}
+- 每块单独计时（PDF_EXTRACT_KIT_CHUNK_TIMEOUT），超时只丢当前块：终止并在下一块重启提取进程
+- 逐页结果按 (提取器标识, 页面 PNG 字节) 的 sha256 缓存在 PDF_EXTRACT_KIT_CACHE_DIR，重跑时已完成页面直接复用，
+  全部命中时不启动提取进程
+pdf_parser 在 PDF_EXTRACT_KIT_PIPELINE=1（默认）时优先走此模式；提取进程无法启动（如旧镜像不支持 --serve）
+或有页面失败时退回整目录单次调用（后者即失败块的第二次尝试）。页面渲染见 pdf_pages，本模块不依赖 pdf_parser。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+from src.common.env import env_int
+
+from . import pdf_pages
+
+PIPELINE = os.environ.get("PDF_EXTRACT_KIT_PIPELINE", "1") != "0"
+CHUNK_PAGES = env_int("PDF_EXTRACT_KIT_CHUNK_PAGES", 8)
+CHUNK_TIMEOUT = env_int("PDF_EXTRACT_KIT_CHUNK_TIMEOUT", 300)
+# 提取进程启动（加载模型）超时
+STARTUP_TIMEOUT = env_int("PDF_EXTRACT_KIT_STARTUP_TIMEOUT", 600)
+CACHE_DIR = os.environ.get("PDF_EXTRACT_KIT_CACHE_DIR") or str(
+    Path(__file__).resolve().parents[2] / ".cache" / "pdf_extract_kit"
+)
+SERVER_SCRIPT = Path(__file__).resolve().parents[2] / "tools" / "docker" / "pdf-extract-kit" / "entrypoint.py"
+# 渲染线程领先提取的块数上限（限制临时图片占用）
+_RENDER_AHEAD = 2
+
+_logger = logging.getLogger(__name__)
+
+
+class ExtractorUnavailable(RuntimeError):
+    """常驻提取进程无法启动或未完成握手。"""
+
+
+class ExtractorSession:
+    """
+    常驻提取进程。command 启动进程；to_remote 把宿主机路径映射为进程内路径（Docker 挂载）；
+    cleanup 在关闭时执行（如 docker rm -f，终止 docker CLI 不一定停止容器）。
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        *,
+        env: dict[str, str] | None = None,
+        cwd: str | None = None,
+        to_remote: Callable[[Path], str] = str,
+        cleanup: list[str] | None = None,
+    ) -> None:
+        self.command = command
+        self.env = env
+        self.cwd = cwd
+        self.to_remote = to_remote
+        self.cleanup = cleanup
+        self._proc: subprocess.Popen | None = None
+        self._lines: queue.Queue = queue.Queue()
+        self._next_id = 0
+        self.ever_ready = False  # 曾成功启动过（之后的重启失败按块失败处理，不再整体退回）
+
+    @staticmethod
+    def _read(proc: subprocess.Popen, lines: queue.Queue) -> None:
+        # 每个进程一个队列：重启后旧进程的残留输出不会混入
+        for line in proc.stdout:  # type: ignore[union-attr]
+            lines.put(line)
+        lines.put(None)  # 进程退出
+
+    def _wait(self, predicate: Callable[[dict], bool], timeout: float) -> dict | None:
+        """等待满足 predicate 的 JSON 行；超时或进程退出返回 None。非 JSON 行（日志）忽略。"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                line = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if line is None:
+                return None
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(msg, dict) and predicate(msg):
+                return msg
+
+    def start(self) -> None:
+        try:
+            self._proc = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                bufsize=1,
+                env=self.env,
+                cwd=self.cwd,
+            )
+        except OSError as e:
+            raise ExtractorUnavailable(str(e)) from e
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self._proc, self._lines), daemon=True).start()
+        if self._wait(lambda m: m.get("ready") is True, STARTUP_TIMEOUT) is None:
+            self.close()
+            raise ExtractorUnavailable(f"extractor did not become ready: {self.command[0]}")
+        self.ever_ready = True
+
+    @property
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def run(self, input_dir: Path, output_dir: Path, timeout: float) -> bool:
+        """处理一块页面图片；成功返回 True。超时 / 失败时关闭进程（下次 run 前需重新 start）。"""
+        if not self.running:
+            self.start()
+        self._next_id += 1
+        req_id = self._next_id
+        request = {"id": req_id, "input": self.to_remote(input_dir), "output": self.to_remote(output_dir)}
+        try:
+            self._proc.stdin.write(json.dumps(request) + "\n")  # type: ignore[union-attr]
+            self._proc.stdin.flush()  # type: ignore[union-attr]
+        except (OSError, ValueError):
+            self.close()
+            return False
+        reply = self._wait(lambda m: m.get("id") == req_id, timeout)
+        if reply is None:
+            self.close(kill=True)
+            return False
+        return bool(reply.get("ok"))
+
+    def close(self, kill: bool = False) -> None:
+        """关闭 stdin 让进程自行退出（kill=True 时直接终止，用于超时的块）。"""
+        proc, self._proc = self._proc, None
+        if proc is not None:
+            try:
+                proc.stdin.close()  # type: ignore[union-attr]
+            except OSError:
+                pass
+            try:
+                proc.wait(timeout=0 if kill else 5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        if self.cleanup:
+            subprocess.run(self.cleanup, capture_output=True, timeout=30)
+
+
+def docker_session(image: str, work_dir: Path, models_path: str | None = None) -> ExtractorSession:
+    """容器内常驻提取进程：work_dir 挂载为 /work。"""
+    name = f"agent_edu_pdf_kit_{os.getpid()}_{threading.get_ident()}"
+    host_work = str(work_dir.resolve())
+    cmd = ["docker", "run", "-i", "--rm", "--name", name, "-v", f"{host_work}:/work"]
+    if models_path and Path(models_path).is_dir():
+        cmd.extend(["-v", f"{str(Path(models_path).resolve())}:/app/models"])
+    cmd.extend([image, "--serve"])
+
+    def to_remote(path: Path) -> str:
+        return "/work/" + Path(path).resolve().relative_to(work_dir.resolve()).as_posix()
+
+    return ExtractorSession(cmd, to_remote=to_remote, cleanup=["docker", "rm", "-f", name])
+
+
+def local_session(kit_root: Path) -> ExtractorSession:
+    """本地 PDF-Extract-Kit 环境中的常驻提取进程（与容器共用 entrypoint.py）。"""
+    env = {**os.environ, "PYTHONPATH": str(kit_root), "PDF_EXTRACT_KIT_APP_ROOT": str(kit_root)}
+    return ExtractorSession(
+        [os.environ.get("PYTHON", "python"), str(SERVER_SCRIPT), "--serve"], env=env, cwd=str(kit_root)
+    )
+
+
+def _cache_path(key: str) -> Path:
+    return Path(CACHE_DIR) / key[:2] / f"{key}.md"
+
+
+def _cache_get(key: str) -> str | None:
+    try:
+        return _cache_path(key).read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def _cache_put(key: str, text: str) -> None:
+    path = _cache_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        _logger.warning("page cache write failed (%s): %s", path, e)
+
+
+def _rendered_chunks(pdf_path: Path, images_dir: Path, n_pages: int) -> Iterator[list[str]]:
+    """按页序渲染，每 CHUNK_PAGES 页产出一块图片文件名。"""
+    chunk: list[str] = []
+    for _, name in pdf_pages.map_page_ranges(pdf_pages.render_pages, pdf_path, 0, n_pages, None, str(images_dir), pdf_pages.RENDER_DPI):
+        chunk.append(name)
+        if len(chunk) >= max(1, CHUNK_PAGES):
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _page_outputs(out_dir: Path, names: list[str]) -> dict[str, str]:
+    """提取输出中与页面图片同名（stem）的 .md 内容。"""
+    stems = {Path(n).stem: n for n in names}
+    found: dict[str, str] = {}
+    for md in sorted(out_dir.rglob("*.md")):
+        name = stems.get(md.stem)
+        if name is not None and name not in found:
+            found[name] = md.read_text(encoding="utf-8", errors="replace")
+    return found
+
+
+def export_pipelined(
+    pdf_path: Path,
+    out_path: Path,
+    make_session: Callable[[Path], ExtractorSession],
+    extractor_id: str,
+) -> Path | None:
+    """
+    流水线转换 pdf_path 到 out_path。make_session(work_dir) 创建提取进程（首次需要提取时才启动）。
+    有页面失败（超时、提取出错、无输出）时返回 None，已完成页面留在缓存中供重跑（pdf_parser 随后整目录再试一次）；
+    提取进程无法启动时抛出 ExtractorUnavailable（调用方可退回整目录模式）。
+    """
+    n_pages = pdf_pages.page_count(pdf_path)
+    with tempfile.TemporaryDirectory(prefix="agent_edu_pdf_kit_") as tmp:
+        work = Path(tmp)
+        images_dir = work / "images"
+        images_dir.mkdir()
+        chunks: queue.Queue = queue.Queue(maxsize=_RENDER_AHEAD)
+        stop = threading.Event()
+        render_error: list[BaseException] = []
+
+        def render() -> None:
+            try:
+                for chunk in _rendered_chunks(pdf_path, images_dir, n_pages):
+                    while not stop.is_set():
+                        try:
+                            chunks.put(chunk, timeout=0.2)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+            except BaseException as e:  # 在主线程重新抛出
+                render_error.append(e)
+            finally:
+                if not stop.is_set():
+                    chunks.put(None)
+
+        renderer = threading.Thread(target=render, daemon=True)
+        renderer.start()
+        session: ExtractorSession | None = None
+        texts: dict[str, str] = {}
+        failed: list[str] = []
+        try:
+            for k, names in enumerate(iter(chunks.get, None)):
+                keys = {}
+                for name in names:
+                    h = hashlib.sha256(extractor_id.encode("utf-8") + b"\0")
+                    h.update((images_dir / name).read_bytes())
+                    keys[name] = h.hexdigest()
+                todo = []
+                for name in names:
+                    cached = _cache_get(keys[name])
+                    if cached is None:
+                        todo.append(name)
+                    else:
+                        texts[name] = cached
+                if todo:
+                    in_dir, res_dir = work / f"chunk_{k:04d}" / "in", work / f"chunk_{k:04d}" / "out"
+                    in_dir.mkdir(parents=True)
+                    res_dir.mkdir()
+                    for name in todo:
+                        os.replace(images_dir / name, in_dir / name)
+                    if session is None:
+                        session = make_session(work)
+                    t0 = time.perf_counter()
+                    try:
+                        ok = session.run(in_dir, res_dir, CHUNK_TIMEOUT)
+                    except ExtractorUnavailable:
+                        if not session.ever_ready:
+                            raise
+                        ok = False
+                    found = _page_outputs(res_dir, todo) if ok else {}
+                    for name, text in found.items():
+                        _cache_put(keys[name], text)
+                        texts[name] = text
+                    missing = [n for n in todo if n not in found]
+                    failed.extend(missing)
+                    if missing:
+                        _logger.warning(
+                            "PDF-Extract-Kit chunk %d of %s: %d/%d pages failed (%.1fs)",
+                            k, pdf_path.name, len(missing), len(todo), time.perf_counter() - t0,
+                        )
+                    shutil.rmtree(in_dir.parent, ignore_errors=True)
+                for name in names:
+                    (images_dir / name).unlink(missing_ok=True)
+        finally:
+            stop.set()
+            # 渲染线程可能阻塞在满队列上：排空直到其退出
+            while renderer.is_alive():
+                try:
+                    chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            renderer.join()
+            if session is not None:
+                session.close()
+        if render_error:
+            raise render_error[0]
+        if failed:
+            return None
+        order = sorted(texts)
+        parts = [f"# {pdf_path.name}\n\n"]
+        for name in order:
+            parts.append(texts[name])
+            parts.append("\n\n")
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text("".join(parts), encoding="utf-8")
+    return out_path
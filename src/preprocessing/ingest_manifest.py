@@ -0,0 +1,89 @@
+"""
+增量入库清单：记录每个源文件的内容 hash 与其切片 id，入库时据此只嵌入新增/变更切片、删除消失切片。
+切片 id 由 (doc_id, 切片内容 md5) 确定性生成，重复入库不会让集合无限增长。
+清单写在 persist_dir/ingest_manifest.json，与 Chroma 数据同目录，删除 chroma_db 时一并失效。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, TypedDict
+
+from .dedup import _normalize_text
+from . import splitter
+
+MANIFEST_FILE = "ingest_manifest.json"
+# 2：切片 metadata 增加 start_offset / end_offset / token_count，旧集合需全量重写 metadata
+MANIFEST_VERSION = 2
+
+
+class FileRecord(TypedDict):
+    file_hash: str  # 源 .md 文件字节 sha256
+    entry_hash: str  # 文档索引条目（除 file_path）的 hash：title 等变化会改变切片 metadata
+    chunk_ids: list[str]  # 该文件全部切片 id（切片顺序）
+    content_hashes: list[str]  # 与 chunk_ids 对应的归一化内容 md5，供跨文件去重
+    live_ids: list[str]  # 实际写入集合的 id（dedup_before_ingest 时可能少于 chunk_ids）
+
+
+def content_hash(content: str) -> str:
+    """切片内容 hash：与 dedup 相同的空白归一化后取 md5。"""
+    return hashlib.md5(_normalize_text(content).encode("utf-8")).hexdigest()
+
+
+def chunk_ids_for(doc_id: str, contents: list[str]) -> list[str]:
+    """
+    由 doc_id 与切片原文 md5 生成确定性切片 id（原文任何改动都会得到新 id 并重新嵌入）；
+    同一文档内内容重复的切片按出现次序追加 -1、-2 后缀，保证 id 唯一。
+    """
+    ids: list[str] = []
+    seen: dict[str, int] = {}
+    for content in contents:
+        h = hashlib.md5(content.encode("utf-8")).hexdigest()
+        base = hashlib.sha1(f"{doc_id}\0{h}".encode("utf-8")).hexdigest()[:32]
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        ids.append(base if n == 0 else f"{base}-{n}")
+    return ids
+
+
+def entry_hash(entry: dict[str, Any]) -> str:
+    fields = {k: v for k, v in entry.items() if k != "file_path"}
+    return hashlib.md5(json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def splitter_config() -> dict[str, int | str]:
+    """影响切片结果的配置（含切片单位与 tokenizer）；变化时清单整体作废（全部文件重新切片）。"""
+    return {**splitter.split_config(), "min_chunk": splitter.MIN_CHUNK}
+
+
+def manifest_path(persist_dir: str) -> Path:
+    return Path(persist_dir) / MANIFEST_FILE
+
+
+def load_manifest(persist_dir: str) -> dict[str, Any] | None:
+    """读取清单；不存在、损坏或版本/切片配置不一致时返回 None（调用方按全量入库处理）。"""
+    path = manifest_path(persist_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("splitter") != splitter_config():
+        return None
+    return manifest
+
+
+def save_manifest(persist_dir: str, files: dict[str, FileRecord], *, dedup: bool | str) -> None:
+    """原子写入清单（临时文件 + os.replace）；dedup 为去重方法名，未去重为 False。"""
+    path = manifest_path(persist_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": MANIFEST_VERSION, "splitter": splitter_config(), "dedup": dedup, "files": files},
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp, path)
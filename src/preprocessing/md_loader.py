@@ -44,10 +44,60 @@ class Section(TypedDict):
     end_offset: int
 
 
+def _heading(stripped: str) -> tuple[int, str]:
+    """返回 (标题级别 1-3, 标题文本)；非标题行返回 (0, "")。"""
+    if stripped.startswith("### "):
+        return 3, stripped[4:].strip()
+    if stripped.startswith("## "):
+        return 2, stripped[3:].strip()
+    if stripped.startswith("# "):
+        return 1, stripped[2:].strip()
+    return 0, ""
+
+
 def parse_md_headings(text: str) -> list[Section]:
     """
     2.1.3：按 Markdown 标题（#, ##, ###）解析层级，为后续切片提供 section 边界与标题。
     返回 Section 列表，包含 level(1-3)、title、start_line/end_line（1-based）、start_offset/end_offset（字符偏移）。
+    单遍栈式解析：遇到标题时关闭栈中所有同级或更低级（level >= 当前）的 section，文件末尾关闭其余；O(行数)。
+    section 的结束行 j 为下一个同级或更高级标题所在行（0-based，无则为总行数），
+    end_offset 为第 j 行的起始偏移，end_line 为 j - 1（section 仅有标题行时为 start_line），与原逐行扫描实现一致。
+    """
+    lines = text.splitlines()
+    sections: list[Section] = []
+    # 栈中为尚未关闭的 (level, sections 下标, 标题行号 0-based)，level 自底向上严格递增
+    stack: list[tuple[int, int, int]] = []
+    current_offset = 0
+
+    def close(j: int, end_offset: int) -> None:
+        level, idx, i = stack.pop()
+        sec = sections[idx]
+        sec["end_line"] = j - 1 if j > i + 1 else sec["start_line"]
+        sec["end_offset"] = end_offset
+
+    for i, line in enumerate(lines):
+        level, title = _heading(line.strip())
+        if level > 0:
+            while stack and stack[-1][0] >= level:
+                close(i, current_offset)
+            sections.append({
+                "level": level,
+                "title": title,
+                "start_line": i + 1,
+                "end_line": i + 1,
+                "start_offset": current_offset,
+                "end_offset": current_offset,
+            })
+            stack.append((level, len(sections) - 1, i))
+        current_offset += len(line) + 1  # +1 for \n
+    while stack:
+        close(len(lines), current_offset)
+    return sections
+
+
+def _parse_md_headings_reference(text: str) -> list[Section]:
+    """
+    逐标题向后扫描的原实现（O(标题数 × 行数)），仅作 parse_md_headings 的等价性测试与基准对照。
     """
     lines = text.splitlines()
     sections: list[Section] = []
@@ -0,0 +1,392 @@
+"""
+内存映射向量索引：从 Chroma course_docs 集合导出嵌入矩阵与紧凑元数据表，检索时不打开 Chroma（不读写其 SQLite）。
+- embeddings.npy：(n, dim) float32 / float16 连续矩阵，np.load(mmap_mode="r") 打开；
+  多个 uvicorn worker 共享同一份操作系统页缓存，无需每进程复制
+- sq_norms.npy：每行 L2 范数平方；距离按集合的 hnsw:space 计算，与 Chroma 一致
+  （l2：平方欧氏距离；cosine：1 - 余弦相似度；ip：1 - 内积）
+- col_<field>.npy：元数据列，字符串列按 meta.json 中的取值表编码为 int32，数值列直接存 int32
+  （start_offset / end_offset / token_count 可缺失，供 expand 按偏移从 doc_store 取上下文）
+- texts.npy + text_offsets.npy：切片文本 UTF-8 拼接后的字节数组与偏移
+检索为精确暴力计算：where 先转为布尔掩码筛行，再按 SEARCH_BLOCK_ROWS 行一块做矩阵乘 + argpartition，
+每块只把该块升为 float32，维护各 query 的当前 top-k；float16 索引不会整体复制成 float32。
+无法精确表达的 where（未知字段 / 运算符）抛出 UnsupportedFilter，调用方改用 Chroma 查询，不会放宽或收窄结果。
+由 retrieve_documents(backend="mmap") 使用；入库后若索引已存在会自动重新导出。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from . import embedding_cache
+
+INDEX_DIR_NAME = "mmap_index"
+# 字符串元数据列（编码为 int32）与数值列（与 splitter.chunk_metadata_for_chroma 一致）
+STR_FIELDS = ("doc_id", "doc_type", "content_type", "source_file", "section_title", "title")
+INT_FIELDS = ("chunk_index", "total_chunks")
+# 可缺失的数值列（旧索引无对应文件；缺失值存 MISSING，还原时不输出该键）
+OPTIONAL_INT_FIELDS = ("start_offset", "end_offset", "token_count")
+# 字符串列中该编码表示元数据缺失（还原 Document 时不输出该键）
+MISSING = -1
+# 支持的距离空间（Chroma hnsw:space）
+SPACES = ("l2", "cosine", "ip")
+# 检索时每块处理的行数：只把该块升为 float32（块内临时内存约 SEARCH_BLOCK_ROWS × dim × 4 字节）
+SEARCH_BLOCK_ROWS = 16384
+# 数值列额外支持的比较运算符
+_RANGE_OPS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+_logger = logging.getLogger(__name__)
+
+
+class UnsupportedFilter(ValueError):
+    """where 中有索引无法精确执行的字段或运算符（调用方应改用 Chroma 查询）。"""
+
+
+class MmapIndex:
+    """只读向量索引；所有数组均为内存映射，metadatas 在命中时按列还原。"""
+
+    def __init__(self, index_dir: Path) -> None:
+        index_dir = Path(index_dir)
+        with open(index_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.index_dir = index_dir
+        self.ids: list[str] = meta["ids"]
+        self.space: str = meta.get("space", "l2")
+        if self.space not in SPACES:
+            raise ValueError(f"unsupported distance space: {self.space!r}")
+        self.vocab: dict[str, list[str]] = meta["vocab"]
+        self._codes: dict[str, dict[str, int]] = {f: {v: i for i, v in enumerate(vals)} for f, vals in self.vocab.items()}
+        self.embeddings = np.load(index_dir / "embeddings.npy", mmap_mode="r")
+        self.sq_norms = np.load(index_dir / "sq_norms.npy", mmap_mode="r")
+        self.columns = {
+            f: np.load(index_dir / f"col_{f}.npy", mmap_mode="r") for f in (*STR_FIELDS, *INT_FIELDS)
+        }
+        for f in OPTIONAL_INT_FIELDS:
+            if (index_dir / f"col_{f}.npy").is_file():
+                self.columns[f] = np.load(index_dir / f"col_{f}.npy", mmap_mode="r")
+        self.texts = np.load(index_dir / "texts.npy", mmap_mode="r")
+        self.text_offsets = np.load(index_dir / "text_offsets.npy", mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return int(self.embeddings.shape[1])
+
+    def text(self, row: int) -> str:
+        start, end = int(self.text_offsets[row]), int(self.text_offsets[row + 1])
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+    def metadata(self, row: int) -> dict[str, Any]:
+        meta: dict[str, Any] = {}
+        for f in STR_FIELDS:
+            code = int(self.columns[f][row])
+            if code != MISSING:
+                meta[f] = self.vocab[f][code]
+        for f in INT_FIELDS:
+            meta[f] = int(self.columns[f][row])
+        for f in OPTIONAL_INT_FIELDS:
+            col = self.columns.get(f)
+            if col is not None and int(col[row]) != MISSING:
+                meta[f] = int(col[row])
+        return meta
+
+    def _field_mask(self, field: str, op: str, value: Any) -> np.ndarray:
+        col = self.columns.get(field)
+        if col is None:
+            raise UnsupportedFilter(f"field not in mmap index: {field!r}")
+        numeric = field in INT_FIELDS or field in OPTIONAL_INT_FIELDS
+        if op in _RANGE_OPS:
+            if not numeric or isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise UnsupportedFilter(f"{op} on {field!r} with {value!r}")
+            present = col != MISSING if field in OPTIONAL_INT_FIELDS else True
+            return _RANGE_OPS[op](col, value) & present
+        if op not in ("$eq", "$ne", "$in", "$nin"):
+            raise UnsupportedFilter(f"operator not supported by mmap index: {op!r}")
+        values = value if op in ("$in", "$nin") else [value]
+        if not isinstance(values, (list, tuple)):
+            raise UnsupportedFilter(f"{op} on {field!r} expects a list")
+        if numeric:
+            if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+                raise UnsupportedFilter(f"{op} on integer field {field!r} with {value!r}")
+            codes = np.asarray(values, dtype=np.int32)
+        else:
+            if not all(isinstance(v, str) for v in values):
+                raise UnsupportedFilter(f"{op} on string field {field!r} with {value!r}")
+            lookup = self._codes[field]
+            # 取值表中不存在的值编码为 -2，不会与任何行相等
+            codes = np.asarray([lookup.get(v, -2) for v in values], dtype=np.int32)
+        if op in ("$eq", "$in"):
+            return np.isin(col, codes)
+        return ~np.isin(col, codes)
+
+    def where_mask(self, where: dict[str, Any] | None) -> np.ndarray | None:
+        """
+        将 Chroma where 转为布尔掩码：$and / $or，字段上的 $eq / $ne / $in / $nin，数值列上的 $gt / $gte / $lt / $lte。
+        其余字段 / 运算符 / 值类型抛出 UnsupportedFilter（忽略某个分支会改变结果集）。
+        """
+        if not where:
+            return None
+        if "$and" in where or "$or" in where:
+            op = "$and" if "$and" in where else "$or"
+            clauses = where[op]
+            if len(where) != 1 or not isinstance(clauses, list) or not clauses:
+                raise UnsupportedFilter(f"malformed {op} clause")
+            masks = [self.where_mask(c) for c in clauses]
+            return np.logical_and.reduce(masks) if op == "$and" else np.logical_or.reduce(masks)
+        masks = []
+        for field, cond in where.items():
+            if field.startswith("$"):
+                raise UnsupportedFilter(f"operator not supported by mmap index: {field!r}")
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            if not cond:
+                raise UnsupportedFilter(f"empty condition on {field!r}")
+            for op, value in cond.items():
+                masks.append(self._field_mask(field, op, value))
+        return np.logical_and.reduce(masks)
+
+    def search(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        where: dict[str, Any] | None = None,
+    ) -> list[list[tuple[int, float]]]:
+        """
+        query_embeddings: (m, dim)；返回每条 query 按距离升序的 (行号, 距离)，最多 top_k 条。
+        距离按 self.space 计算（与 Chroma 同一空间的定义一致）。where 先筛出候选行，只对候选行做矩阵乘；
+        候选行按 SEARCH_BLOCK_ROWS 分块，逐块升为 float32 并与当前 top-k 合并。
+        where 无法精确执行时抛出 UnsupportedFilter。
+        """
+        q = np.asarray(query_embeddings, dtype=np.float32)
+        if q.ndim == 1:
+            q = q[None, :]
+        mask = self.where_mask(where)
+        rows = np.flatnonzero(mask) if mask is not None else None
+        n = len(self) if rows is None else len(rows)
+        k = min(top_k, n)
+        if k <= 0:
+            return [[] for _ in range(len(q))]
+        q_sq = np.einsum("ij,ij->i", q, q)
+        best_d = [np.empty(0, dtype=np.float32) for _ in range(len(q))]
+        best_i = [np.empty(0, dtype=np.int64) for _ in range(len(q))]
+        step = max(1, SEARCH_BLOCK_ROWS)
+        for a in range(0, n, step):
+            idx = np.arange(a, min(a + step, n)) if rows is None else rows[a:a + step]
+            block = slice(a, a + len(idx)) if rows is None else idx
+            dist = self._block_distances(np.asarray(self.embeddings[block], dtype=np.float32), self.sq_norms[block], q, q_sq)
+            for j in range(len(q)):
+                d = np.concatenate([best_d[j], dist[:, j]])
+                i = np.concatenate([best_i[j], idx])
+                if len(d) > k:
+                    keep = np.argpartition(d, k - 1)[:k]
+                    d, i = d[keep], i[keep]
+                best_d[j], best_i[j] = d, i
+        out: list[list[tuple[int, float]]] = []
+        # l2 / cosine 距离非负（消除浮点误差）；ip 距离可为负，与 Chroma 一致
+        clip = self.space != "ip"
+        for d, i in zip(best_d, best_i):
+            order = np.lexsort((i, d))
+            out.append([(int(i[t]), max(float(d[t]), 0.0) if clip else float(d[t])) for t in order])
+        return out
+
+    def _block_distances(self, emb: np.ndarray, norms: np.ndarray, q: np.ndarray, q_sq: np.ndarray) -> np.ndarray:
+        """一块行（已升为 float32）对各 query 的距离，(块行数, m)。"""
+        dots = emb @ q.T
+        norms = np.asarray(norms, dtype=np.float32)
+        if self.space == "cosine":
+            denom = np.sqrt(norms)[:, None] * np.sqrt(q_sq)[None, :]
+            return 1.0 - dots / np.maximum(denom, 1e-12)
+        if self.space == "ip":
+            return 1.0 - dots
+        # ||e - q||² = ||e||² - 2 e·q + ||q||²
+        return norms[:, None] - 2.0 * dots + q_sq[None, :]
+
+    def query(
+        self,
+        query_embeddings: np.ndarray,
+        n_results: int,
+        where: dict[str, Any] | None = None,
+    ) -> dict[str, list[list[Any]]]:
+        """与 collection.query 返回结构一致（ids / documents / metadatas / distances），便于检索层复用。"""
+        res: dict[str, list[list[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for hits in self.search(query_embeddings, n_results, where):
+            res["ids"].append([self.ids[i] for i, _ in hits])
+            res["documents"].append([self.text(i) for i, _ in hits])
+            res["metadatas"].append([self.metadata(i) for i, _ in hits])
+            res["distances"].append([d for _, d in hits])
+        return res
+
+
+def index_dir_for(persist_dir: str) -> Path:
+    return Path(persist_dir) / INDEX_DIR_NAME
+
+
+def exists(persist_dir: str) -> bool:
+    return (index_dir_for(persist_dir) / "meta.json").is_file()
+
+
+def write_index(
+    index_dir: Path,
+    ids: list[str],
+    embeddings: np.ndarray,
+    documents: list[str],
+    metadatas: list[dict[str, Any]],
+    *,
+    dtype: str = "float32",
+    space: str = "l2",
+) -> None:
+    """
+    写入索引目录：先写到同级临时目录再整体替换。已打开的旧映射在 Linux 上继续有效，
+    读侧按 meta.json 的 (mtime, inode) 判断是否重载。space 须为 SPACES 之一（否则 ValueError）。
+    """
+    if space not in SPACES:
+        raise ValueError(f"unsupported distance space: {space!r}")
+    index_dir = Path(index_dir)
+    tmp_dir = index_dir.with_name(f"{index_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    emb = np.asarray(embeddings, dtype=np.float32)
+    emb = emb.reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+    np.save(tmp_dir / "embeddings.npy", emb.astype(dtype))
+    # 范数按存储精度计算，保证与 float16 矩阵的点积一致
+    stored = emb.astype(dtype).astype(np.float32)
+    np.save(tmp_dir / "sq_norms.npy", np.einsum("ij,ij->i", stored, stored))
+
+    vocab: dict[str, list[str]] = {}
+    for f in STR_FIELDS:
+        values: dict[str, int] = {}
+        codes = np.full(len(ids), MISSING, dtype=np.int32)
+        for i, m in enumerate(metadatas):
+            v = m.get(f)
+            if v is None:
+                continue
+            codes[i] = values.setdefault(str(v), len(values))
+        vocab[f] = list(values)
+        np.save(tmp_dir / f"col_{f}.npy", codes)
+    for f in INT_FIELDS:
+        np.save(tmp_dir / f"col_{f}.npy", np.asarray([int(m.get(f, 0) or 0) for m in metadatas], dtype=np.int32))
+    for f in OPTIONAL_INT_FIELDS:
+        values = [m.get(f) for m in metadatas]
+        np.save(tmp_dir / f"col_{f}.npy", np.asarray([MISSING if v is None else int(v) for v in values], dtype=np.int32))
+
+    blobs = [(d or "").encode("utf-8") for d in documents]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in blobs])
+    np.save(tmp_dir / "texts.npy", np.frombuffer(b"".join(blobs), dtype=np.uint8))
+    np.save(tmp_dir / "text_offsets.npy", offsets)
+
+    with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+        json.dump(
+            {"ids": list(ids), "vocab": vocab, "dtype": dtype, "dim": int(emb.shape[1]), "space": space},
+            f,
+            ensure_ascii=False,
+        )
+
+    old_dir = index_dir.with_name(f"{index_dir.name}.old-{os.getpid()}")
+    if index_dir.exists():
+        os.replace(index_dir, old_dir)
+    os.replace(tmp_dir, index_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def _collection_space(collection) -> str:
+    """集合的距离空间：configuration["hnsw"]["space"]（新版 Chroma）或 metadata["hnsw:space"]，缺省 l2。"""
+    config = getattr(collection, "configuration", None)
+    hnsw = config.get("hnsw") if isinstance(config, dict) else None
+    if isinstance(hnsw, dict) and hnsw.get("space"):
+        return str(hnsw["space"])
+    metadata = getattr(collection, "metadata", None)
+    if isinstance(metadata, dict) and metadata.get("hnsw:space"):
+        return str(metadata["hnsw:space"])
+    return "l2"
+
+
+def export_from_collection(
+    collection,
+    persist_dir: str,
+    *,
+    dtype: str = "float32",
+    page_size: int = 1000,
+) -> int:
+    """从 Chroma 集合分页读取嵌入、文本与元数据，导出为 persist_dir/mmap_index；返回切片数。"""
+    ids: list[str] = []
+    embeddings: list[np.ndarray] = []
+    documents: list[str] = []
+    metadatas: list[dict[str, Any]] = []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        page_ids = page.get("ids") or []
+        if not page_ids:
+            break
+        ids.extend(page_ids)
+        embeddings.append(np.asarray(page.get("embeddings"), dtype=np.float32))
+        documents.extend(d or "" for d in (page.get("documents") or [""] * len(page_ids)))
+        metadatas.extend(dict(m or {}) for m in (page.get("metadatas") or [{}] * len(page_ids)))
+        offset += len(page_ids)
+        if len(page_ids) < page_size:
+            break
+    matrix = np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    write_index(index_dir_for(persist_dir), ids, matrix, documents, metadatas, dtype=dtype, space=_collection_space(collection))
+    return len(ids)
+
+
+_cache_lock = threading.Lock()
+_loaded: dict[str, tuple[tuple[int, int], MmapIndex]] = {}
+
+
+def load_cached(persist_dir: str) -> MmapIndex | None:
+    """按 meta.json 的 (mtime, inode) 缓存已打开的索引；索引不存在返回 None。"""
+    index_dir = index_dir_for(persist_dir)
+    try:
+        st = (index_dir / "meta.json").stat()
+    except OSError:
+        return None
+    stamp = (st.st_mtime_ns, st.st_ino)
+    key = str(index_dir.resolve())
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with _cache_lock:
+        cached = _loaded.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        try:
+            index = MmapIndex(index_dir)
+        except (OSError, ValueError, KeyError) as e:
+            _logger.warning("mmap index load failed (%s): %s", index_dir, e)
+            return None
+        _loaded[key] = (stamp, index)
+        return index
+
+
+def embed_queries(texts: list[str]) -> np.ndarray:
+    """
+    用与 Chroma 集合相同的默认嵌入函数嵌入 query，不打开 Chroma client（不读 Chroma 的 SQLite）。
+    经 embedding_cache.embed_queries：默认只用进程内 query LRU + 嵌入模型，也不打开嵌入缓存库。
+    """
+    return embedding_cache.embed_queries(texts)
+
+
+if __name__ == "__main__":
+    # 从已有 chroma_db 导出：python -m src.preprocessing.mmap_index [--float16]
+    import sys
+    root = Path(__file__).resolve().parents[2]
+    sys.path.insert(0, str(root))
+    from dotenv import load_dotenv
+    load_dotenv(root / ".env")
+    from src.preprocessing.chroma_client import default_persist_dir, get_collection
+
+    persist_dir = default_persist_dir()
+    dtype = "float16" if "--float16" in sys.argv[1:] else "float32"
+    n = export_from_collection(get_collection(persist_dir), persist_dir, dtype=dtype)
+    print(f"mmap index exported: {n} chunks ({dtype}) -> {index_dir_for(persist_dir)}")
@@ -0,0 +1,207 @@
+"""
+批量 PDF 转换：扫描目录（默认 data/pdf_to_convert），按内容 sha256 跳过输出仍有效的 PDF，其余分派到有界工作池。
+- PyMuPDF：多个文件时每个文件一个进程（文件内串行）；只有一个文件时改用页级并行（pdf_parser 页区间进程池）
+- PDF-Extract-Kit（Docker / 本地）：模型加载重、占显存，单独的线程池限流（PDF_EXTRACT_KIT_CONCURRENCY，默认 1）
+输出 <PDF 文件名 stem>.md 写入 out_dir（保留哈希前缀，符合 doc_index 的文件名模式），
+清单 out_dir/convert_manifest.json 记录每个 PDF 的 hash、后端、输出与状态；每完成一个文件即原子写回，中断后已完成的不重做。
+PDF 与输出的 (size, mtime_ns) 均未变时直接沿用清单中的 hash，不重新读文件，未变语料的重复运行几乎无开销。
+doc_index.build_doc_index(manifest=...) 可只索引清单中转换成功的输出。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, TypedDict
+
+from src.common.env import env_int
+from src.common.files import file_sha256
+from src.common.pool import pool_context
+
+from .pdf_parser import Backend, export_pdf_to_md
+
+MANIFEST_FILE = "convert_manifest.json"
+MANIFEST_VERSION = 1
+# PyMuPDF 文件级并行进程数：0 表示 os.cpu_count()
+PYMUPDF_CONCURRENCY = env_int("PDF_BATCH_WORKERS", 0)
+# PDF-Extract-Kit 同时运行的转换数（每个都是一次 docker run / run_project.py）
+EXTRACT_KIT_CONCURRENCY = env_int("PDF_EXTRACT_KIT_CONCURRENCY", 1)
+
+_logger = logging.getLogger(__name__)
+
+
+class ConvertRecord(TypedDict, total=False):
+    pdf_sha256: str
+    pdf_size: int
+    pdf_mtime_ns: int
+    backend: str
+    status: str  # "ok" | "failed"
+    output: str  # 输出 .md 文件名（相对 out_dir）
+    md_sha256: str
+    md_size: int
+    md_mtime_ns: int
+    error: str
+    seconds: float
+
+
+def manifest_path(out_dir: Path) -> Path:
+    return Path(out_dir) / MANIFEST_FILE
+
+
+def load_manifest(out_dir: Path) -> dict[str, ConvertRecord]:
+    """PDF 文件名 -> 转换记录；清单不存在、损坏或版本不一致时为空。"""
+    return _read_manifest(manifest_path(out_dir))
+
+
+def _read_manifest(path: Path) -> dict[str, ConvertRecord]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def save_manifest(out_dir: Path, files: dict[str, ConvertRecord]) -> None:
+    """原子写入（临时文件 + os.replace）。"""
+    path = manifest_path(out_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": dict(sorted(files.items()))}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _hash_with_stat(path: Path, size: int | None, mtime_ns: int | None, known: str | None) -> tuple[str, int, int]:
+    """返回 (sha256, size, mtime_ns)；stat 与记录一致时沿用已知 hash。"""
+    st = path.stat()
+    if known and st.st_size == size and st.st_mtime_ns == mtime_ns:
+        return known, st.st_size, st.st_mtime_ns
+    return file_sha256(path), st.st_size, st.st_mtime_ns
+
+
+def _is_current(rec: ConvertRecord | None, pdf_hash: str, backend: str, out_dir: Path) -> bool:
+    """清单记录与当前 PDF hash、后端一致，且输出文件存在、内容与记录相同。"""
+    if not rec or rec.get("status") != "ok" or rec.get("pdf_sha256") != pdf_hash or rec.get("backend") != backend:
+        return False
+    out = out_dir / rec.get("output", "")
+    if not out.is_file():
+        return False
+    md_hash, _, _ = _hash_with_stat(out, rec.get("md_size"), rec.get("md_mtime_ns"), rec.get("md_sha256"))
+    return md_hash == rec.get("md_sha256")
+
+
+def _convert_task(pdf_path: str, out_dir: str, backend: str, workers: int | None) -> tuple[str | None, str | None, float]:
+    """工作池任务：返回 (输出路径, 错误信息, 耗时秒)。"""
+    t0 = time.perf_counter()
+    try:
+        out = export_pdf_to_md(Path(pdf_path), Path(out_dir), backend, workers=workers, stem=Path(pdf_path).stem)  # type: ignore[arg-type]
+    except Exception as e:  # 单个文件失败不影响整批
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+    if out is None:
+        return None, f"{backend} backend unavailable or returned no output", time.perf_counter() - t0
+    return str(out), None, time.perf_counter() - t0
+
+
+def convert_directory(
+    pdf_dir: Path,
+    out_dir: Path,
+    backend: Backend = "pymupdf",
+    *,
+    workers: int | None = None,
+    kit_workers: int | None = None,
+    force: bool = False,
+) -> dict[str, Any]:
+    """
+    转换 pdf_dir 下全部 *.pdf 到 out_dir，跳过输出仍有效的文件（force=True 时全部重做）。
+    workers：PyMuPDF 文件级并行进程数，None 取 PDF_BATCH_WORKERS（0 = CPU 核数）；
+    kit_workers：PDF-Extract-Kit 并发数，None 取 PDF_EXTRACT_KIT_CONCURRENCY。
+    返回汇总 {"converted", "skipped", "failed", "removed", "seconds", "manifest"}；
+    pdf_dir 中已不存在的 PDF 从清单移除（输出文件保留）。
+    """
+    pdf_dir, out_dir = Path(pdf_dir), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    old = load_manifest(out_dir)
+    files: dict[str, ConvertRecord] = {}
+    pending: list[tuple[Path, ConvertRecord]] = []
+    skipped = 0
+    for pdf in sorted(pdf_dir.glob("*.pdf")):
+        rec = old.get(pdf.name)
+        prev = rec or {}
+        pdf_hash, size, mtime_ns = _hash_with_stat(pdf, prev.get("pdf_size"), prev.get("pdf_mtime_ns"), prev.get("pdf_sha256"))
+        if not force and rec is not None and _is_current(rec, pdf_hash, backend, out_dir):
+            files[pdf.name] = {**rec, "pdf_size": size, "pdf_mtime_ns": mtime_ns}
+            skipped += 1
+            continue
+        pending.append((pdf, {"pdf_sha256": pdf_hash, "pdf_size": size, "pdf_mtime_ns": mtime_ns, "backend": backend}))
+    removed = sorted(set(old) - {p.name for p in pdf_dir.glob("*.pdf")})
+
+    n_failed = 0
+
+    def finish(pdf: Path, base: ConvertRecord, result: tuple[str | None, str | None, float]) -> None:
+        nonlocal n_failed
+        out, error, seconds = result
+        rec: ConvertRecord = {**base, "seconds": round(seconds, 3)}
+        if out is None:
+            rec.update(status="failed", error=error or "")
+            n_failed += 1
+            _logger.warning("PDF conversion failed: %s (%s)", pdf.name, error)
+        else:
+            md = Path(out)
+            st = md.stat()
+            rec.update(status="ok", output=md.name, md_sha256=file_sha256(md), md_size=st.st_size, md_mtime_ns=st.st_mtime_ns)
+            _logger.info("Converted %s -> %s in %.1fs", pdf.name, md.name, seconds)
+        files[pdf.name] = rec
+        # 每完成一个就写回清单，中断后已完成的文件下次跳过
+        save_manifest(out_dir, {**old, **files})
+
+    if pending:
+        if backend == "pdf_extract_kit":
+            n = EXTRACT_KIT_CONCURRENCY if kit_workers is None else kit_workers
+            executor: Executor = ThreadPoolExecutor(max_workers=max(1, min(n, len(pending))))
+            page_workers: int | None = None
+        elif len(pending) == 1:
+            # 单个文件：在当前进程按页区间并行
+            executor = ThreadPoolExecutor(max_workers=1)
+            page_workers = None
+        else:
+            n = PYMUPDF_CONCURRENCY if workers is None else workers
+            if n <= 0:
+                n = os.cpu_count() or 1
+            n = max(1, min(n, len(pending)))
+            executor = ProcessPoolExecutor(max_workers=n, mp_context=pool_context()) if n > 1 else ThreadPoolExecutor(1)
+            page_workers = 1
+        with executor:
+            futures: dict[Future, tuple[Path, ConvertRecord]] = {
+                executor.submit(_convert_task, str(pdf), str(out_dir), backend, page_workers): (pdf, base)
+                for pdf, base in pending
+            }
+            for fut in as_completed(futures):
+                finish(*futures[fut], fut.result())
+
+    save_manifest(out_dir, files)
+    summary = {
+        "converted": len(pending) - n_failed,
+        "skipped": skipped,
+        "failed": n_failed,
+        "removed": len(removed),
+        "seconds": round(time.perf_counter() - started, 3),
+        "manifest": str(manifest_path(out_dir)),
+    }
+    _logger.info("PDF batch: %s", summary)
+    return summary
+
+
+def converted_outputs(manifest_file: Path) -> dict[str, ConvertRecord]:
+    """清单文件中转换成功的输出：.md 文件名 -> 转换记录（附 source_pdf 键为源 PDF 文件名）。"""
+    return {
+        rec["output"]: {**rec, "source_pdf": pdf}  # type: ignore[typeddict-unknown-key]
+        for pdf, rec in _read_manifest(Path(manifest_file)).items()
+        if rec.get("status") == "ok" and rec.get("output")
+    }
@@ -0,0 +1,98 @@
+"""
+PyMuPDF 页面级工具：页数、页面渲染为 PNG，以及按页区间分给进程池执行（每个 worker 自行打开 fitz 文档）。
+pdf_parser（文本提取、整目录 PDF-Extract-Kit 调用）与 extract_kit_pipeline（分块渲染）共用。
+"""
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from src.common.env import env_int
+from src.common.pool import pool_context
+
+# 页面提取 / 渲染的进程数：0 表示 os.cpu_count()，1 表示在当前进程串行
+PDF_WORKERS = env_int("PDF_WORKERS", 0)
+# 每个进程池任务处理的连续页数：worker 打开一次文档处理整段，字体等共享资源在段内复用，段太短时重复解析开销明显
+PAGES_PER_TASK = env_int("PDF_PAGES_PER_TASK", 32)
+RENDER_DPI = 150
+
+
+def page_count(pdf_path: Path) -> int:
+    import fitz
+
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def render_pages(pdf_path: str, start: int, end: int, images_dir: str, dpi: int) -> list[str]:
+    """进程池任务：将 [start, end) 页渲染为 images_dir/0001.png 等；已存在的图片跳过。返回文件名。"""
+    import fitz
+
+    names = []
+    with fitz.open(pdf_path) as doc:
+        for i in range(start, end):
+            name = f"{(i + 1):04d}.png"
+            target = Path(images_dir) / name
+            if not target.is_file():
+                # 先写临时文件再改名，中断时不留半张图片
+                tmp = target.with_name(f"{name}.{os.getpid()}.tmp")
+                doc.load_page(i).get_pixmap(dpi=dpi).save(tmp, output="png")
+                os.replace(tmp, target)
+            names.append(name)
+    return names
+
+
+def _resolve_workers(workers: int | None, n_pages: int) -> int:
+    n = PDF_WORKERS if workers is None else workers
+    if n <= 0:
+        n = os.cpu_count() or 1
+    return max(1, min(n, -(-n_pages // max(1, PAGES_PER_TASK))))
+
+
+def map_page_ranges(
+    task: Callable[..., list[Any]],
+    pdf_path: Path,
+    start: int,
+    end: int,
+    workers: int | None,
+    *args: Any,
+) -> Iterator[tuple[int, Any]]:
+    """
+    按页区间（PAGES_PER_TASK 页一段）执行 task(pdf_path, a, b, *args)，按页序逐页产出 (页下标, 结果)。
+    task 须为模块级函数（可 pickle）。workers 为 None 时取 PDF_WORKERS。
+    多进程时任务按窗口（2 × workers）提交，同 splitter.slice_corpus；只有一个 worker 时在当前进程串行。
+    """
+    step = max(1, PAGES_PER_TASK)
+    ranges = [(a, min(a + step, end)) for a in range(start, end, step)]
+    n_workers = _resolve_workers(workers, end - start)
+    if n_workers <= 1:
+        for a, b in ranges:
+            yield from zip(range(a, b), task(str(pdf_path), a, b, *args))
+        return
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=pool_context()) as pool:
+        window: deque[tuple[int, int, Future]] = deque()
+        it = iter(ranges)
+        for a, b in it:
+            window.append((a, b, pool.submit(task, str(pdf_path), a, b, *args)))
+            if len(window) >= 2 * n_workers:
+                break
+        while window:
+            a, b, fut = window.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                window.append((nxt[0], nxt[1], pool.submit(task, str(pdf_path), nxt[0], nxt[1], *args)))
+            yield from zip(range(a, b), fut.result())
+
+
+def render_to_dir(pdf_path: Path, images_dir: Path, workers: int | None = None) -> None:
+    """
+    将 PDF 每一页渲染为 PNG 到 images_dir，文件名按页序 0001.png, 0002.png, ...
+    页区间并行渲染（workers 同 PDF_WORKERS）；已存在的页面图片跳过。
+    """
+    images_dir.mkdir(parents=True, exist_ok=True)
+    n_pages = page_count(pdf_path)
+    for _ in map_page_ranges(render_pages, pdf_path, 0, n_pages, workers, str(images_dir), RENDER_DPI):
+        pass
@@ -2,19 +2,35 @@
 统一 PDF 解析接口：支持 PyMuPDF 与 PDF-Extract-Kit 两种后端。
 - PDF-Extract-Kit 本地：设置 PDF_EXTRACT_KIT_ROOT（Python 3.10 环境）。
 - PDF-Extract-Kit Docker：设置 PDF_EXTRACT_KIT_DOCKER_IMAGE，由 Python 3.11 通过 docker 调用。
+PyMuPDF 文本提取与页面渲染按页区间分给进程池（每个 worker 自行打开 fitz 文档），
+文本按页序流式写入输出文件并逐页记录断点，中断后再次转换从断点续跑。
 """
 from __future__ import annotations
 
+import json
+import logging
 import os
 import shutil
 import subprocess
 import tempfile
 from pathlib import Path
-from typing import Literal
+from typing import Callable, Literal
+
+from src.common.files import file_sha256
+
+from . import extract_kit_pipeline as pipeline
+from .pdf_pages import map_page_ranges, page_count, render_to_dir
 
 Backend = Literal["pymupdf", "pdf_extract_kit"]
 
 
+# 断点文件后缀：<输出>.md.partial 为已写入的前若干页，<输出>.md.ckpt.json 记录页数与字节偏移
+PARTIAL_SUFFIX = ".partial"
+CHECKPOINT_SUFFIX = ".ckpt.json"
+
+_logger = logging.getLogger(__name__)
+
+
 def _stem_from_pdf_path(pdf_path: Path) -> str:
     """从 PDF 路径得到输出文件名用 stem，去掉哈希前缀。"""
     stem = pdf_path.stem
@@ -23,43 +39,96 @@ def _stem_from_pdf_path(pdf_path: Path) -> str:
     return stem
 
 
-def _export_pymupdf(pdf_path: Path, out_dir: Path, stem: str) -> Path | None:
-    """使用 PyMuPDF 将 PDF 按页提取文本并写入单个 .md 文件。"""
+def _extract_pages(pdf_path: str, start: int, end: int) -> list[str]:
+    """进程池任务：提取 [start, end) 页的文本（已 strip）。"""
     import fitz
 
+    with fitz.open(pdf_path) as doc:
+        return [doc.load_page(i).get_text().strip() for i in range(start, end)]
+
+
+def _load_checkpoint(ckpt_path: Path, partial_path: Path, pdf_hash: str) -> tuple[int, int]:
+    """返回可续跑的 (已完成页数, partial 文件有效字节数)；断点缺失、损坏或 PDF 已变化时为 (0, 0)。"""
+    try:
+        with open(ckpt_path, "r", encoding="utf-8") as f:
+            ckpt = json.load(f)
+        if ckpt.get("pdf_sha256") != pdf_hash or partial_path.stat().st_size < ckpt["bytes"]:
+            return 0, 0
+        return int(ckpt["pages_done"]), int(ckpt["bytes"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0, 0
+
+
+def _save_checkpoint(ckpt_path: Path, pdf_hash: str, pages_done: int, n_bytes: int) -> None:
+    tmp = ckpt_path.with_name(f"{ckpt_path.name}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"pdf_sha256": pdf_hash, "pages_done": pages_done, "bytes": n_bytes}, f)
+    os.replace(tmp, ckpt_path)
+
+
+def _export_pymupdf(pdf_path: Path, out_dir: Path, stem: str, workers: int | None = None) -> Path | None:
+    """
+    使用 PyMuPDF 将 PDF 按页提取文本并写入单个 .md 文件。
+    页区间并行提取（workers 同 PDF_WORKERS），按页序流式追加到 <stem>.md.partial，每页写完更新断点；
+    全部完成后改名为 <stem>.md。上次中断留下的断点（且 PDF 未变）从已完成页之后继续。
+    """
     if not pdf_path.exists():
         return None
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{stem}.md"
-    doc = fitz.open(pdf_path)
-    parts = [f"# {pdf_path.name}\n\n", f"页数: {doc.page_count}\n\n"]
-    for i in range(doc.page_count):
-        page = doc.load_page(i)
-        text = page.get_text().strip()
-        parts.append(f"## 第 {i + 1} 页\n\n{text}\n\n")
-    doc.close()
-    out_path.write_text("".join(parts), encoding="utf-8")
-    return out_path
+    partial_path = out_path.with_name(out_path.name + PARTIAL_SUFFIX)
+    ckpt_path = out_path.with_name(out_path.name + CHECKPOINT_SUFFIX)
+    pdf_hash = file_sha256(pdf_path)
+    n_pages = page_count(pdf_path)
+    pages_done, n_bytes = _load_checkpoint(ckpt_path, partial_path, pdf_hash)
 
+    with open(partial_path, "r+b" if n_bytes else "wb") as f:
+        f.truncate(n_bytes)
+        f.seek(n_bytes)
+        if not n_bytes:
+            f.write(f"# {pdf_path.name}\n\n页数: {n_pages}\n\n".encode("utf-8"))
+        for i, text in map_page_ranges(_extract_pages, pdf_path, pages_done, n_pages, workers):
+            f.write(f"## 第 {i + 1} 页\n\n{text}\n\n".encode("utf-8"))
+            f.flush()
+            _save_checkpoint(ckpt_path, pdf_hash, i + 1, f.tell())
+        if n_pages == 0:
+            _save_checkpoint(ckpt_path, pdf_hash, 0, f.tell())
+    os.replace(partial_path, out_path)
+    ckpt_path.unlink(missing_ok=True)
+    return out_path
 
-def _pdf_to_images(pdf_path: Path, images_dir: Path) -> None:
-    """将 PDF 每一页渲染为 PNG 到 images_dir，文件名按页序 0001.png, 0002.png, ..."""
-    import fitz
 
-    doc = fitz.open(pdf_path)
-    images_dir.mkdir(parents=True, exist_ok=True)
-    for i in range(doc.page_count):
-        page = doc.load_page(i)
-        pix = page.get_pixmap(dpi=150)
-        out_name = f"{(i + 1):04d}.png"
-        pix.save(images_dir / out_name)
-    doc.close()
+def _export_pipelined(
+    pdf_path: Path,
+    out_path: Path,
+    make_session: Callable[[Path], pipeline.ExtractorSession],
+    extractor_id: str,
+) -> Path | None:
+    """
+    PDF_EXTRACT_KIT_PIPELINE=1 时先走流水线模式（extract_kit_pipeline.export_pipelined）。
+    返回 None 时调用方改走整目录单次调用：
+    - 提取进程无法启动（如旧镜像不支持 --serve）；
+    - 有块失败（超时、出错、缺页）：整目录调用作为第二次尝试。它不读逐页缓存，会重新提取全部页面；
+      流水线中已成功的页面仍在缓存里，之后再次转换时直接复用。
+    """
+    if not pipeline.PIPELINE:
+        return None
+    try:
+        out = pipeline.export_pipelined(pdf_path, out_path, make_session, extractor_id)
+    except pipeline.ExtractorUnavailable as e:
+        _logger.info("pipelined extractor unavailable, running whole directory: %s", e)
+        return None
+    if out is None:
+        _logger.warning("pipelined extraction of %s has failed pages, retrying as a whole-directory run", pdf_path.name)
+    return out
 
 
 def _export_pdf_extract_kit_docker(pdf_path: Path, out_dir: Path, stem: str) -> Path | None:
     """
     通过 Docker 调用 PDF-Extract-Kit 的 pdf2markdown。
     要求：设置 PDF_EXTRACT_KIT_DOCKER_IMAGE；可选 PDF_EXTRACT_KIT_MODELS_PATH 挂载模型目录。
+    默认先走流水线模式（extract_kit_pipeline：常驻容器、分块提取、逐页缓存）；镜像不支持 --serve
+    或有块失败时整目录单次 docker run（见 _export_pipelined）。
     """
     image = os.environ.get("PDF_EXTRACT_KIT_DOCKER_IMAGE")
     if not image:
@@ -75,6 +144,13 @@ def _export_pdf_extract_kit_docker(pdf_path: Path, out_dir: Path, stem: str) ->
 
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{stem}.md"
+    models_path = os.environ.get("PDF_EXTRACT_KIT_MODELS_PATH")
+
+    out = _export_pipelined(
+        pdf_path, out_path, lambda work: pipeline.docker_session(image, work, models_path), f"docker:{image}"
+    )
+    if out is not None:
+        return out
 
     with tempfile.TemporaryDirectory(prefix="agent_edu_pdf_kit_") as tmp:
         tmp_path = Path(tmp)
@@ -82,7 +158,7 @@ def _export_pdf_extract_kit_docker(pdf_path: Path, out_dir: Path, stem: str) ->
         result_dir = tmp_path / "output"
         result_dir.mkdir()
 
-        _pdf_to_images(pdf_path, images_dir)
+        render_to_dir(pdf_path, images_dir)
 
         # Windows 下 Docker Desktop 接受绝对路径，如 C:\Users\...
         host_images = str(images_dir.resolve())
@@ -96,7 +172,6 @@ def _export_pdf_extract_kit_docker(pdf_path: Path, out_dir: Path, stem: str) ->
             "-e", "INPUT_DIR=/input",
             "-e", "OUTPUT_DIR=/output",
         ]
-        models_path = os.environ.get("PDF_EXTRACT_KIT_MODELS_PATH")
         if models_path and Path(models_path).is_dir():
             cmd.extend(["-v", f"{str(Path(models_path).resolve())}:/app/models"])
         cmd.append(image)
@@ -123,6 +198,7 @@ def _export_pdf_extract_kit(pdf_path: Path, out_dir: Path, stem: str) -> Path |
     """
     使用 PDF-Extract-Kit 的 pdf2markdown 流程：PDF→图片→layout/OCR/公式等→Markdown。
     要求：已克隆 PDF-Extract-Kit，安装依赖并下载模型，设置环境变量 PDF_EXTRACT_KIT_ROOT。
+    默认先走流水线模式（同 Docker，常驻进程为本地环境中的 entrypoint.py --serve），退回条件同 Docker。
     """
     kit_root = os.environ.get("PDF_EXTRACT_KIT_ROOT")
     if not kit_root or not Path(kit_root).is_dir():
@@ -142,13 +218,17 @@ def _export_pdf_extract_kit(pdf_path: Path, out_dir: Path, stem: str) -> Path |
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / f"{stem}.md"
 
+    out = _export_pipelined(pdf_path, out_path, lambda work: pipeline.local_session(kit_path), f"local:{kit_path}")
+    if out is not None:
+        return out
+
     with tempfile.TemporaryDirectory(prefix="agent_edu_pdf_kit_") as tmp:
         tmp_path = Path(tmp)
         images_dir = tmp_path / "images"
         result_dir = tmp_path / "output"
 
         # 1. PDF 转图片（pdf2markdown 的 input 为图片目录）
-        _pdf_to_images(pdf_path, images_dir)
+        render_to_dir(pdf_path, images_dir)
 
         # 2. 生成临时 config：仅覆盖 inputs/outputs，其余与默认一致
         with open(default_config, "r", encoding="utf-8") as f:
@@ -192,16 +272,21 @@ def export_pdf_to_md(
     pdf_path: Path,
     out_dir: Path,
     backend: Backend = "pymupdf",
+    *,
+    workers: int | None = None,
+    stem: str | None = None,
 ) -> Path | None:
     """
     将 PDF 导出为 Markdown 文件到 out_dir，返回输出文件路径。
+    输出文件名为 <stem>.md，stem 缺省为去掉哈希前缀的 PDF 文件名（批量转换保留前缀，见 pdf_batch）。
 
-    - backend="pymupdf"：使用 PyMuPDF 按页提取文本（轻量、无需额外环境）。
+    - backend="pymupdf"：使用 PyMuPDF 按页提取文本（轻量、无需额外环境）；
+      workers 个进程并行提取（None 取 PDF_WORKERS），可断点续跑。
     - backend="pdf_extract_kit"：使用 PDF-Extract-Kit 的 pdf2markdown 流程。
       优先通过 Docker 调用（设置 PDF_EXTRACT_KIT_DOCKER_IMAGE，适合 Python 3.11 宿主）；
       否则使用本地环境（设置 PDF_EXTRACT_KIT_ROOT，需 Python 3.10 与模型）。
     """
-    stem = _stem_from_pdf_path(Path(pdf_path))
+    stem = stem or _stem_from_pdf_path(Path(pdf_path))
     if backend == "pdf_extract_kit":
         # 优先 Docker（宿主机 Python 3.11 无需安装 PDF-Extract-Kit）
         out = _export_pdf_extract_kit_docker(Path(pdf_path), Path(out_dir), stem)
@@ -211,4 +296,4 @@ def export_pdf_to_md(
         if out is not None:
             return out
         return None
-    return _export_pymupdf(Path(pdf_path), Path(out_dir), stem)
+    return _export_pymupdf(Path(pdf_path), Path(out_dir), stem, workers)
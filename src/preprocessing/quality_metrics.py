@@ -7,45 +7,52 @@ from pathlib import Path
 from typing import Any
 
 from .doc_index import load_doc_index, build_doc_index
-from .splitter import slice_document
+from .splitter import slice_corpus
 from .dedup import find_duplicate_chunks
-from .section_chunk_map import build_section_chunk_map
+from .section_chunk_map import document_sections
 
 
 def compute_quality_metrics(
     entries: list[dict],
     results_dir: Path,
+    *,
+    workers: int | None = None,
+    semantic: bool = False,
+    embeddings: Any = None,
 ) -> dict[str, Any]:
     """
-    计算数据质量指标。
+    计算数据质量指标。切片经 splitter.slice_corpus 并行（workers 同其参数）。
+    semantic: 若 True，另按嵌入余弦相似度计算语义重复率（dedup method="embedding"，向量经 embedding_cache，
+    与 Chroma 入库共用）；embeddings 可直接传入与全部切片对齐的向量。
     返回包含以下键的字典：
     - by_doc: doc_id -> { chunk_count, avg_len, min_len, max_len }
     - total_chunks, total_unique_after_dedup
     - duplicate_rate (0~1)
+    - semantic_duplicate_rate (0~1；未计算时为 None)
     - section_coverage: { doc_id -> ratio } 及 overall
     """
     results_dir = Path(results_dir)
     all_chunks: list[dict] = []
     doc_chunks: dict[str, list[dict]] = {}
+    documents_map: dict[str, list[dict[str, Any]]] = {}
 
-    for e in entries:
-        path = Path(e.get("file_path", ""))
-        if not path.is_file():
-            path = results_dir / path.name
-        if not path.is_file():
-            continue
-        doc_id = e.get("doc_id", "")
-        if not doc_id:
-            continue
-        chunks = slice_document(path, e)
-        doc_chunks[doc_id] = chunks
+    # 切片与章节映射共用一次 slice_corpus（每个文件只解析一次）
+    for e, _, chunks, sections in slice_corpus(
+        [e for e in entries if e.get("doc_id")], workers, results_dir=results_dir, with_sections=True
+    ):
+        doc_chunks[e["doc_id"]] = chunks
         all_chunks.extend(chunks)
+        documents_map[e["doc_id"]] = document_sections(chunks, sections or []) if chunks else []
 
     n_total = len(all_chunks)
     pairs = find_duplicate_chunks(all_chunks, method="hash")
     duplicate_indices = {j for _, j in pairs}
     n_unique = n_total - len(duplicate_indices)
     duplicate_rate = (len(duplicate_indices) / n_total) if n_total else 0.0
+    semantic_rate: float | None = None
+    if semantic or embeddings is not None:
+        semantic_pairs = find_duplicate_chunks(all_chunks, method="embedding", embeddings=embeddings)
+        semantic_rate = round(len({j for _, j in semantic_pairs}) / n_total, 4) if n_total else 0.0
 
     by_doc: dict[str, dict[str, Any]] = {}
     for doc_id, chunks in doc_chunks.items():
@@ -60,8 +67,6 @@ def compute_quality_metrics(
             "max_len": max(lengths),
         }
 
-    mapping = build_section_chunk_map(entries, results_dir)
-    documents_map = mapping.get("documents", {})
     section_coverage_by_doc: dict[str, float] = {}
     total_sections_with_chunk = 0
     total_sections = 0
@@ -78,6 +83,7 @@ def compute_quality_metrics(
         "total_chunks": n_total,
         "total_unique_after_dedup": n_unique,
         "duplicate_rate": round(duplicate_rate, 4),
+        "semantic_duplicate_rate": semantic_rate,
         "section_coverage": {
             "by_doc": section_coverage_by_doc,
             "overall": round(overall_coverage, 4),
@@ -6,27 +6,37 @@ from __future__ import annotations
 
 import os
 import re
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, TypedDict
+from typing import Any, Iterable, Iterator, Literal, NotRequired, TypedDict
 
-from .doc_index import DocEntry
-from .md_loader import load_md, Section
+import numpy as np
 
-# design 3.1.2: 300-800 字符，重叠 50-100；3.3.2 可从环境变量覆盖
-def _env_int(name: str, default: int) -> int:
-    v = os.environ.get(name)
-    if v is None:
-        return default
-    try:
-        return int(v)
-    except ValueError:
-        return default
+from src.common.env import env_int
+from src.common.pool import pool_context
 
+from . import artifact_cache
+from .doc_index import DocEntry, resolve_entry_path
+from .md_loader import Section
+from .tokens import count_tokens, token_positions, tokenizer_name
 
-CHUNK_SIZE = _env_int("SPLITTER_CHUNK_SIZE", 600)
-CHUNK_OVERLAP = _env_int("SPLITTER_CHUNK_OVERLAP", 75)
-MIN_CHUNK = _env_int("SPLITTER_MIN_CHUNK", 300)
-MAX_CHUNK = _env_int("SPLITTER_MAX_CHUNK", 800)
+# design 3.1.2: 300-800 字符，重叠 50-100；3.3.2 可从环境变量覆盖
+CHUNK_SIZE = env_int("SPLITTER_CHUNK_SIZE", 600)
+CHUNK_OVERLAP = env_int("SPLITTER_CHUNK_OVERLAP", 75)
+MIN_CHUNK = env_int("SPLITTER_MIN_CHUNK", 300)
+MAX_CHUNK = env_int("SPLITTER_MAX_CHUNK", 800)
+# 切片长度单位：chars 用上面的字符数；tokens 用下面的 token 数（tokens.count_tokens，tokenizer 不可用时为估算值）
+SplitUnit = Literal["chars", "tokens"]
+SPLIT_UNIT: SplitUnit = "tokens" if os.environ.get("SPLITTER_UNIT", "chars") == "tokens" else "chars"
+CHUNK_TOKENS = env_int("SPLITTER_CHUNK_TOKENS", 256)
+CHUNK_OVERLAP_TOKENS = env_int("SPLITTER_OVERLAP_TOKENS", 32)
+MAX_CHUNK_TOKENS = env_int("SPLITTER_MAX_TOKENS", 384)
+# _split_by_size 是否使用预计算的保护区间索引（_SpanIndex）；0 走逐次扫描子串的原实现，便于基准对照
+SPAN_INDEX = os.environ.get("SPLITTER_SPAN_INDEX", "1") != "0"
+# slice_corpus 的进程数：0 表示 os.cpu_count()，1 表示在当前进程串行
+SLICE_WORKERS = env_int("SPLITTER_WORKERS", 0)
 
 
 class ChunkWithMeta(TypedDict):
@@ -39,6 +49,10 @@ class ChunkWithMeta(TypedDict):
     total_chunks: int
     content_type: str
     title: str | None
+    token_count: NotRequired[int]
+    # 切片在清洗后全文（md_loader.load_md 的 cleaned_text）中的字符区间 [start_offset, end_offset)
+    start_offset: NotRequired[int]
+    end_offset: NotRequired[int]
 
 
 def _find_safe_break(segment: str, search_from: int, end: int, text: str, start: int) -> int:
@@ -66,80 +80,309 @@ def _find_safe_break(segment: str, search_from: int, end: int, text: str, start:
     return end
 
 
-def _extend_past_formula(text: str, end: int, start: int) -> int:
-    """若 end 落在公式内，向后延到公式结束；返回新的 end。"""
+def _extend_past_formula(text: str, end: int, start: int, max_len: int | None = None) -> int:
+    """若 end 落在公式内，向后延到公式结束（延伸后长度不超过 max_len 字符，缺省 MAX_CHUNK）；返回新的 end。"""
+    max_len = MAX_CHUNK if max_len is None else max_len
     # 避免切断 $$ ... $$
     if "$$" in text[start:end]:
         after = text[end:]
         d = after.find("$$")
-        if d != -1 and (end + d + 2) - start <= MAX_CHUNK:
+        if d != -1 and (end + d + 2) - start <= max_len:
             return end + d + 2
     # 避免切断 \( ... \)
     if r"\(" in text[max(0, end - 20):end] or text[end:end + 2] == r"\)":
         close = text[end:].find(r"\)")
-        if close != -1 and (end + close + 2) - start <= MAX_CHUNK:
+        if close != -1 and (end + close + 2) - start <= max_len:
             return end + close + 2
     # 3.3.2 避免切断 \[ ... \] 块公式
     if r"\[" in text[max(0, end - 10):end] or text[end:end + 2] == r"\]":
         close = text[end:].find(r"\]")
-        if close != -1 and (end + close + 2) - start <= MAX_CHUNK:
+        if close != -1 and (end + close + 2) - start <= max_len:
             return end + close + 2
     # 3.3.2 避免切断单 $ ... $ 行内公式（不含 $$）
     slice_before = text[start:end]
     if slice_before.count("$") % 2 == 1 and "$$" not in slice_before[-10:]:
         after = text[end:]
         d = after.find("$")
-        if d != -1 and (end + d + 1) - start <= MAX_CHUNK:
+        if d != -1 and (end + d + 1) - start <= max_len:
             return end + d + 1
     return end
 
 
-def _split_by_size(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+class _SpanIndex:
+    """
+    保护区间索引：一次向量化扫描记录公式定界符（$、$$、\\(、\\)、\\[、\\]）位置的有序数组，
+    _extend_past_formula 中对 text[start:end] 的计数与对 text[end:] 的查找（每块复制一次剩余全文）改为 bisect，
+    _find_safe_break 改为带边界的 rfind（不再切出 segment）。判定规则与原实现逐条对应，切分结果完全一致。
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.n = len(text)
+        # UTF-32 码点数组：下标即字符下标（中文等非 ASCII 字符同样适用）
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        is_dollar = codes == ord("$")
+        backslash = codes[:-1] == ord("\\")
+        self.dollar = np.flatnonzero(is_dollar).tolist()
+        # "$$" 出现位置（允许重叠，与 str.find 逐位匹配一致）
+        self.double_dollar = np.flatnonzero(is_dollar[:-1] & is_dollar[1:]).tolist()
+        self.open_paren = np.flatnonzero(backslash & (codes[1:] == ord("("))).tolist()
+        self.close_paren = np.flatnonzero(backslash & (codes[1:] == ord(")"))).tolist()
+        self.open_bracket = np.flatnonzero(backslash & (codes[1:] == ord("["))).tolist()
+        self.close_bracket = np.flatnonzero(backslash & (codes[1:] == ord("]"))).tolist()
+
+    @staticmethod
+    def last_in(arr: list[int], lo: int, hi: int) -> int:
+        """arr 中落在 [lo, hi] 的最大值，无则 -1。"""
+        i = bisect_left(arr, hi + 1) - 1
+        return arr[i] if i >= 0 and arr[i] >= lo else -1
+
+    @staticmethod
+    def first_from(arr: list[int], pos: int) -> int:
+        """arr 中 >= pos 的最小值，无则 -1。"""
+        i = bisect_left(arr, pos)
+        return arr[i] if i < len(arr) else -1
+
+    @staticmethod
+    def contains(arr: list[int], pos: int) -> bool:
+        i = bisect_left(arr, pos)
+        return i < len(arr) and arr[i] == pos
+
+    def find_safe_break(self, search_from: int, end: int, start: int) -> int:
+        """同 _find_safe_break(text[search_from:end + 100], search_from, end, text, start)。"""
+        text = self.text
+        seg_end = min(end + 100, self.n)
+        p = text.rfind("\n\n", search_from, seg_end)
+        if p != -1:
+            return p + 2
+        q = text.rfind("\n", search_from, seg_end)
+        if q != -1:
+            end = q + 1
+            line_start = text.rfind("\n", start, end)
+            line_start = line_start + 1 if line_start >= start else start
+            line = text[line_start:end].lstrip()
+            if line.startswith("- ") or line.startswith("|"):
+                end = line_start
+            return end
+        for sep in (". ", "。 ", " "):
+            idx = text.rfind(sep, search_from, seg_end)
+            if idx != -1:
+                return idx + len(sep)
+        return end
+
+    def extend_past_formula(self, end: int, start: int, max_len: int | None = None) -> int:
+        """同 _extend_past_formula(text, end, start, max_len)。"""
+        max_len = MAX_CHUNK if max_len is None else max_len
+        if self.last_in(self.double_dollar, start, end - 2) != -1:
+            d = self.first_from(self.double_dollar, end)
+            if d != -1 and d + 2 - start <= max_len:
+                return d + 2
+        if self.last_in(self.open_paren, max(0, end - 20), end - 2) != -1 or self.contains(self.close_paren, end):
+            close = self.first_from(self.close_paren, end)
+            if close != -1 and close + 2 - start <= max_len:
+                return close + 2
+        if self.last_in(self.open_bracket, max(0, end - 10), end - 2) != -1 or self.contains(self.close_bracket, end):
+            close = self.first_from(self.close_bracket, end)
+            if close != -1 and close + 2 - start <= max_len:
+                return close + 2
+        n_dollar = bisect_left(self.dollar, end) - bisect_left(self.dollar, start)
+        if n_dollar % 2 == 1 and self.last_in(self.double_dollar, max(start, end - 10), end - 2) == -1:
+            d = self.first_from(self.dollar, end)
+            if d != -1 and d + 1 - start <= max_len:
+                return d + 1
+        return end
+
+
+def _advance(pos: Any, start: int, n_tokens: float) -> int:
+    """token 模式：从 start 起不超过 n_tokens 个 token 的最远字符位置（至少前进 1 个字符）。"""
+    i = int(np.searchsorted(pos, pos[start] + n_tokens, side="right")) - 1
+    return max(i, start + 1)
+
+
+def _retreat(pos: Any, end: int, n_tokens: float) -> int:
+    """token 模式：到 end 为止不超过 n_tokens 个 token 的最早字符位置。"""
+    return int(np.searchsorted(pos, pos[end] - n_tokens, side="left"))
+
+
+def _split_by_size(
+    text: str,
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    *,
+    unit: SplitUnit | None = None,
+    use_span_index: bool | None = None,
+) -> list[str]:
+    """切分 text，返回各块文本；参数与规则见 _split_spans。"""
+    spans = _split_spans(text, chunk_size, overlap, unit=unit, use_span_index=use_span_index)
+    return [text[a:b] for a, b in spans]
+
+
+def _split_spans(
+    text: str,
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    *,
+    unit: SplitUnit | None = None,
+    use_span_index: bool | None = None,
+) -> list[tuple[int, int]]:
     """
-    在不超过 chunk_size 的前提下按句子/段落边界切分，保留 overlap 字符重叠。
+    返回各块在 text 中的区间 [a, b)（已去掉首尾空白）。
+    在不超过 chunk_size 的前提下按句子/段落边界切分，保留 overlap 重叠。
     避免在 $$...$$、\\(...\\)、\\[...\\]、$...$ 中间切断；避免在列表项、表格行中间切（3.3.2）。
+    unit：None 取 SPLITTER_UNIT；chars 时 chunk_size / overlap 为字符数（缺省 CHUNK_SIZE / CHUNK_OVERLAP），
+    tokens 时为 token 数（缺省 CHUNK_TOKENS / CHUNK_OVERLAP_TOKENS），公式延伸上限为 MAX_CHUNK_TOKENS；
+    断点搜索窗口（向前 150、向后 100 字符）两种单位相同。
+    use_span_index：None 取 SPLITTER_SPAN_INDEX；True 用 _SpanIndex 做 bisect 查找（公式密集文本上避免反复扫描子串），
+    False 走原实现；两者结果一致。
     """
-    if not text or len(text) <= chunk_size:
-        return [text] if text and text.strip() else []
+    unit = unit or SPLIT_UNIT
+    if chunk_size is None:
+        chunk_size = CHUNK_TOKENS if unit == "tokens" else CHUNK_SIZE
+    if overlap is None:
+        overlap = CHUNK_OVERLAP_TOKENS if unit == "tokens" else CHUNK_OVERLAP
+    if not text:
+        return []
+    pos = token_positions(text) if unit == "tokens" else None
+    if (len(text) if pos is None else pos[-1]) <= chunk_size:
+        return [(0, len(text))] if text.strip() else []
 
-    chunks: list[str] = []
+    index = _SpanIndex(text) if (SPAN_INDEX if use_span_index is None else use_span_index) else None
+    spans: list[tuple[int, int]] = []
     start = 0
     text_len = len(text)
 
     while start < text_len:
-        end = min(start + chunk_size, text_len)
+        if pos is None:
+            end = min(start + chunk_size, text_len)
+            max_len = None
+        else:
+            end = _advance(pos, start, chunk_size)
+            max_len = _advance(pos, start, MAX_CHUNK_TOKENS) - start
         if end < text_len:
             search_from = max(start, end - 150)
-            segment = text[search_from : end + 100]
-            end = _find_safe_break(segment, search_from, end, text, start)
-            end = _extend_past_formula(text, end, start)
-        chunk_text = text[start:end].strip()
+            if index is not None:
+                end = index.find_safe_break(search_from, end, start)
+                end = index.extend_past_formula(end, start, max_len)
+            else:
+                segment = text[search_from : end + 100]
+                end = _find_safe_break(segment, search_from, end, text, start)
+                end = _extend_past_formula(text, end, start, max_len)
+        raw = text[start:end]
+        chunk_text = raw.lstrip()
         if chunk_text:
-            chunks.append(chunk_text)
-        next_start = end - overlap
+            a = start + len(raw) - len(chunk_text)
+            spans.append((a, a + len(chunk_text.rstrip())))
+        next_start = end - overlap if pos is None else _retreat(pos, end, overlap)
         if next_start <= start:
             next_start = end
         start = next_start
         if start >= text_len:
             break
-    return chunks
+    return spans
+
+
+def split_config(unit: SplitUnit | None = None) -> dict[str, int | str]:
+    """影响切片结果的配置（缺省参数下）；用作解析产物缓存键与入库清单校验。"""
+    unit = unit or SPLIT_UNIT
+    if unit == "tokens":
+        return {
+            "unit": unit,
+            "tokenizer": tokenizer_name(),
+            "chunk_size": CHUNK_TOKENS,
+            "chunk_overlap": CHUNK_OVERLAP_TOKENS,
+            "max_chunk": MAX_CHUNK_TOKENS,
+        }
+    return {"unit": unit, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "max_chunk": MAX_CHUNK}
+
+
+def _split_pieces(
+    cleaned: str,
+    sections: list[Section],
+    chunk_size: int,
+    overlap: int,
+    max_section: int,
+    unit: SplitUnit,
+) -> list[tuple[str, str, int, int, int]]:
+    """
+    切片 (section_title, content, token_count, start_offset, end_offset)，偏移相对 cleaned；
+    与文档元数据无关（可按文件内容缓存）。
+    """
+    if not cleaned.strip():
+        return []
+    # 若无章节，整篇按长度切
+    if not sections:
+        spans = [("", a, b) for a, b in _split_spans(cleaned, chunk_size, overlap, unit=unit)]
+    else:
+        spans = []
+        for sec in sections:
+            raw = cleaned[sec["start_offset"]:sec["end_offset"]]
+            sec_text = raw.strip()
+            if not sec_text:
+                continue
+            base = sec["start_offset"] + len(raw) - len(raw.lstrip())
+            section_title = sec.get("title", "")
+            size = count_tokens(sec_text) if unit == "tokens" else len(sec_text)
+            if size <= max_section:
+                spans.append((section_title, base, base + len(sec_text)))
+            else:
+                for a, b in _split_spans(sec_text, chunk_size, overlap, unit=unit):
+                    spans.append((section_title, base + a, base + b))
+    return [(t, cleaned[a:b], count_tokens(cleaned[a:b]), a, b) for t, a, b in spans]
+
+
+def _resolve_sizes(
+    unit: SplitUnit | None,
+    chunk_size: int | None,
+    overlap: int | None,
+    max_section: int | None,
+) -> tuple[SplitUnit, int, int, int]:
+    unit = unit or SPLIT_UNIT
+    defaults = split_config(unit)
+    return (
+        unit,
+        defaults["chunk_size"] if chunk_size is None else chunk_size,  # type: ignore[return-value]
+        defaults["chunk_overlap"] if overlap is None else overlap,
+        defaults["max_chunk"] if max_section is None else max_section,
+    )
+
+
+def _config_key(unit: SplitUnit, chunk_size: int, overlap: int, max_section: int) -> str:
+    # 公式延伸上限（MAX_CHUNK / MAX_CHUNK_TOKENS）与计数方式也影响切片结果
+    cfg = split_config(unit)
+    return f"{unit}:{chunk_size}:{overlap}:{max_section}:{cfg['max_chunk']}:{cfg.get('tokenizer', '')}"
+
+
+def _cached_pieces(
+    path: Path,
+    unit: SplitUnit | None = None,
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    max_section: int | None = None,
+) -> list[tuple[str, str, int, int, int]]:
+    unit, chunk_size, overlap, max_section = _resolve_sizes(unit, chunk_size, overlap, max_section)
+    return artifact_cache.get_pieces(
+        path,
+        _config_key(unit, chunk_size, overlap, max_section),
+        lambda cleaned, sections: _split_pieces(cleaned, sections, chunk_size, overlap, max_section, unit),
+    )
 
 
 def slice_document(
     path: Path,
     entry: DocEntry,
     *,
-    chunk_size: int = CHUNK_SIZE,
-    overlap: int = CHUNK_OVERLAP,
-    max_section_chars: int = MAX_CHUNK,
+    chunk_size: int | None = None,
+    overlap: int | None = None,
+    max_section_chars: int | None = None,
+    unit: SplitUnit | None = None,
 ) -> list[ChunkWithMeta]:
     """
     对单个 .md 文档切片：优先按章节（##/###）边界，若单节过长则按长度+重叠二次切分。
-    返回带元数据的切片列表。
+    返回带元数据的切片列表（含 token_count 与清洗后全文中的 start_offset / end_offset）。解析与切片结果经 artifact_cache 按文件内容与切片配置复用。
+    unit：None 取 SPLITTER_UNIT；tokens 时 chunk_size / overlap / max_section_chars 均按 token 计，
+    缺省值见 split_config。
     """
-    cleaned, sections = load_md(path)
-    if not cleaned.strip():
-        return []
+    pieces = _cached_pieces(path, unit, chunk_size, overlap, max_section_chars)
 
     title = entry.get("title") or entry.get("doc_id", "")
     doc_type = entry["doc_type"]
@@ -147,59 +390,24 @@ def slice_document(
     file_name = entry.get("file_name") or path.name
     content_type = doc_type  # lecture | homework | solution
 
-    chunks_out: list[ChunkWithMeta] = []
-    # 若无章节，整篇按长度切
-    if not sections:
-        sub_chunks = _split_by_size(cleaned, chunk_size=chunk_size, overlap=overlap)
-        for idx, c in enumerate(sub_chunks):
-            chunks_out.append({
-                "content": c,
-                "source_file": file_name,
-                "doc_type": doc_type,
-                "doc_id": doc_id,
-                "section_title": "",
-                "chunk_index": idx,
-                "total_chunks": 0,  # 稍后统一填
-                "content_type": content_type,
-                "title": title,
-            })
-    else:
-        for sec in sections:
-            sec_text = cleaned[sec["start_offset"]:sec["end_offset"]].strip()
-            if not sec_text:
-                continue
-            section_title = sec.get("title", "")
-            if len(sec_text) <= max_section_chars:
-                chunks_out.append({
-                    "content": sec_text,
-                    "source_file": file_name,
-                    "doc_type": doc_type,
-                    "doc_id": doc_id,
-                    "section_title": section_title,
-                    "chunk_index": len(chunks_out),
-                    "total_chunks": 0,
-                    "content_type": content_type,
-                    "title": title,
-                })
-            else:
-                sub_chunks = _split_by_size(sec_text, chunk_size=chunk_size, overlap=overlap)
-                for idx, c in enumerate(sub_chunks):
-                    chunks_out.append({
-                        "content": c,
-                        "source_file": file_name,
-                        "doc_type": doc_type,
-                        "doc_id": doc_id,
-                        "section_title": section_title,
-                        "chunk_index": len(chunks_out),
-                        "total_chunks": 0,
-                        "content_type": content_type,
-                        "title": title,
-                    })
-
-    total = len(chunks_out)
-    for c in chunks_out:
-        c["total_chunks"] = total
-    return chunks_out
+    total = len(pieces)
+    return [
+        {
+            "content": content,
+            "source_file": file_name,
+            "doc_type": doc_type,
+            "doc_id": doc_id,
+            "section_title": section_title,
+            "chunk_index": idx,
+            "total_chunks": total,
+            "content_type": content_type,
+            "title": title,
+            "token_count": token_count,
+            "start_offset": start_offset,
+            "end_offset": end_offset,
+        }
+        for idx, (section_title, content, token_count, start_offset, end_offset) in enumerate(pieces)
+    ]
 
 
 def chunk_metadata_for_chroma(chunk: ChunkWithMeta) -> dict[str, str | int]:
@@ -214,7 +422,78 @@ def chunk_metadata_for_chroma(chunk: ChunkWithMeta) -> dict[str, str | int]:
         "chunk_index": chunk["chunk_index"],
         "total_chunks": chunk["total_chunks"],
         "content_type": chunk["content_type"],
+        "token_count": chunk.get("token_count", count_tokens(chunk["content"])),
     }
     if chunk.get("title"):
         meta["title"] = chunk["title"]
+    if "start_offset" in chunk:
+        meta["start_offset"] = chunk["start_offset"]
+        meta["end_offset"] = chunk["end_offset"]
     return meta
+
+
+def _slice_task(path: str) -> tuple[Any, Any] | None:
+    """进程池任务（模块级函数，可被 pickle）：解析并按默认配置切片，回传产物供父进程 artifact_cache.adopt。"""
+    _cached_pieces(Path(path))
+    return artifact_cache.snapshot(Path(path))
+
+
+def _sliced(entry: DocEntry, path: Path, with_sections: bool) -> tuple[list[ChunkWithMeta], list[Section] | None]:
+    chunks = slice_document(path, entry)
+    sections = artifact_cache.load_document(path)[1] if with_sections else None
+    return chunks, sections
+
+
+def slice_corpus(
+    entries: Iterable[DocEntry],
+    workers: int | None = None,
+    *,
+    results_dir: Path | None = None,
+    with_sections: bool = False,
+) -> Iterator[tuple[DocEntry, Path, list[ChunkWithMeta], list[Section] | None]]:
+    """
+    对多篇文档并行切片，按 entries 顺序逐篇产出 (entry, path, chunks, sections)；找不到文件的条目跳过。
+    - workers：进程数，None 取 SPLITTER_WORKERS（0 = CPU 核数）；<=1 或只有一篇时在当前进程串行
+    - results_dir：file_path 不存在时按 file_name 在该目录下查找（见 doc_index.resolve_entry_path）
+    - with_sections：同时返回 load_md 的章节列表（否则为 None）
+    任务按窗口（2 × workers）提交，结果按序消费，内存中同时只保留窗口内的切片。
+    worker 的解析产物回传并存入本进程 artifact_cache，同一进程内再次切片 / 取章节不再解析。
+    """
+    items = []
+    for e in entries:
+        path = resolve_entry_path(e, results_dir)
+        if path is not None:
+            items.append((e, path))
+    # 本进程已缓存的文件直接产出，不进进程池
+    key = _config_key(*_resolve_sizes(None, None, None, None))
+    pending = sum(1 for _, path in items if not artifact_cache.has_pieces(path, key))
+    n_workers = SLICE_WORKERS if workers is None else workers
+    if n_workers <= 0:
+        n_workers = os.cpu_count() or 1
+    n_workers = min(n_workers, pending)
+    if n_workers <= 1:
+        for e, path in items:
+            yield (e, path, *_sliced(e, path, with_sections))
+        return
+
+    def submit(pool: ProcessPoolExecutor, path: Path) -> Future:
+        if artifact_cache.has_pieces(path, key):
+            done: Future = Future()
+            done.set_result(None)
+            return done
+        return pool.submit(_slice_task, str(path))
+
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=pool_context()) as pool:
+        window: deque[tuple[DocEntry, Path, Future]] = deque()
+        it = iter(items)
+        for e, path in it:
+            window.append((e, path, submit(pool, path)))
+            if len(window) >= 2 * n_workers:
+                break
+        while window:
+            e, path, fut = window.popleft()
+            nxt = next(it, None)
+            if nxt is not None:
+                window.append((nxt[0], nxt[1], submit(pool, nxt[1])))
+            artifact_cache.adopt(path, fut.result())
+            yield (e, path, *_sliced(e, path, with_sections))
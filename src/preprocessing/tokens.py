@@ -0,0 +1,89 @@
+"""
+Token 计数：为检索结果打包与切片提供与 LLM token 对应的长度度量。
+中英混排 + LaTeX 下字符数与 token 数差异很大：中文约 1 字 1 token，英文/符号约 4 字符 1 token。
+count_tokens 优先用本地 tiktoken 编码（TOKENIZER_ENCODING，默认 cl100k_base，进程内只加载一次）；
+tiktoken 未安装、编码文件不可得（离线且无 TIKTOKEN_CACHE_DIR）或 TOKENIZER_ENCODING=estimate 时回退到 estimate_tokens。
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+from typing import Any
+
+import numpy as np
+
+_CJK_RE = re.compile(r"[　-〿一-鿿＀-￯]")
+
+ENCODING_NAME = os.environ.get("TOKENIZER_ENCODING", "cl100k_base")
+ESTIMATOR_NAME = "estimate"
+
+_logger = logging.getLogger(__name__)
+_lock = threading.Lock()
+_encoding: Any = None
+_loaded = False
+
+
+def estimate_tokens(text: str) -> int:
+    """快速近似：CJK 字符（含全角标点）各计 1，其余字符每 4 个计 1（向上取整）。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def _get_encoding() -> Any:
+    """tiktoken 编码对象；不可用时返回 None（只尝试一次）。"""
+    global _encoding, _loaded
+    if _loaded:
+        return _encoding
+    with _lock:
+        if not _loaded:
+            if ENCODING_NAME != ESTIMATOR_NAME:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding(ENCODING_NAME)
+                except ImportError:
+                    _logger.info("tiktoken not installed; using estimate_tokens")
+                except Exception as e:  # 编码文件下载失败等
+                    _logger.warning("tokenizer %s unavailable, using estimate_tokens: %s", ENCODING_NAME, e)
+            _loaded = True
+    return _encoding
+
+
+def tokenizer_name() -> str:
+    """实际使用的计数方式：编码名或 "estimate"；写入切片配置，变化时缓存/入库清单失效。"""
+    return ENCODING_NAME if _get_encoding() is not None else ESTIMATOR_NAME
+
+
+def count_tokens(text: str) -> int:
+    """text 的 token 数（tokenizer 可用时精确，否则为 estimate_tokens）。"""
+    if not text:
+        return 0
+    enc = _get_encoding()
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def token_positions(text: str) -> np.ndarray:
+    """
+    长度 len(text) + 1 的非降数组，pos[i] 为 text[:i] 的 token 数，text[a:b] 约含 pos[b] - pos[a] 个 token。
+    tokenizer 可用时按各 token 的起始字符偏移计；否则按 estimate_tokens 的权重（CJK 1，其余 1/4）累加。
+    """
+    n = len(text)
+    enc = _get_encoding()
+    if enc is None:
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        cjk = (
+            ((codes >= 0x3000) & (codes <= 0x303F))
+            | ((codes >= 0x4E00) & (codes <= 0x9FFF))
+            | ((codes >= 0xFF00) & (codes <= 0xFFEF))
+        )
+        pos = np.zeros(n + 1, dtype=np.float64)
+        np.cumsum(np.where(cjk, 1.0, 0.25), out=pos[1:])
+        return pos
+    _, offsets = enc.decode_with_offsets(enc.encode(text, disallowed_special=()))
+    return np.searchsorted(np.asarray(offsets, dtype=np.int64), np.arange(n + 1), side="left").astype(np.float64)
@@ -29,7 +29,7 @@ def test_get_skill():
     reg = get_skill_registry(PROJECT_ROOT)
     skill = get_skill("qa", PROJECT_ROOT)
     if skill:
-        assert skill.get("allowed_tools") == ["rag_retrieve"]
+        assert skill.get("allowed_tools") == ["rag_retrieve", "rag_retrieve_batch"]
 
 
 def test_get_skill_nonexistent_returns_none():
@@ -1,6 +1,6 @@
 """
 知识图谱工具单元测试：validate_path、graph_validate_path、query_next_topic 等。
-通过 mock Neo4j _run_cypher 避免依赖真实数据库。
+通过 mock Neo4j _run_cypher 避免依赖真实数据库（关闭内存图快照，走 Neo4j 查询路径）。
 """
 from __future__ import annotations
 
@@ -16,6 +16,12 @@ sys.path.insert(0, str(ROOT))
 from src.agent.tools import graph as graph_module
 
 
+@pytest.fixture(autouse=True)
+def no_snapshot():
+    with patch.object(graph_module, "_snapshot", return_value=None):
+        yield
+
+
 def test_validate_path_already_learned():
     """推荐目标已在已学列表中时返回 (True, ...)。"""
     with patch.object(graph_module, "_run_cypher", return_value=[]):
@@ -21,6 +21,19 @@ from src.agent.tools.rag import (
 )
 
 
+def _fake_embed(texts):
+    """确定性假嵌入：不加载 ONNX 模型。"""
+    return [[float(len(t)), float(sum(map(ord, t)) % 97), 1.0] for t in texts]
+
+
+@pytest.fixture(autouse=True)
+def _embedding_cache_tmp(tmp_path, monkeypatch):
+    """query 嵌入走临时目录下的嵌入缓存与假嵌入函数。"""
+    from src.preprocessing import embedding_cache
+    monkeypatch.setattr(embedding_cache, "CACHE_PATH", str(tmp_path / "emb.sqlite3"))
+    monkeypatch.setattr(embedding_cache, "default_embedding_function", lambda: _fake_embed)
+
+
 def test_expand_query_for_retrieve():
     """_expand_query_for_retrieve 纯逻辑：含中文关键词时追加英文。"""
     assert "convolution" in _expand_query_for_retrieve("卷积")
@@ -58,8 +71,11 @@ def test_retrieve_documents_mock_chroma():
     }
     client.get_or_create_collection.return_value = col
     mock_chroma.PersistentClient.return_value = client
+    from src.preprocessing import chroma_client
+    chroma_client.invalidate("/tmp/test")
     with patch.dict(_sys.modules, {"chromadb": mock_chroma}):
         docs = retrieve_documents("test query", top_k=2, persist_dir="/tmp/test")
+    chroma_client.invalidate("/tmp/test")
     assert len(docs) == 2
     assert docs[0].page_content == "content one"
     assert docs[0].metadata.get("doc_id") == "lec01"
@@ -84,3 +100,297 @@ def test_rag_retrieve_empty_result():
     with patch("src.agent.tools.rag.retrieve_documents", return_value=[]):
         out = rag_retrieve.invoke({"query": "nonexistent"})
     assert "未在课程材料" in out or "相关片段" in out
+
+
+def test_retrieval_cache_lru_ttl_and_counters():
+    """RetrievalCache：命中/未命中/淘汰计数，TTL 过期，返回副本。"""
+    from langchain_core.documents import Document
+    from src.agent.tools.retrieval_cache import RetrievalCache
+    cache = RetrievalCache(maxsize=2, ttl=60)
+    cache.put("a", [Document(page_content="x", metadata={"doc_id": "lec01"})])
+    cache.put("b", [])
+    got = cache.get("a")
+    assert got[0].page_content == "x"
+    got[0].metadata["doc_id"] = "changed"
+    assert cache.get("a")[0].metadata["doc_id"] == "lec01"
+    cache.put("c", [])  # 淘汰最久未用的 b
+    assert cache.get("b") is None
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+    expired = RetrievalCache(maxsize=2, ttl=-1)
+    expired.put("a", [])
+    assert expired.get("a") is None
+    assert expired.stats()["expirations"] == 1
+
+
+def test_retrieve_documents_cache_hit_skips_query_until_generation_bump(tmp_path):
+    """重复查询命中缓存不再调用 collection.query；入库代数变化后重新查询。"""
+    from src.agent.tools import rag as rag_module
+    from src.agent.tools.retrieval_cache import RetrievalCache
+    from src.preprocessing import chroma_client
+    col = MagicMock()
+    col.query.return_value = {"documents": [["c"]], "metadatas": [[{"doc_id": "lec04"}]], "distances": [[0.1]]}
+    persist_dir = str(tmp_path)
+    with patch.object(rag_module, "get_collection", return_value=col), \
+         patch.object(rag_module, "get_retrieval_cache", return_value=RetrievalCache(maxsize=8, ttl=60)):
+        first = retrieve_documents("什么是卷积？", top_k=3, persist_dir=persist_dir)
+        second = retrieve_documents("什么是卷积？", top_k=3, persist_dir=persist_dir)
+        assert col.query.call_count == 1
+        assert [d.page_content for d in first] == [d.page_content for d in second]
+        retrieve_documents("什么是卷积？", top_k=3, filters={"doc_id": "lec04"}, persist_dir=persist_dir)
+        assert col.query.call_count == 2
+        chroma_client.bump_generation(persist_dir)
+        retrieve_documents("什么是卷积？", top_k=3, persist_dir=persist_dir)
+        assert col.query.call_count == 3
+
+
+def test_retrieve_documents_batch_single_query_call():
+    """retrieve_documents_batch：多条 query 只调用一次 collection.query，按输入顺序返回，重复 query 只查一次。"""
+    from src.agent.tools import rag as rag_module
+    from src.agent.tools.retrieval_cache import RetrievalCache
+    col = MagicMock()
+    col.query.return_value = {
+        "documents": [["conv"], ["fourier"]],
+        "metadatas": [[{"doc_id": "lec04"}], [{"doc_id": "lec05"}]],
+        "distances": [[0.1], [0.2]],
+    }
+    with patch.object(rag_module, "get_collection", return_value=col), \
+         patch.object(rag_module, "get_retrieval_cache", return_value=RetrievalCache(maxsize=0)):
+        out = rag_module.retrieve_documents_batch(["卷积", "傅里叶", "卷积"], top_k=1, persist_dir="/tmp/batch")
+    assert col.query.call_count == 1
+    assert len(col.query.call_args[1]["query_embeddings"]) == 2
+    assert [d[0].page_content for d in out] == ["conv", "fourier", "conv"]
+    assert out[0][0] is not out[2][0]
+
+
+def test_rag_retrieve_batch_tool_groups_by_query():
+    """rag_retrieve_batch 工具按 query 分组返回字符串。"""
+    from langchain_core.documents import Document
+    from src.agent.tools.rag import rag_retrieve_batch
+    with patch("src.agent.tools.rag.retrieve_documents_batch") as m:
+        m.return_value = [
+            [Document(page_content="convolution", metadata={"doc_id": "lec04"})],
+            [],
+        ]
+        out = rag_retrieve_batch.invoke({"queries": ["卷积", "拉普拉斯"]})
+    assert "【检索：卷积】" in out and "第4讲" in out
+    assert "【检索：拉普拉斯】" in out and "未在课程材料" in out
+
+
+def test_retrieve_documents_hybrid_fuses_bm25(tmp_path):
+    """mode=hybrid：向量候选与 BM25 候选按 RRF 融合；仅 BM25 命中的切片也能返回。"""
+    pytest.importorskip("numpy")
+    from src.agent.tools import rag as rag_module
+    from src.preprocessing.bm25_index import BM25Index
+    BM25Index.build(
+        ["v1", "k1"],
+        ["unrelated text", "Fourier transform definition"],
+        [{"doc_id": "lec01"}, {"doc_id": "lec05"}],
+    ).save(tmp_path / "bm25_index")
+    col = MagicMock()
+    col.query.return_value = {
+        "ids": [["v1"]],
+        "documents": [["unrelated text"]],
+        "metadatas": [[{"doc_id": "lec01"}]],
+        "distances": [[0.5]],
+    }
+    with patch.object(rag_module, "get_collection", return_value=col):
+        docs = retrieve_documents("傅里叶", top_k=2, persist_dir=str(tmp_path), mode="hybrid", use_cache=False)
+        vector_only = retrieve_documents("傅里叶", top_k=2, persist_dir=str(tmp_path), use_cache=False)
+        # BM25 索引无 chunk_index 列：不融合 BM25 命中，只返回（已按 where 过滤的）向量结果
+        filtered = retrieve_documents(
+            "傅里叶", top_k=2, persist_dir=str(tmp_path), mode="hybrid", use_cache=False,
+            filters={"chunk_index": {"$gte": 0}},
+        )
+    assert {d.metadata["doc_id"] for d in docs} == {"lec01", "lec05"}
+    assert all("_rrf_score" in d.metadata for d in docs)
+    assert [d.metadata["doc_id"] for d in vector_only] == ["lec01"]
+    assert [d.metadata["doc_id"] for d in filtered] == ["lec01"]
+    assert "_rrf_score" not in filtered[0].metadata
+
+
+def test_merge_adjacent_chunks_removes_overlap_and_keeps_rank_order():
+    """同 doc_id + section 且 chunk_index 连续的切片合并为一段并去掉重叠；不连续或不同章节保持独立。"""
+    from langchain_core.documents import Document
+    from src.agent.tools.passages import merge_adjacent_chunks
+
+    def d(idx, text, section="Convolution", doc_id="lec02", dist=0.5):
+        return Document(page_content=text, metadata={"doc_id": doc_id, "section_title": section, "chunk_index": idx, "_distance": dist})
+
+    docs = [
+        d(5, "overlap-tail-text and the rest of chunk five", dist=0.2),
+        d(9, "isolated chunk nine"),
+        d(4, "chunk four body ends with overlap-tail-text", dist=0.3),
+        d(4, "other section", section="Sampling", doc_id="lec03", dist=0.1),
+    ]
+    merged = merge_adjacent_chunks(docs)
+    assert len(merged) == 3
+    assert merged[0].page_content == "chunk four body ends with overlap-tail-text and the rest of chunk five"
+    assert merged[0].metadata["chunk_indices"] == [4, 5]
+    assert merged[0].metadata["_distance"] == 0.2
+    assert merged[1].page_content == "isolated chunk nine"
+    assert merged[2].metadata["doc_id"] == "lec03"
+
+
+def test_pack_to_budget_truncates_last_passage():
+    """按 token 预算装入段落：超出部分截断并标记 truncated，之后的段落丢弃。"""
+    from langchain_core.documents import Document
+    from src.agent.tools.passages import pack_to_budget
+    from src.preprocessing.tokens import count_tokens, estimate_tokens
+
+    docs = [Document(page_content="卷" * 60, metadata={}), Document(page_content="积" * 200, metadata={}), Document(page_content="x", metadata={})]
+    packed = pack_to_budget(docs, 120)
+    assert len(packed) == 2
+    assert packed[1].metadata["truncated"] is True
+    assert sum(count_tokens(p.page_content) for p in packed) <= 120
+    assert pack_to_budget(docs, 0) == docs
+    assert estimate_tokens("abcd卷积") == 3
+
+
+def test_truncate_to_tokens_cuts_on_token_positions():
+    """截断只算一次 token_positions，不对前缀逐个调用 count_tokens；结果不超过预算且为最长前缀。"""
+    from src.agent.tools import passages
+    from src.preprocessing.tokens import count_tokens
+
+    text = "The convolution 卷积 of x[n] and h[n] is y[n] = \\sum_k x[k] h[n-k]. " * 5
+    with patch.object(passages, "count_tokens", side_effect=AssertionError("no per-prefix counting")):
+        cut = passages._truncate_to_tokens(text, 20)
+    assert text.startswith(cut) and 0 < count_tokens(cut) <= 20
+    assert count_tokens(text[:len(cut) + 8]) > 20 or len(cut) + 8 > len(text)
+    assert passages._truncate_to_tokens("短", 0) == ""
+
+
+def test_retrieve_documents_mmap_backend_skips_chroma(tmp_path):
+    """backend="mmap"：从导出的内存映射索引检索，不调用 Chroma 集合。"""
+    np = pytest.importorskip("numpy")
+    from src.preprocessing import mmap_index
+
+    emb = np.eye(3, dtype=np.float32)
+    metas = [{"doc_id": f"lec0{i + 1}", "chunk_index": 0} for i in range(3)]
+    mmap_index.write_index(mmap_index.index_dir_for(str(tmp_path)), ["a", "b", "c"], emb, ["A", "B", "C"], metas)
+    with patch.object(mmap_index, "embed_queries", return_value=np.array([[0.2, 1.0, 0.0]], dtype=np.float32)), \
+         patch("src.agent.tools.rag.get_collection") as get_collection:
+        docs = retrieve_documents("x", top_k=2, persist_dir=str(tmp_path), use_cache=False, backend="mmap")
+    get_collection.assert_not_called()
+    assert [d.page_content for d in docs] == ["B", "A"]
+    assert docs[0].metadata["_distance"] == pytest.approx(0.04)
+
+
+def test_retrieve_documents_mmap_backend_falls_back_to_chroma_for_unsupported_where(tmp_path):
+    """mmap 索引无法执行的 where（未知字段）交给 Chroma，而不是忽略该条件。"""
+    np = pytest.importorskip("numpy")
+    from src.preprocessing import mmap_index
+
+    metas = [{"doc_id": "lec01", "chunk_index": 0}]
+    mmap_index.write_index(mmap_index.index_dir_for(str(tmp_path)), ["a"], np.eye(1, dtype=np.float32), ["A"], metas)
+    collection = MagicMock()
+    collection.query.return_value = {"ids": [["z"]], "documents": [["Z"]], "metadatas": [[{"author": "x"}]], "distances": [[0.1]]}
+    with patch.object(mmap_index, "embed_queries") as embed_queries, \
+         patch("src.agent.tools.rag.get_collection", return_value=collection), \
+         patch("src.agent.tools.rag.embedding_cache.ENABLED", False):
+        docs = retrieve_documents(
+            "x", top_k=1, persist_dir=str(tmp_path), use_cache=False, backend="mmap", filters={"author": "x"}
+        )
+    embed_queries.assert_not_called()
+    assert collection.query.call_args.kwargs["where"] == {"author": {"$eq": "x"}}
+    assert [d.page_content for d in docs] == ["Z"]
+
+
+def test_embedding_cache_reuses_vectors_for_normalized_text(tmp_path):
+    """嵌入缓存：空白归一化后相同的文本只嵌入一次，跨实例（持久化）命中。"""
+    from src.preprocessing.embedding_cache import EmbeddingCache
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return _fake_embed(texts)
+
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path)
+    first = cache.embed(["卷积  定义", "Fourier", "卷积 定义"], embed)
+    assert calls == [["卷积  定义", "Fourier"]]
+    assert (first[0] == first[2]).all()
+    cache.close()
+    again = EmbeddingCache(path).embed(["Fourier", "new text"], embed)
+    assert calls[-1] == ["new text"]
+    assert (again[0] == first[1]).all()
+    assert EmbeddingCache(path).embed(["Fourier"], embed, model_id="other").shape == (1, 3)
+    assert calls[-1] == ["Fourier"]
+
+
+def test_embedding_cache_query_vectors_stay_in_process(tmp_path):
+    """write_back=False（检索 query）：读已有向量，新向量只进进程内 LRU，不写 SQLite。"""
+    from src.preprocessing.embedding_cache import EmbeddingCache
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return _fake_embed(texts)
+
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).embed(["Fourier"], embed)
+    cache = EmbeddingCache(path)
+    cache.embed(["Fourier", "query text"], embed, write_back=False)
+    assert calls[-1] == ["query text"]
+    cache.embed(["query text"], embed, write_back=False)
+    assert len(calls) == 2
+    EmbeddingCache(path).embed(["query text"], embed)
+    assert calls[-1] == ["query text"] and len(calls) == 3
+
+
+def test_embed_queries_never_opens_sqlite_by_default(monkeypatch):
+    """检索 query 默认只用进程内 query LRU + 嵌入模型，不打开嵌入缓存库；QUERY_READ 开启时才查库。"""
+    from src.preprocessing import embedding_cache
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return _fake_embed(texts)
+
+    monkeypatch.setattr(embedding_cache, "QUERY_READ_DB", False)
+    monkeypatch.setattr(embedding_cache, "QUERY_WRITE_BACK", False)
+    monkeypatch.setattr(embedding_cache, "_query_memory", embedding_cache.OrderedDict())
+    with patch.object(embedding_cache, "get_cache", side_effect=AssertionError("SQLite should not be opened")):
+        first = embedding_cache.embed_queries(["Fourier", "Fourier", "Laplace"], embed_fn=embed)
+        again = embedding_cache.embed_queries(["Laplace"], embed_fn=embed)
+    assert calls == [["Fourier", "Laplace"]]
+    assert first.shape[0] == 3 and (again[0] == first[2]).all()
+    monkeypatch.setattr(embedding_cache, "QUERY_READ_DB", True)
+    with patch.object(embedding_cache, "embed_texts", return_value=first) as via_db:
+        embedding_cache.embed_queries(["Fourier"], embed_fn=embed)
+    assert via_db.call_args.kwargs["write_back"] is False
+
+
+def test_retrieve_documents_expand_slices_parent_context_from_doc_store(tmp_path):
+    """expand：按切片偏移从 doc_store 取所在章节 / 前后窗口；同文档重叠区间合并，mmap 索引保留偏移列。"""
+    np = pytest.importorskip("numpy")
+    from src.preprocessing import doc_store, mmap_index
+    from src.preprocessing.md_loader import parse_md_headings
+
+    text = "# 第1讲\n\n## 卷积\n\n卷积的定义：y[n] = sum x[k] h[n-k]。\n交换律成立。\n\n## 傅里叶\n\n傅里叶级数展开。"
+    doc_store.write_store(str(tmp_path), [("lec01", text, parse_md_headings(text))])
+    conv = text.index("卷积的定义")
+    comm = text.index("交换律")
+    fourier = text.index("傅里叶级数")
+    spans = [(conv, conv + 5), (comm, comm + 6), (fourier, fourier + 8)]
+    metas = [
+        {"doc_id": "lec01", "section_title": t, "chunk_index": i, "start_offset": a, "end_offset": b}
+        for i, (t, (a, b)) in enumerate(zip(["卷积", "卷积", "傅里叶"], spans))
+    ]
+    emb = np.eye(3, dtype=np.float32)
+    mmap_index.write_index(mmap_index.index_dir_for(str(tmp_path)), ["a", "b", "c"], emb, [text[a:b] for a, b in spans], metas)
+    query = np.array([[1.0, 0.9, 0.0]], dtype=np.float32)
+    with patch.object(mmap_index, "embed_queries", return_value=query):
+        kwargs = dict(top_k=3, persist_dir=str(tmp_path), use_cache=False, backend="mmap")
+        plain = retrieve_documents("x", **kwargs)
+        section = retrieve_documents("x", expand="section", **kwargs)
+        window = retrieve_documents("x", expand="window", **kwargs)
+    assert plain[0].metadata["start_offset"] == conv and plain[0].page_content == "卷积的定义"
+    # 两个「卷积」命中合并为整节，「傅里叶」为另一节
+    assert [d.page_content for d in section] == [
+        "## 卷积\n\n卷积的定义：y[n] = sum x[k] h[n-k]。\n交换律成立。",
+        "## 傅里叶\n\n傅里叶级数展开。",
+    ]
+    assert section[0].metadata["chunk_indices"] == [0, 1] and section[0].metadata["expanded"] == "section"
+    # 窗口（默认 600 字符）覆盖全文，三个命中并为一段
+    assert len(window) == 1 and window[0].page_content == text
@@ -65,12 +65,24 @@ def test_subgraph_accepts_params(client, mock_subgraph):
         assert call_kw["max_nodes"] == 20
 
 
+def test_subgraph_rejects_depth_over_limit(client, mock_subgraph):
+    """max_depth 超过 MAX_SUBGRAPH_DEPTH 时返回 422，不触发查询。"""
+    from src.knowledge_graph import subgraph as subgraph_mod
+    with patch.object(subgraph_mod, "get_subgraph", return_value=mock_subgraph) as m:
+        resp = client.get(
+            "/api/graph/subgraph",
+            params={"seed_id": "lec01", "max_depth": subgraph_mod.MAX_SUBGRAPH_DEPTH + 1},
+        )
+    assert resp.status_code == 422
+    m.assert_not_called()
+
+
 def test_learning_path_returns_list(client):
     """学习路径接口返回 path 数组。"""
     from unittest.mock import MagicMock
 
     with patch("src.knowledge_graph.learning_path.get_learning_path_from_topic", return_value=["lec01", "lec02", "lec03"]):
-        with patch("src.agent.tools.graph._get_driver") as mock_driver:
+        with patch("src.knowledge_graph.driver.get_driver") as mock_driver:
             mock_cm = MagicMock()
             mock_cm.__enter__.return_value = MagicMock()
             mock_cm.__exit__.return_value = None
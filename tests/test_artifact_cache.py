@@ -0,0 +1,70 @@
+"""
+解析产物缓存测试：同一文件只解析一次、内容变化重新解析、磁盘层跨进程复用、并行切片回传父进程。
+"""
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+
+import pytest
+from src.preprocessing import artifact_cache
+from src.preprocessing.md_loader import load_md
+from src.preprocessing.splitter import slice_document, slice_corpus
+
+DOC = "# Title\n\n## Section 1\n\nBody one with $x[n]$.\n\n## Section 2\n\nBody two.\n"
+ENTRY = {"doc_id": "lec01", "doc_type": "lecture", "title": "T", "file_name": "lec01.md"}
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache(monkeypatch):
+    monkeypatch.setattr(artifact_cache, "CACHE_DIR", "")
+    artifact_cache.clear()
+    yield
+    artifact_cache.clear()
+
+
+def test_parse_once_and_invalidate_on_change(tmp_path):
+    path = tmp_path / "lec01.md"
+    path.write_text(DOC, encoding="utf-8")
+    assert artifact_cache.load_document(path) == load_md(path)
+    chunks = slice_document(path, ENTRY)
+    assert slice_document(path, ENTRY) == chunks
+    assert [c["section_title"] for c in chunks] == ["Title", "Section 1", "Section 2"]
+    # 不同切片配置复用同一解析结果
+    slice_document(path, ENTRY, chunk_size=10, overlap=2, max_section_chars=10)
+    assert artifact_cache.stats()["parsed"] == 1
+
+    os.utime(path, ns=(1, 1))  # 仅 mtime 变化：按内容 hash 复核，不重新解析
+    slice_document(path, ENTRY)
+    assert artifact_cache.stats()["parsed"] == 1
+
+    path.write_text(DOC.replace("Body two.", "Body two, edited."), encoding="utf-8")
+    edited = slice_document(path, ENTRY)
+    assert artifact_cache.stats()["parsed"] == 2
+    assert edited[-1]["content"].endswith("Body two, edited.")
+
+
+def test_disk_layer_reused_after_memory_clear(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    path = tmp_path / "lec01.md"
+    path.write_text(DOC, encoding="utf-8")
+    chunks = slice_document(path, ENTRY)
+    artifact_cache.clear()
+    assert slice_document(path, ENTRY) == chunks
+    assert artifact_cache.stats()["parsed"] == 0 and artifact_cache.stats()["disk_hits"] == 1
+
+
+def test_parallel_slicing_adopts_worker_artifacts(tmp_path):
+    entries = []
+    for i in range(3):
+        path = tmp_path / f"lec0{i}.md"
+        path.write_text(DOC.replace("Body two.", f"Body two of doc {i}."), encoding="utf-8")
+        entries.append({"doc_id": f"lec0{i}", "doc_type": "lecture", "file_path": str(path)})
+    first = list(slice_corpus(entries, workers=2, with_sections=True))
+    assert artifact_cache.stats()["adopted"] == 3 and artifact_cache.stats()["parsed"] == 0
+    second = list(slice_corpus(entries, workers=2, with_sections=True))
+    assert second == first
+    assert artifact_cache.stats()["parsed"] == 0
@@ -0,0 +1,82 @@
+"""
+BM25 索引测试：tokenize、build/search、where 过滤（无法执行的过滤抛出 UnsupportedFilter）、save/load、RRF 融合。
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.preprocessing.bm25_index import BM25Index, UnsupportedFilter, tokenize, reciprocal_rank_fusion, load_cached
+
+
+def _index() -> BM25Index:
+    docs = [
+        "The Fourier transform of a signal.",
+        "卷积 convolution of LTI systems",
+        "Discrete-time signals and sequences x[n]",
+        "Fourier series for periodic signals, \\sum a_k",
+    ]
+    metas = [
+        {"doc_id": "lec05", "doc_type": "lecture"},
+        {"doc_id": "lec04", "doc_type": "lecture"},
+        {"doc_id": "lec02", "doc_type": "lecture"},
+        {"doc_id": "hw05", "doc_type": "homework"},
+    ]
+    return BM25Index.build(["a", "b", "c", "d"], docs, metas)
+
+
+def test_tokenize_mixed():
+    toks = tokenize("什么是卷积？LTI \\sum")
+    assert "卷积" in toks and "卷" in toks
+    assert "lti" in toks and "\\sum" in toks
+
+
+def test_search_ranks_exact_terms():
+    idx = _index()
+    hits = idx.search("convolution", 3)
+    assert [idx.ids[i] for i, _ in hits] == ["b"]
+    hits = idx.search("Fourier", 5)
+    assert {idx.ids[i] for i, _ in hits} == {"a", "d"}
+    assert idx.search("laplace", 5) == []
+
+
+def test_search_where_filter():
+    idx = _index()
+    hits = idx.search("Fourier", 5, {"doc_type": {"$eq": "lecture"}})
+    assert [idx.ids[i] for i, _ in hits] == ["a"]
+    hits = idx.search("Fourier", 5, {"$and": [{"doc_type": {"$eq": "homework"}}, {"doc_id": {"$eq": "hw05"}}]})
+    assert [idx.ids[i] for i, _ in hits] == ["d"]
+
+
+@pytest.mark.parametrize("where", [
+    {"chunk_index": 1},
+    {"title": "Fourier"},
+    {"doc_id": {"$gt": "lec01"}},
+    {"$and": [{"doc_type": "lecture"}, {"chunk_index": {"$lt": 3}}]},
+    {"$or": [{"doc_id": "lec05"}, {"doc_id": {"$contains": "hw"}}]},
+    {"doc_id": {"$in": "lec05"}},
+])
+def test_search_rejects_filters_it_cannot_apply(where):
+    """不支持的字段 / 运算符不静默忽略（含 $and / $or 内部），避免融合不满足 where 的切片。"""
+    with pytest.raises(UnsupportedFilter):
+        _index().search("Fourier", 5, where)
+
+
+def test_save_load_roundtrip(tmp_path):
+    idx = _index()
+    idx.save(tmp_path / "bm25_index")
+    loaded = load_cached(str(tmp_path))
+    assert loaded is not None
+    assert loaded.search("Fourier", 5) == idx.search("Fourier", 5)
+    assert load_cached(str(tmp_path / "missing")) is None
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+    assert fused[0][0] == "a"
+    assert {x for x, _ in fused} == {"a", "b", "c"}
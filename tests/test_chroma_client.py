@@ -0,0 +1,47 @@
+"""
+Chroma 句柄池测试：get_collection 复用、invalidate、warm_up（mock chromadb，不依赖真实库）。
+"""
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+from src.preprocessing import chroma_client
+
+
+@pytest.fixture
+def mock_chroma():
+    mock = MagicMock()
+    chroma_client.invalidate()
+    with patch.dict(sys.modules, {"chromadb": mock}):
+        yield mock
+    chroma_client.invalidate()
+
+
+def test_get_collection_reuses_client_and_collection(mock_chroma):
+    a = chroma_client.get_collection("/tmp/pool_a")
+    b = chroma_client.get_collection("/tmp/pool_a")
+    assert a is b
+    assert mock_chroma.PersistentClient.call_count == 1
+    assert mock_chroma.PersistentClient.return_value.get_or_create_collection.call_count == 1
+
+
+def test_get_collection_keyed_by_persist_dir(mock_chroma):
+    chroma_client.get_collection("/tmp/pool_a")
+    chroma_client.get_collection("/tmp/pool_b")
+    assert mock_chroma.PersistentClient.call_count == 2
+
+
+def test_invalidate_forces_reopen(mock_chroma):
+    chroma_client.get_collection("/tmp/pool_a")
+    chroma_client.invalidate("/tmp/pool_a")
+    chroma_client.get_collection("/tmp/pool_a")
+    assert mock_chroma.PersistentClient.call_count == 2
+
+
+def test_warm_up_reports_failure(mock_chroma):
+    mock_chroma.PersistentClient.side_effect = RuntimeError("boom")
+    assert chroma_client.warm_up("/tmp/pool_c") is False
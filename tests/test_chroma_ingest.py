@@ -47,3 +47,207 @@ def test_ingest_results_to_chroma():
             shutil.rmtree(persist_dir)
         except Exception:
             pass
+
+
+class _FakeCollection:
+    """内存集合：记录 upsert / update / delete 的 id，用于验证增量入库。"""
+
+    def __init__(self):
+        self.rows = {}
+        self.upserted, self.updated, self.deleted = [], [], []
+
+    def count(self):
+        return len(self.rows)
+
+    def get(self, include=None, limit=None, offset=0, **kwargs):
+        ids = list(self.rows)[offset: offset + limit if limit else None]
+        return {"ids": ids, "documents": [self.rows[i][0] for i in ids], "metadatas": [self.rows[i][1] for i in ids]}
+
+    def upsert(self, ids, documents, metadatas, embeddings=None):
+        self.upserted.extend(ids)
+        self.rows.update({i: (d, m) for i, d, m in zip(ids, documents, metadatas)})
+
+    def update(self, ids, metadatas):
+        self.updated.extend(ids)
+        for i, m in zip(ids, metadatas):
+            self.rows[i] = (self.rows[i][0], m)
+
+    def delete(self, ids):
+        self.deleted.extend(ids)
+        for i in ids:
+            self.rows.pop(i, None)
+
+
+def _write_md(results_dir: Path, doc_id: str, sections: list[str]) -> str:
+    name = f"{'0' * 31}{len(doc_id)}_MITRES_6_007S11_{doc_id}.md"
+    body = "\n\n".join(f"## Section {i}\n\n{text}" for i, text in enumerate(sections))
+    (results_dir / name).write_text(f"# {doc_id}\n\n{body}\n", encoding="utf-8")
+    return name
+
+
+def test_incremental_ingest_only_touches_changed_chunks(tmp_path, monkeypatch):
+    """重复入库不新增切片；改动一个文件只 upsert 其新切片并删除消失切片。"""
+    from unittest.mock import patch
+    from src.preprocessing import chroma_ingest, embedding_cache
+    import json
+
+    monkeypatch.setattr(embedding_cache, "CACHE_PATH", str(tmp_path / "emb.sqlite3"))
+    monkeypatch.setattr(embedding_cache, "default_embedding_function", lambda: lambda texts: [[1.0, 0.0]] * len(texts))
+
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    lec = _write_md(results_dir, "lec01", ["Convolution sum " * 10, "Impulse response " * 10])
+    hw = _write_md(results_dir, "hw01", ["Problem one " * 10])
+    entries = [
+        {"file_path": "D:\\elsewhere\\" + lec, "file_name": lec, "doc_id": "lec01", "doc_type": "lecture"},
+        {"file_path": str(results_dir / hw), "file_name": hw, "doc_id": "hw01", "doc_type": "homework"},
+    ]
+    index_path = tmp_path / "doc_index.json"
+    index_path.write_text(json.dumps(entries), encoding="utf-8")
+    persist_dir = str(tmp_path / "db")
+    fake = _FakeCollection()
+
+    def run():
+        return chroma_ingest.ingest_results_to_chroma(
+            results_dir, None, persist_dir=persist_dir, index_path=index_path, build_bm25=False
+        )
+
+    with patch.object(chroma_ingest.chroma_client, "get_collection", return_value=fake):
+        n, _ = run()
+        assert n == fake.count() > 0
+        first_ids = set(fake.rows)
+        fake.upserted.clear()
+        assert run()[0] == n
+        assert fake.upserted == [] and fake.deleted == []
+
+        # 删掉 Section 1：整篇（level 1）切片内容变化 -> 1 个新切片；Section 0 切片原样保留
+        (results_dir / lec).write_text("# lec01\n\n## Section 0\n\n" + "Convolution sum " * 10 + "\n", encoding="utf-8")
+        assert run()[0] == n - 1
+        assert len(fake.upserted) == 1
+        assert len(fake.deleted) == 2 and set(fake.deleted) <= first_ids
+        assert len(set(fake.rows) & first_ids) == n - 2
+
+
+def test_ingest_near_and_semantic_dedup(tmp_path, monkeypatch):
+    """dedup_method=minhash / embedding 跨文件去掉近似重复切片；embedding 去重算出的向量直接用于写入。"""
+    from unittest.mock import patch
+    from src.preprocessing import chroma_ingest, embedding_cache
+
+    calls = []
+
+    def embed(texts):
+        calls.append(len(texts))
+        return [[1.0, 0.0] if "Convolution" in t else [0.0, 1.0] if "Fourier" in t else [0.6, 0.8] for t in texts]
+
+    monkeypatch.setattr(embedding_cache, "ENABLED", False)
+    monkeypatch.setattr(embedding_cache, "default_embedding_function", lambda: embed)
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    _write_md(results_dir, "lec01", ["Convolution sum of shifted impulses " * 6])
+    _write_md(results_dir, "lec02", ["Convolution sum of shifted impulse " * 6])
+    _write_md(results_dir, "lec03", ["Fourier series " * 12])
+
+    counts = {}
+    for method in ("hash", "minhash", "embedding"):
+        fake = _FakeCollection()
+        calls.clear()
+        with patch.object(chroma_ingest.chroma_client, "get_collection", return_value=fake):
+            counts[method], _ = chroma_ingest.ingest_results_to_chroma(
+                results_dir, None, persist_dir=str(tmp_path / method), build_bm25=False,
+                dedup_before_ingest=True, dedup_method=method,
+            )
+        if method == "embedding":
+            # 每个文件只在去重阶段嵌入一次，嵌入阶段不再调用
+            assert len(calls) == 3
+    assert counts["hash"] > counts["minhash"] >= counts["embedding"]
+    with pytest.raises(ValueError, match="Unsupported dedup method"):
+        chroma_ingest.ingest_results_to_chroma(results_dir, None, persist_dir=str(tmp_path / "x"), dedup_method="vector")
+
+
+def test_streaming_ingest_batches_writes_and_propagates_errors(tmp_path, monkeypatch):
+    """流式入库：upsert 按批写入（每批不超过 upsert_batch_size）；嵌入阶段异常在调用方抛出且不写清单。"""
+    from unittest.mock import patch
+    from src.preprocessing import chroma_ingest, embedding_cache, ingest_manifest
+
+    monkeypatch.setattr(embedding_cache, "CACHE_PATH", str(tmp_path / "emb.sqlite3"))
+    monkeypatch.setattr(embedding_cache, "default_embedding_function", lambda: lambda texts: [[float(len(t)), 1.0] for t in texts])
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    for i in range(1, 4):
+        _write_md(results_dir, f"lec0{i}", [f"Topic {i} part {j} " * 8 for j in range(3)])
+    fake = _FakeCollection()
+    batch_sizes = []
+    upsert = fake.upsert
+    fake.upsert = lambda ids, **kw: (batch_sizes.append(len(ids)), upsert(ids, **kw))
+    persist_dir = str(tmp_path / "db")
+
+    with patch.object(chroma_ingest.chroma_client, "get_collection", return_value=fake):
+        n, _ = chroma_ingest.ingest_results_to_chroma(
+            results_dir, None, persist_dir=persist_dir, build_bm25=False, embed_batch_size=3, upsert_batch_size=2
+        )
+    assert n == fake.count() == sum(batch_sizes)
+    assert max(batch_sizes) == 2 and len(batch_sizes) >= n // 2
+
+    def boom(texts):
+        raise RuntimeError("embedding backend down")
+
+    # 换一个空缓存，确保真正调用嵌入函数
+    monkeypatch.setattr(embedding_cache, "CACHE_PATH", str(tmp_path / "emb2.sqlite3"))
+    monkeypatch.setattr(embedding_cache, "default_embedding_function", lambda: boom)
+    fresh = _FakeCollection()
+    with patch.object(chroma_ingest.chroma_client, "get_collection", return_value=fresh):
+        with pytest.raises(RuntimeError, match="embedding backend down"):
+            chroma_ingest.ingest_results_to_chroma(
+                results_dir, None, persist_dir=str(tmp_path / "db2"), build_bm25=False, full_rebuild=True
+            )
+    assert ingest_manifest.load_manifest(str(tmp_path / "db2")) is None
+
+
+def test_ingest_chooses_embedder_once_and_never_mixes_models(tmp_path, monkeypatch, caplog):
+    """嵌入模型只在入库开始时选一次：OpenAI 不可用时整次用默认嵌入并记录警告；中途某批失败直接抛出，不换用默认模型。"""
+    import types
+    from unittest.mock import patch
+    from src.preprocessing import chroma_ingest, embedding_cache
+
+    default_calls = []
+    monkeypatch.setattr(embedding_cache, "ENABLED", False)
+    monkeypatch.setattr(
+        embedding_cache, "default_embedding_function",
+        lambda: lambda texts: default_calls.append(len(texts)) or [[1.0, 0.0]] * len(texts),
+    )
+    results_dir = tmp_path / "results"
+    results_dir.mkdir()
+    for i in range(1, 4):
+        _write_md(results_dir, f"lec0{i}", [f"Topic {i} part {j} " * 8 for j in range(3)])
+
+    class Unavailable:
+        def __init__(self):
+            raise ValueError("OPENAI_API_KEY not set")
+
+    with patch.dict(sys.modules, {"langchain_openai": types.SimpleNamespace(OpenAIEmbeddings=Unavailable)}), \
+         patch.object(chroma_ingest.chroma_client, "get_collection", return_value=_FakeCollection()):
+        n, _ = chroma_ingest.ingest_results_to_chroma(
+            results_dir, None, persist_dir=str(tmp_path / "db"), build_bm25=False, use_langchain_embeddings=True
+        )
+    assert n > 0 and sum(default_calls) == n
+    assert "using Chroma default embedding" in caplog.text
+
+    class Flaky:
+        model = "text-embedding-3-small"
+        calls = 0
+
+        def embed_documents(self, texts):
+            Flaky.calls += 1
+            if Flaky.calls > 1:
+                raise RuntimeError("openai timeout")
+            return [[0.5] * 3 for _ in texts]
+
+    default_calls.clear()
+    with patch.dict(sys.modules, {"langchain_openai": types.SimpleNamespace(OpenAIEmbeddings=Flaky)}), \
+         patch.object(chroma_ingest.chroma_client, "get_collection", return_value=_FakeCollection()):
+        with pytest.raises(RuntimeError, match="openai timeout"):
+            chroma_ingest.ingest_results_to_chroma(
+                results_dir, None, persist_dir=str(tmp_path / "db2"), build_bm25=False,
+                use_langchain_embeddings=True, embed_batch_size=2, full_rebuild=True,
+            )
+    assert default_calls == []
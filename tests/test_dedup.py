@@ -1,5 +1,5 @@
 """
-重复内容检测与去重模块测试：_normalize_text、find_duplicate_chunks、dedup_chunks。
+重复内容检测与去重模块测试：_normalize_text、find_duplicate_chunks、dedup_chunks（hash / minhash / embedding）、MinHashLSH。
 """
 import sys
 from pathlib import Path
@@ -7,11 +7,18 @@ from pathlib import Path
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
 
+import random
+
+import numpy as np
 import pytest
 from src.preprocessing.dedup import (
+    MinHashLSH,
     _normalize_text,
+    duplicate_clusters,
+    embedding_duplicate_pairs,
     find_duplicate_chunks,
     dedup_chunks,
+    minhash_signatures,
 )
 from src.preprocessing.splitter import ChunkWithMeta
 
@@ -75,3 +82,79 @@ def test_dedup_chunks():
 def test_dedup_chunks_unsupported_method():
     with pytest.raises(ValueError, match="Unsupported method"):
         dedup_chunks([], method="other")
+
+
+_BASE = (
+    "The convolution sum expresses the output of a discrete-time LTI system as a weighted "
+    "superposition of shifted impulse responses, where each weight is the input sample at that shift."
+)
+
+
+def _chunk(content: str, idx: int) -> ChunkWithMeta:
+    return {"content": content, "source_file": "f", "doc_type": "lecture", "doc_id": "d1",
+            "section_title": "", "chunk_index": idx, "total_chunks": 4, "content_type": "text", "title": None}
+
+
+def test_minhash_detects_near_duplicate():
+    chunks = [
+        _chunk(_BASE, 0),
+        _chunk("Fourier series represent periodic signals as sums of harmonically related complex exponentials.", 1),
+        _chunk(_BASE.replace("weighted", "scaled"), 2),
+        _chunk(_BASE.upper() + "  ", 3),
+    ]
+    assert find_duplicate_chunks(chunks, method="hash") == []
+    pairs = find_duplicate_chunks(chunks, method="minhash")
+    assert pairs == [(0, 2), (0, 3)]
+    assert duplicate_clusters(pairs) == {0: [2, 3]}
+    assert [c["chunk_index"] for c in dedup_chunks(chunks, method="minhash")] == [0, 1]
+    # 阈值调高到 1.0 后只剩归一化后完全相同的切片
+    assert find_duplicate_chunks(chunks, method="minhash", threshold=1.0) == [(0, 3)]
+
+
+def test_minhash_signature_estimates_jaccard():
+    sigs = minhash_signatures([_BASE, _BASE, "completely different text about sampling theorems"])
+    assert sigs.shape == (3, 128) and sigs.dtype == np.uint32
+    assert (sigs[0] == sigs[1]).all()
+    assert (sigs[0] == sigs[2]).mean() < 0.2
+
+
+def test_minhash_lsh_many_distinct_chunks():
+    rng = random.Random(0)
+    words = ["".join(rng.choice("abcdefghijklmnop") for _ in range(6)) for _ in range(2000)]
+    texts = [" ".join(rng.choice(words) for _ in range(60)) for _ in range(2000)]
+    texts.append(texts[7] + " tail")
+    pairs = find_duplicate_chunks([_chunk(t, i) for i, t in enumerate(texts)], method="minhash")
+    assert pairs == [(7, 2000)]
+
+
+def test_minhash_lsh_rejects_bad_bands():
+    with pytest.raises(ValueError):
+        MinHashLSH(bands=7)
+
+
+def test_embedding_dedup_uses_given_vectors():
+    chunks = [_chunk(f"text {i}", i) for i in range(4)]
+    vectors = [[1.0, 0.0], [0.0, 1.0], [0.99, 0.05], [0.0, 0.0]]
+    assert find_duplicate_chunks(chunks, method="embedding", embeddings=vectors) == [(0, 2)]
+    assert find_duplicate_chunks(chunks, method="embedding", embeddings=vectors, threshold=0.999) == []
+    out = dedup_chunks(chunks, method="embedding", embeddings=vectors)
+    assert [c["chunk_index"] for c in out] == [0, 1, 3]
+
+
+def test_embedding_pairs_independent_of_block_size():
+    """分块只影响内存，不影响结果：与逐条贪心比较一致。"""
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=(60, 8))
+    vecs = np.concatenate([base, base[rng.integers(0, 60, 40)] + rng.normal(scale=0.05, size=(40, 8))])
+    rng.shuffle(vecs)
+    unit = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    expected, kept = [], []
+    for i, v in enumerate(unit):
+        match = next((k for k in kept if unit[k] @ v >= 0.95), None)
+        if match is None:
+            kept.append(i)
+        else:
+            expected.append((match, i))
+    assert expected
+    for block in (1, 7, 32, 1024):
+        assert embedding_duplicate_pairs(vecs, 0.95, block) == expected
@@ -0,0 +1,125 @@
+"""
+PDF-Extract-Kit 流水线模式测试：用实现同一 stdin/stdout 协议的假提取进程代替模型，
+验证分块提取、逐页缓存复用、单块超时只丢当前块、进程无法启动时抛出 ExtractorUnavailable。
+"""
+import sys
+import textwrap
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from src.preprocessing import extract_kit_pipeline as pipeline
+
+FAKE_SERVER = textwrap.dedent('''
+    import json, os, sys, time
+    print("loading models...", flush=True)
+    print(json.dumps({"ready": True}), flush=True)
+    log = os.environ.get("FAKE_LOG")
+    for line in sys.stdin:
+        req = json.loads(line)
+        names = sorted(os.listdir(req["input"]))
+        if log:
+            with open(log, "a") as f:
+                f.write(",".join(names) + "\\n")
+        if os.environ.get("FAKE_HANG_ON") in names:
+            time.sleep(60)
+        for name in names:
+            with open(os.path.join(req["output"], name[:-4] + ".md"), "w") as f:
+                f.write("extracted " + name)
+        print(json.dumps({"id": req["id"], "ok": True}), flush=True)
+''')
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(pipeline, "CHUNK_PAGES", 2)
+    monkeypatch.setattr(pipeline, "STARTUP_TIMEOUT", 30)
+    monkeypatch.setattr("src.preprocessing.pdf_pages.RENDER_DPI", 20)
+    server = tmp_path / "server.py"
+    server.write_text(FAKE_SERVER, encoding="utf-8")
+    pdf = tmp_path / "book.pdf"
+    doc = fitz.open()
+    for i in range(5):
+        doc.new_page().insert_text((72, 72), f"page {i + 1}")
+    doc.save(pdf)
+    doc.close()
+    log = tmp_path / "requests.log"
+    monkeypatch.setenv("FAKE_LOG", str(log))
+
+    def session(work):
+        return pipeline.ExtractorSession([sys.executable, str(server)])
+
+    return pdf, session, log
+
+
+def test_pipelined_export_and_page_cache(tmp_path, setup):
+    pdf, session, log = setup
+    out = pipeline.export_pipelined(pdf, tmp_path / "out" / "book.md", session, "fake")
+    expected = "# book.pdf\n\n" + "".join(f"extracted {i:04d}.png\n\n" for i in range(1, 6))
+    assert out.read_text(encoding="utf-8") == expected
+    assert log.read_text().splitlines() == ["0001.png,0002.png", "0003.png,0004.png", "0005.png"]
+
+    # 全部命中缓存：不启动提取进程
+    def unavailable(work):
+        return pipeline.ExtractorSession([sys.executable, "-c", "raise SystemExit(1)"])
+
+    again = pipeline.export_pipelined(pdf, tmp_path / "out2" / "book.md", unavailable, "fake")
+    assert again.read_text(encoding="utf-8") == expected
+
+
+def test_chunk_timeout_loses_only_current_chunk(tmp_path, setup, monkeypatch):
+    pdf, session, log = setup
+    monkeypatch.setattr(pipeline, "CHUNK_TIMEOUT", 2)
+    monkeypatch.setenv("FAKE_HANG_ON", "0003.png")
+    assert pipeline.export_pipelined(pdf, tmp_path / "book.md", session, "fake") is None
+    # 超时后重启提取进程，后续块照常完成
+    assert log.read_text().splitlines() == ["0001.png,0002.png", "0003.png,0004.png", "0005.png"]
+
+    monkeypatch.delenv("FAKE_HANG_ON")
+    log.unlink()
+    out = pipeline.export_pipelined(pdf, tmp_path / "book.md", session, "fake")
+    assert out is not None and "extracted 0004.png" in out.read_text(encoding="utf-8")
+    assert log.read_text().splitlines() == ["0003.png,0004.png"]
+
+
+def test_unavailable_extractor_raises(tmp_path, setup):
+    pdf, _, _ = setup
+
+    def broken(work):
+        return pipeline.ExtractorSession([sys.executable, "-c", "print('no serve mode')"])
+
+    with pytest.raises(pipeline.ExtractorUnavailable):
+        pipeline.export_pipelined(pdf, tmp_path / "book.md", broken, "fake")
+
+
+def test_failed_chunks_fall_back_to_whole_directory_run(tmp_path, setup, monkeypatch):
+    from src.preprocessing import pdf_parser
+
+    pdf, _, _ = setup
+    kit = tmp_path / "kit"
+    scripts = kit / "project" / "pdf2markdown" / "scripts"
+    configs = kit / "project" / "pdf2markdown" / "configs"
+    scripts.mkdir(parents=True)
+    configs.mkdir(parents=True)
+    (configs / "pdf2markdown.yaml").write_text("inputs: none\noutputs: none\n", encoding="utf-8")
+    (scripts / "run_project.py").write_text(textwrap.dedent('''
+        import os, sys, yaml
+        config = yaml.safe_load(open(sys.argv[2]))
+        os.makedirs(config["outputs"], exist_ok=True)
+        pages = sorted(os.listdir(config["inputs"]))
+        open(os.path.join(config["outputs"], "merged.md"), "w").write("whole directory: " + ",".join(pages))
+    '''), encoding="utf-8")
+    monkeypatch.setenv("PDF_EXTRACT_KIT_ROOT", str(kit))
+    monkeypatch.setenv("PYTHON", sys.executable)
+    calls = []
+    monkeypatch.setattr(pipeline, "export_pipelined", lambda *a: calls.append(a[0]))
+
+    out = pdf_parser._export_pdf_extract_kit(pdf, tmp_path / "out", "book")
+    assert calls == [pdf]
+    assert out.read_text(encoding="utf-8") == "whole directory: " + ",".join(f"{i:04d}.png" for i in range(1, 6))
@@ -0,0 +1,104 @@
+"""
+先修传递闭包测试：位集闭包与遍历结果一致（含环）、缺失先修与批量验证、闭包文件按版本号合并与失效、
+概念导入时写出 DEPENDS_ON 闭包并被同版本快照直接加载、graph 工具批量验证。
+"""
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.agent.tools import graph
+from src.knowledge_graph import closure, concepts, snapshot
+
+
+def _walk(edges, start):
+    seen, stack = set(), [b for a, b in edges if a == start]
+    while stack:
+        u = stack.pop()
+        if u not in seen:
+            seen.add(u)
+            stack.extend(b for a, b in edges if a == u)
+    return seen
+
+
+def test_closure_matches_traversal_with_cycle():
+    ids = [f"n{i}" for i in range(70)]  # 跨越 64 位字边界
+    edges = [(ids[i], ids[i + 1]) for i in range(69)] + [("n3", "n66"), ("n68", "n65"), ("n10", "n2")]
+    reach = closure.build_reachability(ids, edges + [("n1", "missing")])
+    for node in ids:
+        assert set(reach.descendants(node)) == _walk(edges, node)
+        assert set(reach.ancestors(node)) == {x for x in ids if node in _walk(edges, x)}
+
+
+def test_missing_and_batch_validation():
+    ids = ["lec01", "lec02", "lec03", "lec04"]
+    reach = closure.build_reachability(ids, zip(ids, ids[1:]))
+    assert reach.missing("lec04", ["lec02"]) == ["lec01", "lec03"]
+    assert reach.missing("lec01", []) == []
+    batch = reach.missing_many(["lec02", "lec04", "lec09"], ["lec01"])
+    assert batch == {"lec02": [], "lec04": ["lec02", "lec03"], "lec09": []}
+
+
+def test_closure_file_versioning(tmp_path):
+    path = tmp_path / "closure.npz"
+    a = closure.build_reachability(["x", "y"], [("x", "y")])
+    closure.save_closures({"PREREQUISITE": a}, "v1", path)
+    closure.save_closures({"DEPENDS_ON": a}, "v1", path)
+    version, loaded = closure.load_closures(path)
+    assert version == "v1" and set(loaded) == {"PREREQUISITE", "DEPENDS_ON"}
+    assert loaded["PREREQUISITE"].ancestors("y") == ["x"]
+    # 新版本写入时丢弃旧版本的其他关系
+    closure.save_closures({"DEPENDS_ON": a}, "v2", path)
+    assert set(closure.load_closures(path)[1]) == {"DEPENDS_ON"}
+    assert closure.load_closures(path, version="v1") == (None, {})
+
+
+def test_concept_ingest_persists_depends_on_closure(tmp_path, monkeypatch):
+    monkeypatch.setenv("GRAPH_CLOSURE_PATH", str(tmp_path / "closure.npz"))
+    monkeypatch.setenv("GRAPH_SNAPSHOT_PATH", str(tmp_path / "snapshot.json"))
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DISABLED", False)
+    doc_index = []
+    for k in (1, 2):
+        md = tmp_path / f"lec0{k}.md"
+        md.write_text(f"# L{k}\n\n## A{k}\n\nx\n\n## B{k}\n\nx\n", encoding="utf-8")
+        doc_index.append({"doc_id": f"lec0{k}", "doc_type": "lecture", "lecture_index": k, "file_path": str(md)})
+    concepts.ingest_concepts_and_relations_to_neo4j(MagicMock(), doc_index, version="v7")
+    version, loaded = closure.load_closures()
+    assert version == "v7"
+    # 不带版本号的单独概念导入不改写闭包文件
+    concepts.ingest_concepts_and_relations_to_neo4j(MagicMock(), doc_index)
+    assert closure.load_closures()[0] == "v7"
+    assert loaded["DEPENDS_ON"].descendants("lec01_a1") == ["lec01_b1", "lec02_a2", "lec02_b2"]
+
+    records = snapshot.build_records_from_doc_index(doc_index)
+    records["version"] = "v7"
+    snapshot.save_snapshot(records)
+    snapshot.invalidate()
+    with patch.object(closure, "build_reachability", side_effect=AssertionError("should load persisted closure")):
+        later = graph.query_concept_depends("lec01_b1")
+    assert [c["id"] for c in later] == ["lec02_a2", "lec02_b2"]
+    # PREREQUISITE 不在闭包文件中：由快照现算
+    assert graph.validate_path([], "lec02") == (False, "推荐前需先学习：lec01。")
+    snapshot.invalidate()
+
+
+def test_validate_paths_batch(tmp_path, monkeypatch):
+    monkeypatch.setenv("GRAPH_CLOSURE_PATH", str(tmp_path / "closure.npz"))
+    ids = ["lec01", "lec02", "lec03", "lec04"]
+    snap = snapshot.GraphSnapshot({
+        "version": "v1",
+        "nodes": [{"id": t, "label": "Topic", "order": k} for k, t in enumerate(ids, 1)],
+        "edges": [[a, "PREREQUISITE", b] for a, b in zip(ids, ids[1:])],
+    })
+    with patch.object(graph, "_snapshot", return_value=snap), \
+         patch.object(graph, "_run_cypher", side_effect=AssertionError("no Neo4j")):
+        results = graph.validate_paths(["lec01", "lec02"], ["lec02", "lec03", "lec04"])
+        assert [ok for ok, _ in results.values()] == [True, True, False]
+        assert "lec03" in results["lec04"][1]
+        out = graph.graph_validate_path.invoke({"learned_topic_ids": "lec01", "recommended_topic_id": "lec02,lec04"})
+    assert out.splitlines() == [
+        "lec02 验证结果：通过。推荐目标的所有先修均已在已学列表中。",
+        "lec04 验证结果：不通过。推荐前需先学习：lec02, lec03。",
+    ]
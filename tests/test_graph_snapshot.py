@@ -0,0 +1,187 @@
+"""
+内存图快照测试：由 build / concepts 构建函数生成快照、graph 工具走快照得到与 Cypher 语义一致的结果、
+以 Neo4j 图状态为准刷新（版本号或节点 / 关系数变化，mock session）、Neo4j 不可用时用快照文件、无快照时退回 Neo4j。
+"""
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+from src.agent.tools import graph
+from src.knowledge_graph import snapshot
+
+
+def _doc_index(tmp_path: Path) -> list[dict]:
+    entries = []
+    for k in (1, 2, 3):
+        md = tmp_path / f"lec0{k}.md"
+        md.write_text(f"# Lecture {k}\n\n## Part A{k}\n\ntext\n\n## Part B{k}\n\ntext\n", encoding="utf-8")
+        entries.append({"doc_id": f"lec0{k}", "doc_type": "lecture", "lecture_index": k, "title": f"Lecture {k}", "file_path": str(md)})
+        entries.append({"doc_id": f"hw0{k}", "doc_type": "homework", "lecture_index": k, "title": f"Homework {k}", "related_lec": f"lec0{k}"})
+    return entries
+
+
+@pytest.fixture
+def snap_file(tmp_path, monkeypatch):
+    path = tmp_path / "graph_snapshot.json"
+    monkeypatch.setenv("GRAPH_SNAPSHOT_PATH", str(path))
+    monkeypatch.setenv("GRAPH_CLOSURE_PATH", str(tmp_path / "graph_closure.npz"))
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DISABLED", False)
+    # 默认 Neo4j 不可用（后台比对不连真实数据库）；各测试可再 patch 为 mock session
+    monkeypatch.setattr("src.knowledge_graph.driver.session", MagicMock(side_effect=OSError("neo4j down")))
+    snapshot.invalidate()
+    snapshot.save_snapshot(snapshot.build_records_from_doc_index(_doc_index(tmp_path)), path)
+    yield path
+    _wait_refresh()
+    snapshot.invalidate()
+
+
+def test_graph_tools_served_from_snapshot(snap_file):
+    with patch.object(graph, "_run_cypher", side_effect=AssertionError("Neo4j should not be queried")):
+        assert graph.query_next_topic("lec01") == [{"id": "lec02", "name_en": "Lecture 2", "order": 2}]
+        assert graph.query_next_topic("lec03") == []
+        assert graph.query_covers_exercises("lec02") == [{"id": "hw02", "title": "Homework 2", "difficulty": "intermediate"}]
+        assert [c["id"] for c in graph.query_teaches_concepts("lec01")] == ["lec01_part_a1", "lec01_part_b1"]
+        assert [c["id"] for c in graph.query_practices_concepts("hw03")] == ["lec03_part_a3", "lec03_part_b3"]
+        assert graph.query_practices_concepts("lec01") == []  # 标签不符
+        later = graph.query_concept_depends("lec01_part_b1")
+        assert [c["id"] for c in later] == ["lec02_part_a2", "lec02_part_b2", "lec03_part_a3", "lec03_part_b3"]
+        assert later[0]["topic_id"] == "lec02"
+        assert graph.validate_path(["lec01", "lec02"], "lec03")[0] is True
+        ok, msg = graph.validate_path(["lec02"], "lec03")
+        assert ok is False and "lec01" in msg and "lec02" not in msg
+        assert graph.validate_path([], "lec09")[0] is True
+
+
+def test_file_snapshot_used_while_neo4j_down(snap_file, tmp_path):
+    with patch("src.knowledge_graph.driver.session", side_effect=OSError("neo4j down")):
+        first = snapshot.get_snapshot()
+        _wait_refresh()
+        assert first is not None and snapshot.get_snapshot() is first
+        records = first.to_records()
+        records["nodes"].append({"id": "lec04", "label": "Topic", "name_en": "Lecture 4", "order": 4})
+        records["edges"].append(["lec03", "PREREQUISITE", "lec04"])
+        records["version"] = snapshot.new_version()
+        snapshot.save_snapshot(records, snap_file)
+        # 文件重新导出：下次比对时（Neo4j 仍不可用）改用新文件
+        assert snapshot.refresh().version == records["version"]
+        assert graph.query_next_topic("lec03") == [{"id": "lec04", "name_en": "Lecture 4", "order": 4}]
+
+
+def test_falls_back_to_neo4j_without_snapshot(tmp_path, monkeypatch):
+    monkeypatch.setenv("GRAPH_SNAPSHOT_PATH", str(tmp_path / "missing.json"))
+    snapshot.invalidate()
+    with patch("src.knowledge_graph.driver.session", side_effect=OSError("neo4j down")):
+        assert snapshot.get_snapshot() is None
+        _wait_refresh()
+    with patch.object(graph, "_snapshot", return_value=None), \
+         patch.object(graph, "_run_cypher", return_value=[{"id": "lec02", "name_en": "L2", "order": 2}]) as run:
+        assert graph.query_next_topic("lec01")[0]["id"] == "lec02"
+    run.assert_called_once()
+    snapshot.invalidate()
+
+
+def _wait_refresh() -> None:
+    """等待后台刷新线程结束。"""
+    assert snapshot._refreshing.acquire(timeout=5)
+    snapshot._refreshing.release()
+
+
+def _fake_neo4j(state: dict):
+    """state: version / extra（额外的 lec 节点数）/ loads 计数；按查询内容返回 mock 结果。"""
+
+    def run(query, **params):
+        result = MagicMock()
+        topics = ["lec01", "lec02"] + [f"lec9{k}" for k in range(state.get("extra", 0))]
+        if "GraphMeta" in query:
+            result.single.return_value = {"version": state["version"], "nodes": len(topics) + 1, "rels": 1}
+            return result
+        if "RETURN n.id" in query:
+            state["loads"] += 1
+            row = {"labels": ["Topic"], **{c: None for c in snapshot.PROPERTY_COLUMNS}}
+            return [{**row, "id": t, "order": k + 1} for k, t in enumerate(topics)]
+        return [{"a": "lec01", "rel": "PREREQUISITE", "b": "lec02"}]
+
+    @contextmanager
+    def fake_session():
+        yield MagicMock(run=run)
+
+    return fake_session
+
+
+def test_snapshot_from_neo4j_refreshes_on_state_change(tmp_path, monkeypatch):
+    monkeypatch.setenv("GRAPH_SNAPSHOT_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DISABLED", False)
+    monkeypatch.setattr(snapshot, "CHECK_SECONDS", 3600)
+    snapshot.invalidate()
+    state = {"version": "v1", "loads": 0}
+
+    with patch("src.knowledge_graph.driver.session", _fake_neo4j(state)):
+        assert snapshot.get_snapshot() is None  # 无快照文件：不同步等待 Neo4j，后台加载
+        _wait_refresh()
+        assert snapshot.get_snapshot().version == "v1"
+        assert snapshot.refresh().version == "v1"
+        assert state["loads"] == 1
+        state["version"] = "v2"
+        assert snapshot.refresh().version == "v2"
+        assert state["loads"] == 2
+        # 版本号未变但节点数变化（单独的概念导入、手工 Cypher）：同样重建
+        state["extra"] = 1
+        assert snapshot.refresh().node("lec90") is not None
+        assert state["loads"] == 3
+    # Neo4j 宕机：保留最近一次快照
+    with patch("src.knowledge_graph.driver.session", side_effect=OSError("neo4j down")):
+        snap = snapshot.refresh()
+    assert snap is not None and snap.version == "v2"
+    assert snap.successors(snap.node("lec01"), "PREREQUISITE") == [snap.node("lec02")]
+    snapshot.invalidate()
+
+
+def test_file_snapshot_replaced_when_neo4j_version_differs(snap_file, monkeypatch):
+    """快照文件只是 Neo4j 不可用时的后备：Neo4j 版本不同即改用 Neo4j 中的图，相同则不重读。"""
+    file_version = snapshot.load_snapshot_file(snap_file).version
+    state = {"version": file_version, "loads": 0}
+    with patch("src.knowledge_graph.driver.session", side_effect=OSError("neo4j down")):
+        assert snapshot.get_snapshot().version == file_version
+        _wait_refresh()
+    with patch("src.knowledge_graph.driver.session", _fake_neo4j(state)):
+        assert snapshot.refresh().version == file_version
+        assert state["loads"] == 0
+        state["version"] = "other-host"
+        assert snapshot.refresh().version == "other-host"
+        assert state["loads"] == 1
+
+
+def test_get_snapshot_refreshes_in_background(snap_file, monkeypatch):
+    """首次调用先返回快照文件、不等待 Neo4j；后台比对发现版本不同后换成 Neo4j 中的图。"""
+    file_version = snapshot.load_snapshot_file(snap_file).version
+    state = {"version": "v1", "loads": 0}
+    with patch("src.knowledge_graph.driver.session", _fake_neo4j(state)):
+        assert snapshot.get_snapshot().version == file_version
+        _wait_refresh()
+        assert snapshot.get_snapshot().version == "v1"
+        monkeypatch.setattr(snapshot, "CHECK_SECONDS", 0)
+        state["version"] = "v2"
+        assert snapshot.get_snapshot().version == "v1"  # 到期：返回当前快照，后台比对
+        _wait_refresh()
+        assert snapshot.get_snapshot().version == "v2"
+
+
+def test_first_call_never_waits_on_neo4j(snap_file):
+    """Neo4j 连接阻塞时首次 get_snapshot（及 warm_up）立即返回快照文件。"""
+    import threading
+    release = threading.Event()
+
+    def hang():
+        release.wait(5)
+        raise OSError("connection timeout")
+
+    with patch("src.knowledge_graph.driver.session", side_effect=hang):
+        snapshot.warm_up()
+        assert snapshot.get_snapshot() is not None
+        release.set()
+        _wait_refresh()
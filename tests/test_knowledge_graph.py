@@ -1,9 +1,11 @@
 """
-知识图谱构建测试：build_topics_and_exercises、build_and_ingest_graph（Neo4j 需配置 NEO4J_PASSWORD 才执行导入）。
+知识图谱构建测试：build_topics_and_exercises、build_and_ingest_graph（Neo4j 需配置 NEO4J_PASSWORD 才执行导入）、
+ingest_to_neo4j 的 UNWIND 分批写入（假 session 记录语句）。
 """
 import os
 import sys
 from pathlib import Path
+from unittest.mock import MagicMock, patch
 
 ROOT = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT))
@@ -13,6 +15,7 @@ import pytest
 from src.knowledge_graph.build import (
     build_topics_and_exercises,
     build_and_ingest_graph,
+    ingest_to_neo4j,
     _lecture_entries,
     _homework_entries,
 )
@@ -43,3 +46,57 @@ def test_build_and_ingest_graph_from_index():
     n_t, n_e = build_and_ingest_graph(doc_index_path=index_path, clear_neo4j_first=True)
     assert n_t == 5
     assert n_e == 5
+
+
+class _RecordingSession:
+    """记录 auto-commit 语句与显式写事务批次的假 session。"""
+
+    def __init__(self):
+        self.log = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.log.append(("run", " ".join(query.split()), params))
+        return MagicMock()
+
+    def execute_write(self, fn, *args):
+        tx = MagicMock()
+        fn(tx, *args)
+        query, = tx.run.call_args.args
+        self.log.append(("tx", " ".join(query.split()), tx.run.call_args.kwargs["rows"]))
+
+
+def test_ingest_to_neo4j_batches_with_unwind(tmp_path, monkeypatch):
+    monkeypatch.setenv("GRAPH_SNAPSHOT_PATH", str(tmp_path / "snapshot.json"))
+    monkeypatch.setenv("GRAPH_CLOSURE_PATH", str(tmp_path / "closure.npz"))
+    doc_index = []
+    for k in (1, 2, 3):
+        md = tmp_path / f"lec0{k}.md"
+        md.write_text(f"# L{k}\n\n## A{k}\n\nx\n\n## B{k}\n\nx\n\n## C{k}\n\nx\n", encoding="utf-8")
+        doc_index.append({"doc_id": f"lec0{k}", "doc_type": "lecture", "lecture_index": k, "title": f"L{k}", "file_path": str(md)})
+        doc_index.append({"doc_id": f"hw0{k}", "doc_type": "homework", "lecture_index": k, "related_lec": f"lec0{k}"})
+    topics, exercises = build_topics_and_exercises(doc_index)
+    session = _RecordingSession()
+    neo4j = MagicMock()
+    neo4j.GraphDatabase.driver.return_value.session.return_value = session
+    with patch.dict(sys.modules, {"neo4j": neo4j}):
+        ingest_to_neo4j(topics, exercises, password="x", doc_index=doc_index, results_dir=tmp_path, batch_size=2)
+
+    # 索引先于任何 MERGE；MERGE 只出现在 UNWIND 批次中
+    first_index = next(k for k, (_, q, _) in enumerate(session.log) if q.startswith("CREATE INDEX"))
+    first_tx = next(k for k, (kind, _, _) in enumerate(session.log) if kind == "tx")
+    assert first_index < first_tx
+    assert not any(kind == "run" and "MERGE" in q and "GraphMeta" not in q for kind, q, _ in session.log)
+    batches = [(q.split("MERGE ")[1].split(" ")[0], rows) for kind, q, rows in session.log if kind == "tx"]
+    assert all(q.startswith("UNWIND $rows AS row") for kind, q, _ in session.log if kind == "tx")
+    assert all(len(rows) <= 2 for _, rows in batches)
+    n_concepts = sum(len(rows) for target, rows in batches if target.startswith("(c:Concept"))
+    assert n_concepts == 9
+    assert sum(len(rows) for target, rows in batches if "DEPENDS_ON" in target) == 8
+    assert [len(rows) for target, rows in batches if target.startswith("(t:Topic")] == [2, 1]
+    assert (tmp_path / "snapshot.json").is_file() and (tmp_path / "closure.npz").is_file()
@@ -48,3 +48,25 @@ def test_load_md():
     assert isinstance(sections, list)
     for s in sections:
         assert "level" in s and "title" in s and "start_line" in s and "end_line" in s
+
+
+def test_parse_md_headings_matches_reference():
+    """单遍栈式实现与原逐行扫描实现输出完全一致（含 results/*.md 与边界情况）。"""
+    import random
+    from src.preprocessing.md_loader import _parse_md_headings_reference
+
+    samples = [
+        "",
+        "# Only title",
+        "## A\n## B\n\n### C\nx\n# D\n",
+        "text\n### Deep\n## Mid\n# Top\n  ## indented\nbody more\n#NoSpace\n",
+        "# T\r\n\r\n## S\r\nbody",
+    ]
+    rng = random.Random(7)
+    pieces = ["# H1", "## H2", "### H3", "body", "", "$$x$$", "#### H4", "  ### spaced"]
+    samples += ["\n".join(rng.choice(pieces) for _ in range(rng.randint(1, 60))) for _ in range(200)]
+    results_dir = ROOT / "results"
+    if results_dir.is_dir():
+        samples += [clean_md_text(p.read_text(encoding="utf-8", errors="replace")) for p in sorted(results_dir.glob("*.md"))]
+    for text in samples:
+        assert parse_md_headings(text) == _parse_md_headings_reference(text)
@@ -0,0 +1,128 @@
+"""
+内存映射向量索引测试：导出、精确检索、where 过滤、float16、重新导出后重载。
+"""
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.preprocessing import mmap_index
+from src.preprocessing.mmap_index import MmapIndex, UnsupportedFilter, export_from_collection, load_cached, write_index
+
+
+def _data(n: int = 40, dim: int = 8):
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"c{i}" for i in range(n)]
+    docs = [f"切片 {i} text" for i in range(n)]
+    metas = [
+        {"doc_id": f"lec0{i % 4 + 1}", "doc_type": "lecture" if i % 5 else "homework", "section_title": f"S{i % 3}", "chunk_index": i, "total_chunks": n}
+        for i in range(n)
+    ]
+    return ids, emb, docs, metas
+
+
+def test_search_matches_brute_force(tmp_path):
+    ids, emb, docs, metas = _data()
+    write_index(tmp_path / "idx", ids, emb, docs, metas)
+    idx = MmapIndex(tmp_path / "idx")
+    q = emb[[3, 17]] + 0.01
+    hits = idx.search(q, 5)
+    for j in range(2):
+        expected = np.argsort(((emb - q[j]) ** 2).sum(axis=1))[:5]
+        assert [i for i, _ in hits[j]] == list(expected)
+    assert hits[0][0][0] == 3 and hits[1][0][0] == 17
+    assert idx.text(3) == "切片 3 text"
+    assert idx.metadata(3)["doc_id"] == "lec04" and idx.metadata(3)["chunk_index"] == 3
+    assert "title" not in idx.metadata(3)
+
+
+def test_search_in_blocks_matches_single_pass(tmp_path, monkeypatch):
+    """分块（含过滤后的候选行）合并 top-k 的结果与一次算完全部行相同。"""
+    ids, emb, docs, metas = _data()
+    write_index(tmp_path / "idx", ids, emb, docs, metas, dtype="float16")
+    idx = MmapIndex(tmp_path / "idx")
+    q = emb[[3, 17]] + 0.01
+    where = {"doc_type": "lecture"}
+    whole = idx.search(q, 7), idx.search(q, 7, where)
+    monkeypatch.setattr(mmap_index, "SEARCH_BLOCK_ROWS", 3)
+    assert (idx.search(q, 7), idx.search(q, 7, where)) == whole
+    assert all(metas[i]["doc_type"] == "lecture" for i, _ in whole[1][0])
+
+
+def test_where_mask_filters(tmp_path):
+    ids, emb, docs, metas = _data()
+    write_index(tmp_path / "idx", ids, emb, docs, metas)
+    idx = MmapIndex(tmp_path / "idx")
+    where = {"$and": [{"doc_id": {"$eq": "lec02"}}, {"doc_type": {"$eq": "lecture"}}]}
+    res = idx.query(emb[:1], 50, where)
+    assert res["ids"][0]
+    assert all(m["doc_id"] == "lec02" and m["doc_type"] == "lecture" for m in res["metadatas"][0])
+    assert idx.query(emb[:1], 5, {"doc_id": {"$eq": "lec99"}})["ids"] == [[]]
+    res = idx.query(emb[:1], 50, {"chunk_index": {"$in": [1, 2]}})
+    assert sorted(res["ids"][0]) == ["c1", "c2"]
+    res = idx.query(emb[:1], 50, {"$or": [{"chunk_index": {"$lt": 2}}, {"chunk_index": {"$gte": 38}}]})
+    assert sorted(res["ids"][0]) == ["c0", "c1", "c38", "c39"]
+
+
+@pytest.mark.parametrize("where", [
+    {"author": "x"},
+    {"doc_id": {"$contains": "lec"}},
+    {"$and": [{"doc_id": "lec01"}, {"author": "x"}]},
+    {"$or": [{"doc_id": "lec01"}, {"doc_type": {"$regex": "^home"}}]},
+    {"doc_id": {"$gt": "lec01"}},
+    {"chunk_index": {"$eq": "1"}},
+])
+def test_where_mask_rejects_filters_it_cannot_apply(tmp_path, where):
+    """未知字段 / 运算符 / 值类型不静默忽略（否则 $and 放宽、$or 收窄结果）。"""
+    ids, emb, docs, metas = _data()
+    write_index(tmp_path / "idx", ids, emb, docs, metas)
+    with pytest.raises(UnsupportedFilter):
+        MmapIndex(tmp_path / "idx").query(emb[:1], 5, where)
+
+
+@pytest.mark.parametrize("space", ["cosine", "ip"])
+def test_search_uses_collection_space(tmp_path, space):
+    ids, emb, docs, metas = _data()
+    emb[7] *= 10.0  # 大范数行：l2 下远，cosine 下与方向相同的 query 最近，ip 下点积最大
+    write_index(tmp_path / "idx", ids, emb, docs, metas, space=space)
+    idx = MmapIndex(tmp_path / "idx")
+    q = emb[7] / 10.0 + 0.01
+    hits = idx.search(q, 40)[0]
+    if space == "cosine":
+        unit = emb / np.linalg.norm(emb, axis=1, keepdims=True)
+        expected = 1.0 - unit @ (q / np.linalg.norm(q))
+    else:
+        expected = 1.0 - emb @ q
+    assert [i for i, _ in hits] == list(np.argsort(expected, kind="stable"))
+    assert hits[0][0] == 7
+    assert [d for _, d in hits] == pytest.approx(sorted(expected.tolist()), abs=1e-4)
+
+
+def test_unknown_space_rejected(tmp_path):
+    ids, emb, docs, metas = _data()
+    with pytest.raises(ValueError):
+        write_index(tmp_path / "idx", ids, emb, docs, metas, space="manhattan")
+
+
+def test_float16_export_and_reload(tmp_path):
+    ids, emb, docs, metas = _data()
+    page = {"ids": ids, "embeddings": emb, "documents": docs, "metadatas": metas}
+    collection = MagicMock()
+    collection.get.side_effect = [page]
+    collection.configuration = {"hnsw": {"space": "cosine"}}
+    collection.metadata = {}
+    assert export_from_collection(collection, str(tmp_path), dtype="float16") == len(ids)
+    idx = load_cached(str(tmp_path))
+    assert idx is not None and idx.embeddings.dtype == np.float16 and idx.space == "cosine"
+    assert idx.search(emb[5], 1)[0][0][0] == 5
+    assert load_cached(str(tmp_path)) is idx
+    write_index(mmap_index.index_dir_for(str(tmp_path)), ids[:3], emb[:3], docs[:3], metas[:3])
+    reloaded = load_cached(str(tmp_path))
+    assert reloaded is not idx and len(reloaded) == 3
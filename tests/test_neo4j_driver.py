@@ -0,0 +1,71 @@
+"""
+Neo4j 驱动单例测试：多次查询复用同一 Driver、session 计数、close_driver 后重建、连接池参数来自环境变量（mock neo4j，不依赖真实库）。
+"""
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+from src.knowledge_graph import driver as neo4j_driver
+
+
+@pytest.fixture
+def mock_neo4j(monkeypatch):
+    monkeypatch.setenv("NEO4J_PASSWORD", "secret")
+    mock = MagicMock()
+    neo4j_driver.close_driver()
+    with patch.dict(sys.modules, {"neo4j": mock}):
+        yield mock
+    neo4j_driver.close_driver()
+
+
+def test_tool_calls_share_one_driver(mock_neo4j):
+    from src.agent.tools import graph
+
+    before = neo4j_driver.pool_stats()
+    with patch.object(graph, "_snapshot", return_value=None):
+        for topic in ("lec01", "lec02", "lec03", "lec04"):
+            graph.query_next_topic(topic)
+        graph.validate_path(["lec01"], "lec03")
+    assert mock_neo4j.GraphDatabase.driver.call_count == 1
+    drv = mock_neo4j.GraphDatabase.driver.return_value
+    assert drv.session.call_count == 5
+    drv.close.assert_not_called()
+    stats = neo4j_driver.pool_stats()
+    assert stats["driver_active"] is True
+    assert stats["sessions_opened"] - before["sessions_opened"] == 5
+    assert stats["in_use"] == 0
+
+
+def test_close_driver_releases_and_recreates(mock_neo4j):
+    first = neo4j_driver.get_driver()
+    neo4j_driver.close_driver()
+    first.close.assert_called_once()
+    assert neo4j_driver.pool_stats()["driver_active"] is False
+    neo4j_driver.get_driver()
+    assert mock_neo4j.GraphDatabase.driver.call_count == 2
+
+
+def test_pool_settings_from_env(mock_neo4j, monkeypatch):
+    monkeypatch.setenv("NEO4J_POOL_SIZE", "8")
+    monkeypatch.setenv("NEO4J_POOL_ACQUIRE_TIMEOUT", "5")
+    neo4j_driver.get_driver()
+    kwargs = mock_neo4j.GraphDatabase.driver.call_args.kwargs
+    assert kwargs["max_connection_pool_size"] == 8
+    assert kwargs["connection_acquisition_timeout"] == 5.0
+    assert neo4j_driver.pool_stats()["max_connection_pool_size"] == 8
+
+
+def test_health_and_warm_up(mock_neo4j, monkeypatch):
+    assert neo4j_driver.check_health() == "ok"
+    assert neo4j_driver.warm_up() is True
+    mock_neo4j.GraphDatabase.driver.return_value.verify_connectivity.side_effect = OSError("refused")
+    assert neo4j_driver.check_health() == "error"
+    assert neo4j_driver.warm_up() is False
+    monkeypatch.delenv("NEO4J_PASSWORD")
+    neo4j_driver.close_driver()
+    assert neo4j_driver.warm_up() is False
+    assert neo4j_driver.check_health() == "error"
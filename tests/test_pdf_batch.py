@@ -0,0 +1,77 @@
+"""
+批量 PDF 转换测试：首次转换全部文件、未变文件跳过、变更文件重转、清单可供 build_doc_index 使用。
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from src.preprocessing import pdf_batch
+from src.preprocessing.doc_index import build_doc_index
+
+
+def _make_pdf(path: Path, lines: list[str]) -> Path:
+    doc = fitz.open()
+    for line in lines:
+        doc.new_page().insert_text((72, 72), line)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def _corpus(pdf_dir: Path) -> dict[str, Path]:
+    pdf_dir.mkdir()
+    names = {
+        "lec01": f"{'a' * 32}_MITRES_6_007S11_lec01.pdf",
+        "hw01": f"{'b' * 32}_MITRES_6_007S11_hw01.pdf",
+    }
+    return {doc_id: _make_pdf(pdf_dir / name, [f"{doc_id} page 1", f"{doc_id} page 2"]) for doc_id, name in names.items()}
+
+
+def test_convert_directory_skips_unchanged_and_feeds_doc_index(tmp_path, monkeypatch):
+    pdfs = _corpus(tmp_path / "pdfs")
+    out_dir = tmp_path / "results"
+    calls = []
+    real = pdf_batch._convert_task
+    monkeypatch.setattr(pdf_batch, "_convert_task", lambda pdf, *a: (calls.append(Path(pdf).name), real(pdf, *a))[1])
+
+    first = pdf_batch.convert_directory(tmp_path / "pdfs", out_dir, workers=1)
+    assert (first["converted"], first["skipped"], first["failed"]) == (2, 0, 0)
+    lec_md = out_dir / f"{'a' * 32}_MITRES_6_007S11_lec01.md"
+    assert "lec01 page 2" in lec_md.read_text(encoding="utf-8")
+
+    calls.clear()
+    second = pdf_batch.convert_directory(tmp_path / "pdfs", out_dir, workers=1)
+    assert (second["converted"], second["skipped"]) == (0, 2) and calls == []
+
+    # 只有内容变化的 PDF 重转；输出被改动的也重转
+    _make_pdf(pdfs["hw01"], ["hw01 revised"])
+    lec_md.write_text("edited by hand", encoding="utf-8")
+    third = pdf_batch.convert_directory(tmp_path / "pdfs", out_dir, workers=1)
+    assert third["converted"] == 2 and sorted(calls) == sorted(p.name for p in pdfs.values())
+    assert "lec01 page 2" in lec_md.read_text(encoding="utf-8")
+
+    # 未进清单的 .md 不被索引
+    (out_dir / f"{'c' * 32}_MITRES_6_007S11_lec02.md").write_text("# stray\n", encoding="utf-8")
+    entries = build_doc_index(out_dir, None, manifest=pdf_batch.manifest_path(out_dir))
+    assert sorted(e["doc_id"] for e in entries) == ["hw01", "lec01"]
+    assert {e["source_pdf"] for e in entries} == {p.name for p in pdfs.values()}
+    assert len(build_doc_index(out_dir, None)) == 3
+
+
+def test_convert_directory_records_failures_and_retries(tmp_path, monkeypatch):
+    _corpus(tmp_path / "pdfs")
+    out_dir = tmp_path / "results"
+    monkeypatch.setattr(pdf_batch, "export_pdf_to_md", lambda *a, **kw: None)
+    summary = pdf_batch.convert_directory(tmp_path / "pdfs", out_dir, "pdf_extract_kit", kit_workers=1)
+    assert summary["failed"] == 2
+    assert all(r["status"] == "failed" for r in pdf_batch.load_manifest(out_dir).values())
+
+    monkeypatch.undo()
+    summary = pdf_batch.convert_directory(tmp_path / "pdfs", out_dir, workers=1)
+    assert (summary["converted"], summary["failed"]) == (2, 0)
@@ -0,0 +1,88 @@
+"""
+pdf_parser PyMuPDF 后端测试：页区间并行提取与串行一致、断点续跑、页面渲染跳过已有图片。
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from src.preprocessing import pdf_pages, pdf_parser
+
+
+def _make_pdf(path: Path, n_pages: int) -> Path:
+    doc = fitz.open()
+    for i in range(n_pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1}: convolution and impulse response")
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def _expected(pdf: Path, n_pages: int) -> str:
+    body = "".join(f"## 第 {i + 1} 页\n\nPage {i + 1}: convolution and impulse response\n\n" for i in range(n_pages))
+    return f"# {pdf.name}\n\n页数: {n_pages}\n\n" + body
+
+
+def test_parallel_extraction_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_pages, "PAGES_PER_TASK", 3)
+    pdf = _make_pdf(tmp_path / "abc_lecture_notes.pdf", 10)
+    serial = pdf_parser._export_pymupdf(pdf, tmp_path / "serial", "lec", workers=1)
+    parallel = pdf_parser._export_pymupdf(pdf, tmp_path / "parallel", "lec", workers=2)
+    assert serial.read_text(encoding="utf-8") == _expected(pdf, 10)
+    assert parallel.read_bytes() == serial.read_bytes()
+    assert sorted(p.name for p in (tmp_path / "parallel").iterdir()) == ["lec.md"]
+
+
+def test_interrupted_extraction_resumes_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_pages, "PAGES_PER_TASK", 2)
+    pdf = _make_pdf(tmp_path / "book.pdf", 7)
+    out_dir = tmp_path / "out"
+    real = pdf_parser._extract_pages
+    calls = []
+
+    def flaky(path, start, end):
+        calls.append((start, end))
+        if start >= 4:
+            raise KeyboardInterrupt
+        return real(path, start, end)
+
+    monkeypatch.setattr(pdf_parser, "_extract_pages", flaky)
+    with pytest.raises(KeyboardInterrupt):
+        pdf_parser._export_pymupdf(pdf, out_dir, "book", workers=1)
+    assert not (out_dir / "book.md").exists()
+    assert (out_dir / ("book.md" + pdf_parser.CHECKPOINT_SUFFIX)).is_file()
+
+    calls.clear()
+    monkeypatch.setattr(pdf_parser, "_extract_pages", lambda *a: (calls.append(a[1:]), real(*a))[1])
+    out = pdf_parser._export_pymupdf(pdf, out_dir, "book", workers=1)
+    assert calls == [(4, 6), (6, 7)]
+    assert out.read_text(encoding="utf-8") == _expected(pdf, 7)
+    assert sorted(p.name for p in out_dir.iterdir()) == ["book.md"]
+
+
+def test_checkpoint_ignored_when_pdf_changes(tmp_path):
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    pdf = _make_pdf(tmp_path / "doc.pdf", 3)
+    (out_dir / ("doc.md" + pdf_parser.PARTIAL_SUFFIX)).write_text("stale", encoding="utf-8")
+    pdf_parser._save_checkpoint(out_dir / ("doc.md" + pdf_parser.CHECKPOINT_SUFFIX), "0" * 64, 2, 5)
+    out = pdf_parser._export_pymupdf(pdf, out_dir, "doc", workers=1)
+    assert out.read_text(encoding="utf-8") == _expected(pdf, 3)
+
+
+def test_render_to_dir_renders_missing_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_pages, "RENDER_DPI", 20)
+    pdf = _make_pdf(tmp_path / "slides.pdf", 4)
+    images = tmp_path / "images"
+    images.mkdir()
+    (images / "0002.png").write_bytes(b"existing")
+    pdf_pages.render_to_dir(pdf, images, workers=1)
+    assert sorted(p.name for p in images.iterdir()) == ["0001.png", "0002.png", "0003.png", "0004.png"]
+    assert (images / "0002.png").read_bytes() == b"existing"
+    assert (images / "0001.png").read_bytes().startswith(b"\x89PNG")
@@ -32,3 +32,55 @@ def test_slice_document_and_metadata():
     meta = chunk_metadata_for_chroma(chunks[0])
     assert meta["source_file"] and meta["doc_type"] == "lecture" and meta["doc_id"] == "lec01"
     assert isinstance(meta["chunk_index"], int) and isinstance(meta["total_chunks"], int)
+    assert meta["token_count"] == chunks[0]["token_count"] > 0
+    from src.preprocessing.md_loader import load_md
+    cleaned = load_md(path)[0]
+    assert all(cleaned[c["start_offset"]:c["end_offset"]] == c["content"] for c in chunks)
+    assert (meta["start_offset"], meta["end_offset"]) == (chunks[0]["start_offset"], chunks[0]["end_offset"])
+
+
+def test_slice_corpus_parallel_matches_serial_order():
+    """slice_corpus：进程池并行结果与串行逐篇 slice_document 完全一致，且按 entries 顺序产出。"""
+    from src.preprocessing.splitter import slice_corpus
+    results_dir = ROOT / "results"
+    if not results_dir.is_dir():
+        pytest.skip("results/ not found")
+    entries = build_doc_index(results_dir, None)[:6]
+    if len(entries) < 2:
+        pytest.skip("need at least two documents")
+    missing = {"file_path": "D:\\nowhere\\x.md", "file_name": "missing.md", "doc_id": "lec99", "doc_type": "lecture"}
+    serial = [(e["doc_id"], c) for e, _, c, _ in slice_corpus(entries + [missing], workers=1)]
+    parallel = [(e["doc_id"], c) for e, _, c, _ in slice_corpus(entries + [missing], workers=3)]
+    assert [d for d, _ in parallel] == [e["doc_id"] for e in entries]
+    assert parallel == serial
+    assert serial[0][1] == slice_document(Path(entries[0]["file_path"]), entries[0])
+
+
+def test_span_index_matches_substring_scan():
+    """_split_by_size：保护区间索引（bisect）与原逐次子串扫描切出的块完全一致。"""
+    import random
+    from src.preprocessing.splitter import _split_by_size
+    texts = [p.read_text(encoding="utf-8") for p in sorted((ROOT / "results").glob("*.md"))[:4]]
+    rng = random.Random(0)
+    pieces = ["$", "$$", "\\(", "\\)", "\\[", "\\]", "\n", "\n\n", ". ", "。 ", " ", "x_k", "- ", "| a |"]
+    texts += ["".join(rng.choice(pieces) for _ in range(rng.randint(200, 1500))) for _ in range(200)]
+    for i, text in enumerate(texts):
+        chunk_size = (800, 300, 120)[i % 3]
+        overlap = chunk_size // 8
+        fast = _split_by_size(text, chunk_size, overlap, use_span_index=True)
+        assert fast == _split_by_size(text, chunk_size, overlap, use_span_index=False)
+
+
+def test_split_by_tokens_respects_token_budget():
+    """unit="tokens"：切片按 token 数控制长度（中英混排下与字符数差异大），仍不切断公式。"""
+    from src.preprocessing.splitter import MAX_CHUNK_TOKENS, _split_by_size
+    from src.preprocessing.tokens import count_tokens
+    para = "卷积定理说明时域卷积对应频域相乘。The convolution $y[n] = \\sum_k x[k] h[n-k]$ is linear. "
+    text = "\n\n".join(para * 3 for _ in range(20))
+    chunks = _split_by_size(text, 120, 15, unit="tokens")
+    assert len(chunks) > 1
+    for c in chunks:
+        assert count_tokens(c) <= MAX_CHUNK_TOKENS
+        assert c.count("$") % 2 == 0
+    # 同样的 120 按字符计切得更碎
+    assert len(_split_by_size(text, 120, 15, unit="chars")) > len(chunks)
@@ -0,0 +1,89 @@
+"""
+子图引擎测试：快照路径按 (距离, -度数) 截断、边有向去重、只含前端字段；无快照时单条 Cypher 逐层扩展取回并同样截断；max_depth 有上限。
+"""
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.knowledge_graph import subgraph
+from src.knowledge_graph.snapshot import GraphSnapshot
+
+
+def _snapshot() -> GraphSnapshot:
+    nodes = [{"id": f"lec0{k}", "label": "Topic", "name_en": f"Lecture {k}", "order": k} for k in (1, 2, 3)]
+    nodes += [{"id": "hw01", "label": "Exercise", "title": "Homework 1"}]
+    nodes += [{"id": f"c{k}", "label": "Concept", "name": f"Concept {k}"} for k in range(4)]
+    edges = [
+        ["lec01", "PREREQUISITE", "lec02"], ["lec02", "PREREQUISITE", "lec03"], ["lec01", "COVERS", "hw01"],
+        ["lec01", "TEACHES", "c0"], ["hw01", "PRACTICES", "c0"], ["lec02", "TEACHES", "c1"],
+        ["lec02", "TEACHES", "c2"], ["lec03", "TEACHES", "c3"], ["c0", "DEPENDS_ON", "c1"],
+    ]
+    return GraphSnapshot({"version": "v1", "nodes": nodes, "edges": edges})
+
+
+def _from_snapshot(**kwargs):
+    with patch("src.knowledge_graph.snapshot.get_snapshot", return_value=_snapshot()), \
+         patch.object(subgraph, "driver_session", side_effect=AssertionError("Neo4j should not be queried")):
+        return subgraph.get_subgraph(**kwargs)
+
+
+def test_snapshot_subgraph_truncates_by_distance_then_degree():
+    out = _from_snapshot(seed_id="lec01", max_depth=2, max_nodes=5)
+    # 1 跳：lec02(度 4)、c0(度 3)、hw01(度 2)；2 跳中 lec03 / c1 / c2 度数 2 / 2 / 1
+    assert [n["id"] for n in out["nodes"]] == ["lec01", "lec02", "c0", "hw01", "c1"]
+    assert out["nodes"][0] == {"id": "lec01", "label": "Lecture 1", "type": "Topic"}
+    assert {n["type"] for n in out["nodes"]} == {"Topic", "Concept", "Exercise"}
+    pairs = [(e["source"], e["target"], e["type"]) for e in out["edges"]]
+    assert len(pairs) == len(set(pairs))
+    assert ("lec01", "PREREQUISITE", "lec02") not in pairs and ("lec01", "lec02", "PREREQUISITE") in pairs
+    assert ("c0", "c1", "DEPENDS_ON") in pairs and ("lec02", "c1", "TEACHES") in pairs
+    assert all(set(e) == {"source", "target", "type"} for e in out["edges"])
+
+
+def test_snapshot_subgraph_depth_and_missing_seed():
+    assert [n["id"] for n in _from_snapshot(seed_id="c3", max_depth=0)["nodes"]] == ["c3"]
+    full = _from_snapshot(seed_id="c3", max_depth=10, max_nodes=50)
+    assert len(full["nodes"]) == 8 and len(full["edges"]) == 9
+    assert _from_snapshot(seed_id="nope", max_depth=2) == {"nodes": [], "edges": [], "error": None}
+
+
+def test_neo4j_subgraph_single_query():
+    row = {
+        "nodes": [
+            {"id": "lec01", "labels": ["Topic"], "name_en": "Lecture 1", "name": None, "title": None, "dist": 0, "degree": 2},
+            {"id": "hw01", "labels": ["Exercise"], "title": "Homework 1", "name": None, "name_en": None, "dist": 1, "degree": 1},
+            {"id": "lec02", "labels": ["Topic"], "name_en": "Lecture 2", "name": None, "title": None, "dist": 1, "degree": 3},
+        ],
+        "edges": [["lec01", "PREREQUISITE", "lec02"], ["lec01", "COVERS", "hw01"], ["lec01", "PREREQUISITE", "lec02"]],
+    }
+    session = MagicMock()
+    session.run.return_value.single.return_value = row
+
+    @contextmanager
+    def fake_session():
+        yield session
+
+    with patch("src.knowledge_graph.snapshot.get_snapshot", return_value=None), \
+         patch.object(subgraph, "driver_session", fake_session):
+        out = subgraph.get_subgraph("lec01", max_depth=3, max_nodes=2)
+    assert session.run.call_count == 1
+    query = session.run.call_args.args[0]
+    # 逐层扩展：每层一个子查询，不用变长路径匹配
+    assert query.count("CALL {") == 3 and "*1.." not in query and "RETURN nodes, edges" in query
+    assert session.run.call_args.kwargs == {"seed_id": "lec01", "max_nodes": 2, "layer_limit": 2 * subgraph.LAYER_LIMIT_FACTOR}
+    # 每层去重并限量，节点在库内截到 max_nodes 后才取边
+    assert query.count("LIMIT $layer_limit") == 3 and query.count("WITH DISTINCT") == 3
+    assert query.index("LIMIT $max_nodes") < query.index("OPTIONAL MATCH (a)")
+    assert out == {
+        "nodes": [{"id": "lec01", "label": "Lecture 1", "type": "Topic"}, {"id": "lec02", "label": "Lecture 2", "type": "Topic"}],
+        "edges": [{"source": "lec01", "target": "lec02", "type": "PREREQUISITE"}],
+    }
+    assert "CALL {" not in subgraph._subgraph_query(0)
+    with patch("src.knowledge_graph.snapshot.get_snapshot", return_value=None), \
+         patch.object(subgraph, "driver_session", fake_session):
+        subgraph.get_subgraph("lec01", max_depth=100)
+    assert session.run.call_args.args[0].count("CALL {") == subgraph.MAX_SUBGRAPH_DEPTH
@@ -1,27 +1,81 @@
 """
 容器内入口：根据环境变量 INPUT_DIR / OUTPUT_DIR 生成 config 并执行 pdf2markdown。
 供 agent-edu 通过 docker run 调用，宿主机 Python 3.11 无需安装 PDF-Extract-Kit 依赖。
+--serve：常驻模式，模型只加载一次，从 stdin 逐行读取 {"id", "input", "output"} 请求，
+处理完向 stdout 回复 {"id", "ok"}（启动完成时先输出 {"ready": true}）；模型日志转到 stderr。
+本地环境（PDF_EXTRACT_KIT_ROOT）同样使用本脚本，PDF_EXTRACT_KIT_APP_ROOT 指向克隆目录。
 """
+import json
 import os
 import subprocess
 import sys
 
 import yaml
 
-APP_ROOT = "/app"
+APP_ROOT = os.environ.get("PDF_EXTRACT_KIT_APP_ROOT", "/app")
 DEFAULT_CONFIG = os.path.join(APP_ROOT, "project", "pdf2markdown", "configs", "pdf2markdown.yaml")
 RUN_SCRIPT = os.path.join(APP_ROOT, "project", "pdf2markdown", "scripts", "run_project.py")
 
 
-def main():
-    input_dir = os.environ.get("INPUT_DIR", "/input")
-    output_dir = os.environ.get("OUTPUT_DIR", "/output")
-
+def _load_config(input_dir, output_dir):
     with open(DEFAULT_CONFIG, "r", encoding="utf-8") as f:
         config = yaml.safe_load(f)
     config["inputs"] = input_dir
     config["outputs"] = output_dir
     config["merge2markdown"] = True
+    return config
+
+
+def _load_pipeline(config):
+    """与 run_project.py 相同的初始化：按 config 加载各任务模型，返回 process(input_dir, output_dir)。"""
+    from pdf_extract_kit.utils.config_loader import initialize_tasks_and_models
+    import pdf_extract_kit.tasks  # noqa: F401  注册任务
+    from project.pdf2markdown.scripts.pdf2markdown import PDF2MARKDOWN
+
+    tasks = initialize_tasks_and_models(config)
+
+    def model(name):
+        return tasks[name].model if name in tasks else None
+
+    extractor = PDF2MARKDOWN(
+        model("layout_detection"), model("formula_detection"), model("formula_recognition"), model("ocr")
+    )
+
+    def process(input_dir, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        extractor.process(input_dir, save_dir=output_dir, visualize=False, merge2markdown=True)
+
+    return process
+
+
+def serve():
+    # 协议专用原 stdout；其余输出（含 C 扩展直接写 fd 1 的日志）转到 stderr
+    proto = os.fdopen(os.dup(1), "w", buffering=1, encoding="utf-8")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    sys.path.insert(0, APP_ROOT)
+    os.chdir(APP_ROOT)
+    process = _load_pipeline(_load_config("", ""))
+    proto.write(json.dumps({"ready": True}) + "\n")
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        reply = {"id": request.get("id"), "ok": True}
+        try:
+            process(request["input"], request["output"])
+        except Exception as e:  # 单块失败不退出常驻进程
+            reply.update(ok=False, error=f"{type(e).__name__}: {e}")
+        proto.write(json.dumps(reply) + "\n")
+
+
+def main():
+    if "--serve" in sys.argv[1:]:
+        serve()
+        return
+    input_dir = os.environ.get("INPUT_DIR", "/input")
+    output_dir = os.environ.get("OUTPUT_DIR", "/output")
+    config = _load_config(input_dir, output_dir)
 
     config_path = "/tmp/pdf2markdown_config.yaml"
     with open(config_path, "w", encoding="utf-8") as f: